@@ -1,22 +1,31 @@
 import asyncio
 import signal
 import sys
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 # Прямые импорты
 from plugins.utilities.foundation.logger.logger import Logger
 from plugins.utilities.foundation.plugins_manager.plugins_manager import PluginsManager
 from plugins.utilities.foundation.settings_manager.settings_manager import SettingsManager
 
 from .di_container import DIContainer
+from .startup_profiler import StartupProfiler
 
 
 class Application:
     """Основной класс приложения - управляет жизненным циклом"""
     
-    def __init__(self):
+    def __init__(self, role: Optional[str] = None, shard_index: Optional[int] = None, shard_count: Optional[int] = None,
+                 profiler: Optional[StartupProfiler] = None):
         self.logger_instance = Logger()
         self.logger = self.logger_instance.get_logger("application")
         self.is_running = False
+        # Роль процесса (None - все сервисы) и шард в многопроцессном режиме
+        self.role = role
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._startup_hooks: List[Callable[['Application'], Awaitable[None]]] = []
+        # Профилирование запуска (--profile-startup), по умолчанию отключено
+        self.profiler = profiler or StartupProfiler()
         self.plugins_manager = None
         self.settings_manager = None
         self.di_container = None
@@ -46,38 +55,83 @@ class Application:
         try:
             # 1. Создаем plugins_manager через DI-контейнер
             self.logger.info("Инициализация plugins_manager...")
-            self.plugins_manager = PluginsManager(logger=self.logger_instance.get_logger("plugins_manager"))
+            with self.profiler.step('phase', 'plugins_manager'):
+                self.plugins_manager = PluginsManager(
+                    logger=self.logger_instance.get_logger("plugins_manager"),
+                    profiler=self.profiler
+                )
             
             # 2. Создаем settings_manager
             self.logger.info("Инициализация settings_manager...")
-            self.settings_manager = SettingsManager(
-                logger=self.logger_instance.get_logger("settings_manager"),
-                plugins_manager=self.plugins_manager
-            )
+            with self.profiler.step('phase', 'settings_manager'):
+                self.settings_manager = SettingsManager(
+                    logger=self.logger_instance.get_logger("settings_manager"),
+                    plugins_manager=self.plugins_manager
+                )
+            # Роль процесса: аргумент > настройка settings_manager.role
+            if not self.role:
+                self.role = self.settings_manager.get_plugin_settings('settings_manager').get('role') or 'all'
+            self.settings_manager.set_role(self.role, self.shard_index, self.shard_count)
             
             # 3. Создаем DI-контейнер с передачей plugins_manager и settings_manager
             self.logger.info("Создание DI-контейнера...")
             self.di_container = DIContainer(
                 logger=self.logger_instance, 
                 plugins_manager=self.plugins_manager,
-                settings_manager=self.settings_manager
+                settings_manager=self.settings_manager,
+                profiler=self.profiler
             )
             
             # 4. Инициализируем все плагины автоматически
             self.logger.info("Инициализация всех плагинов...")
-            self.di_container.initialize_all_plugins()
+            with self.profiler.step('phase', 'initialize_plugins'):
+                self.di_container.initialize_all_plugins()
+            
+            # Хуки запуска (например, подключение IPC в многопроцессном режиме) - до старта сервисов
+            with self.profiler.step('phase', 'startup_hooks'):
+                for hook in self._startup_hooks:
+                    await hook(self)
             
             # 5. Запускаем все сервисы в фоновых задачах
             self.logger.info("Запуск всех сервисов...")
-            await self._start_all_services()
+            with self.profiler.step('phase', 'start_services'):
+                await self._start_all_services()
             
             self.logger.info("Приложение запущено успешно")
+            self.profiler.finish()
             
         except Exception as e:
             self.logger.error(f"Ошибка при запуске приложения: {e}")
             await self.shutdown()
             sys.exit(1)
     
+    def add_startup_hook(self, hook: Callable[['Application'], Awaitable[None]]):
+        """Добавляет async hook(app), вызываемый после инициализации плагинов и до запуска сервисов"""
+        self._startup_hooks.append(hook)
+    
+    def start_background_task(self, coro, name: str) -> asyncio.Task:
+        """Запускает фоновую задачу, которая будет отменена при shutdown"""
+        task = asyncio.create_task(coro, name=name)
+        self._background_tasks.append(task)
+        return task
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Состояние процесса: роль, шард и фоновые задачи"""
+        tasks = {}
+        for task in self._background_tasks:
+            if not task.done():
+                tasks[task.get_name()] = 'running'
+            elif task.cancelled() or task.exception() is None:
+                tasks[task.get_name()] = 'done'
+            else:
+                tasks[task.get_name()] = 'failed'
+        return {
+            'role': self.role or 'all',
+            'shard_index': self.shard_index,
+            'running': self.is_running,
+            'tasks': tasks,
+        }
+    
     async def _start_all_services(self):
         """Запуск сервисов по плану из SettingsManager"""
         # Получаем план запуска
@@ -141,6 +195,11 @@ class Application:
                 # Ждем завершения всех задач
                 await asyncio.gather(*self._background_tasks, return_exceptions=True)
             
+            # Отменяем задачи, поставленные сервисами в task_manager (если он уже инициализирован)
+            task_manager = self.di_container.get_all_utilities().get('task_manager') if self.di_container else None
+            if task_manager:
+                await asyncio.gather(*task_manager.shutdown(), return_exceptions=True)
+            
             # Shutdown DI-контейнера
             if self.di_container:
                 self.di_container.shutdown()
@@ -166,6 +225,12 @@ class Application:
                     if not task.done():
                         task.cancel()
                         pass
+                self._wait_cancelled(self._background_tasks)
+            
+            # Отменяем задачи, поставленные сервисами в task_manager (если он уже инициализирован)
+            task_manager = self.di_container.get_all_utilities().get('task_manager') if self.di_container else None
+            if task_manager:
+                self._wait_cancelled(task_manager.shutdown())
             
             # Shutdown DI-контейнера
             if self.di_container:
@@ -176,6 +241,18 @@ class Application:
         except Exception as e:
             self.logger.error(f"Ошибка при shutdown: {e}")
     
+    def _wait_cancelled(self, tasks: list):
+        """Дожидается отмененных задач из синхронного shutdown (как gather в async shutdown)"""
+        if not tasks:
+            return
+        loop = tasks[0].get_loop()
+        if loop.is_closed():
+            return
+        gathered = asyncio.gather(*tasks, return_exceptions=True)
+        if not loop.is_running():
+            loop.run_until_complete(gathered)
+        # Вызов из работающего event loop: gather забирает результаты задач, задачи завершатся на ближайших итерациях
+    
     async def run(self):
         """Асинхронный основной цикл приложения"""
         await self.startup()
@@ -1,20 +1,69 @@
 import importlib.util
-from typing import Any, Dict, List, Optional, Type
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Set, Type
+
+
+class LazyUtility:
+    """
+    Прокси утилиты с отложенной инициализацией: утилита создается при первом обращении к атрибуту
+    или проверке истинности. Если инициализация не удалась, прокси ложен (как отсутствующая зависимость)
+    """
+
+    __slots__ = ('_container', '_name', '_instance', '_failed')
+
+    def __init__(self, container: 'DIContainer', name: str):
+        self._container = container
+        self._name = name
+        self._instance = None
+        self._failed = False
+
+    def _resolve(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            if not self._failed:
+                instance = self._container.get_utility(self._name)
+            if instance is None:
+                self._failed = True
+                raise RuntimeError(f"Утилита {self._name} недоступна")
+            self._instance = instance
+        return instance
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._resolve(), attr)
+
+    def __bool__(self) -> bool:
+        try:
+            self._resolve()
+        except RuntimeError:
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        state = 'initialized' if self._instance is not None else 'failed' if self._failed else 'pending'
+        return f"<LazyUtility {self._name} ({state})>"
 
 
 class DIContainer:
     """DI-контейнер для управления зависимостями плагинов"""
     
-    def __init__(self, logger: Any, plugins_manager: Any, settings_manager: Any = None):
+    def __init__(self, logger: Any, plugins_manager: Any, settings_manager: Any = None, profiler: Any = None):
         self.logger = logger
         self.plugins_manager = plugins_manager
         self.settings_manager = settings_manager
+        # Профилировщик запуска (import/init шаги плагинов), None - без замеров
+        self.profiler = profiler
         
         # Кеши для экземпляров и классов
         self._utilities: Dict[str, Any] = {}
         self._services: Dict[str, Any] = {}
         self._utilities_classes: Dict[str, Type] = {}
         self._services_classes: Dict[str, Type] = {}
+        # Утилиты плана, отложенные до первого обращения (lazy_utilities)
+        self._lazy_utilities: Set[str] = set()
+        # Защита от двойного создания утилит при инициализации в потоках
+        self._lock = threading.RLock()
         
         # Регистрируем переданные утилиты как уже инициализированные
         self._utilities['logger'] = logger
@@ -35,7 +84,8 @@ class DIContainer:
             return
         
         # Получаем план запуска из SettingsManager
-        startup_plan = self.settings_manager.get_startup_plan()
+        with self._profile_step('phase', 'startup_plan'):
+            startup_plan = self.settings_manager.get_startup_plan()
         
         if not startup_plan:
             self.logger.error("SettingsManager не смог построить план запуска")
@@ -43,22 +93,66 @@ class DIContainer:
         
         self.logger.info(f"План запуска: {startup_plan['total_services']} сервисов, {startup_plan['total_utilities']} утилит")
         
+        settings = self.settings_manager.get_plugin_settings('settings_manager')
+        dependency_order = startup_plan['dependency_order']
+        
+        # Отложенная инициализация: сразу создаются только preload утилиты и их зависимости,
+        # остальные - при первом обращении (get_utility или атрибут прокси в зависимом плагине)
+        if settings.get('lazy_utilities', True):
+            preload = self._collect_preload_utilities(dependency_order, settings.get('preload_utilities') or [])
+            self._lazy_utilities = {name for name in dependency_order if name not in preload}
+            dependency_order = [name for name in dependency_order if name in preload]
+            self.logger.info(f"Отложена инициализация утилит: {len(self._lazy_utilities)}")
+        
         # Инициализируем утилиты в правильном порядке
-        self._initialize_utilities_from_plan(startup_plan['dependency_order'])
+        self._initialize_utilities_from_plan(dependency_order, settings.get('init_workers', 4))
         
         # Инициализируем сервисы
         self._initialize_services_from_plan(startup_plan['enabled_services'])
         
         self.logger.info("Все плагины успешно инициализированы")
     
-    def _initialize_utilities_from_plan(self, dependency_order: List[str]):
-        """Инициализация утилит по плану из SettingsManager"""
+    def _collect_preload_utilities(self, dependency_order: List[str], preload: List[str]) -> Set[str]:
+        """Preload утилиты плана вместе со всеми их транзитивными зависимостями"""
+        planned = set(dependency_order)
+        collected: Set[str] = set()
+        stack = [name for name in preload if name in planned]
+        while stack:
+            name = stack.pop()
+            if name in collected:
+                continue
+            collected.add(name)
+            stack.extend(dep for dep in self.plugins_manager.get_plugin_dependencies(name) if dep in planned)
+        return collected
+    
+    def _split_dependency_levels(self, dependency_order: List[str]) -> List[List[str]]:
+        """Разбивает порядок инициализации на уровни: утилиты одного уровня не зависят друг от друга"""
+        levels: Dict[str, int] = {}
+        for name in dependency_order:
+            dep_levels = [levels[dep] + 1 for dep in self.plugins_manager.get_plugin_dependencies(name) if dep in levels]
+            levels[name] = max(dep_levels, default=0)
+        
+        result: List[List[str]] = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+        for name in dependency_order:
+            result[levels[name]].append(name)
+        return result
+    
+    def _initialize_utilities_from_plan(self, dependency_order: List[str], init_workers: int = 1):
+        """Инициализация утилит по плану из SettingsManager (независимые утилиты - параллельно в потоках)"""
         if self._utilities_initialized:
             return
-            
         
-        for utility_name in dependency_order:
-            self._register_utility_from_manager(utility_name)
+        # Профилировщик замеряет шаги стеком - при профилировании инициализация последовательная
+        if init_workers <= 1 or (self.profiler and self.profiler.enabled):
+            for utility_name in dependency_order:
+                self._register_utility_from_manager(utility_name)
+        else:
+            with ThreadPoolExecutor(max_workers=init_workers, thread_name_prefix='plugin_init') as executor:
+                for level in self._split_dependency_levels(dependency_order):
+                    if len(level) == 1:
+                        self._register_utility_from_manager(level[0])
+                    else:
+                        list(executor.map(self._register_utility_from_manager, level))
         
         self._utilities_initialized = True
         self.logger.info(f"Инициализировано утилит: {len(self._utilities)}")
@@ -84,7 +178,8 @@ class DIContainer:
         
         try:
             # Загружаем класс утилиты
-            utility_class = self._load_plugin_class(utility_info)
+            with self._profile_step('import', utility_name):
+                utility_class = self._load_plugin_class(utility_info)
             if not utility_class:
                 return
             
@@ -93,7 +188,8 @@ class DIContainer:
             
             if is_singleton:
                 # Создаем экземпляр сразу для singleton
-                instance = self._create_utility_instance(utility_name, utility_class)
+                with self._profile_step('init', utility_name):
+                    instance = self._create_utility_instance(utility_name, utility_class)
                 self._utilities[utility_name] = instance
             else:
                 # Сохраняем только класс для non-singleton
@@ -111,7 +207,8 @@ class DIContainer:
         
         try:
             # Загружаем класс сервиса
-            service_class = self._load_plugin_class(service_info)
+            with self._profile_step('import', service_name):
+                service_class = self._load_plugin_class(service_info)
             if not service_class:
                 return
             
@@ -120,7 +217,8 @@ class DIContainer:
             
             if is_singleton:
                 # Создаем экземпляр сразу для singleton
-                instance = self._create_service_instance(service_name, service_class)
+                with self._profile_step('init', service_name):
+                    instance = self._create_service_instance(service_name, service_class)
                 self._services[service_name] = instance
             else:
                 # Сохраняем только класс для non-singleton
@@ -129,6 +227,10 @@ class DIContainer:
         except Exception as e:
             self.logger.error(f"Ошибка регистрации сервиса {service_name}: {e}")
     
+    def _profile_step(self, kind: str, name: str):
+        """Замер шага запуска профилировщиком (если включен)"""
+        return self.profiler.step(kind, name) if self.profiler else nullcontext()
+    
     def _load_plugin_class(self, plugin_info: Dict) -> Optional[Type]:
         """Загрузка класса плагина из файла"""
         plugin_path = plugin_info['path']
@@ -232,7 +334,7 @@ class DIContainer:
         missing_deps = []
         
         for dep_name in dependencies:
-            dep_instance = self.get_utility_on_demand(dep_name)
+            dep_instance = self._resolve_dependency(dep_name)
             if dep_instance:
                 # Если это логгер, создаем именованный логгер для утилиты
                 if dep_name == 'logger' and utility_name != 'logger':
@@ -275,7 +377,7 @@ class DIContainer:
         
         for dep_name in dependencies:
             # Сервисы могут зависеть от утилит
-            dep_instance = self.get_utility_on_demand(dep_name)
+            dep_instance = self._resolve_dependency(dep_name)
             if dep_instance:
                 # Если это логгер, создаем именованный логгер для сервиса
                 if dep_name == 'logger':
@@ -306,11 +408,29 @@ class DIContainer:
             self.logger.error(f"Ошибка создания экземпляра сервиса {service_name}: {e}")
             raise
     
+    def _resolve_dependency(self, name: str) -> Optional[Any]:
+        """Зависимость для инъекции: прокси для отложенной утилиты, иначе сама утилита"""
+        if name in self._lazy_utilities:
+            return LazyUtility(self, name)
+        return self.get_utility_on_demand(name)
+    
+    def _initialize_lazy_utility(self, name: str) -> Optional[Any]:
+        """Инициализирует отложенную утилиту при первом обращении"""
+        with self._lock:
+            if name in self._lazy_utilities:
+                self._lazy_utilities.discard(name)
+                self._register_utility_from_manager(name)
+                self.logger.info(f"Утилита {name} инициализирована при первом обращении")
+        return self.get_utility(name)
+    
     def get_utility(self, name: str) -> Optional[Any]:
-        """Получить утилиту по имени"""
+        """Получить утилиту по имени (отложенная утилита инициализируется при первом обращении)"""
         if name in self._utilities:
             return self._utilities[name]
         
+        if name in self._lazy_utilities:
+            return self._initialize_lazy_utility(name)
+        
         if name in self._utilities_classes:
             # Создаем экземпляр для non-singleton
             utility_class = self._utilities_classes[name]
@@ -333,6 +453,15 @@ class DIContainer:
             self.logger.warning(f"Утилита {name} не найдена в PluginsManager")
             return None
         
+        with self._lock:
+            # Утилиту мог уже создать другой поток
+            utility = self.get_utility(name)
+            if utility:
+                return utility
+            return self._load_utility_on_demand(name, utility_info)
+    
+    def _load_utility_on_demand(self, name: str, utility_info: Dict) -> Optional[Any]:
+        """Загрузка и создание утилиты вне плана запуска"""
         try:
             # Загружаем класс утилиты
             utility_class = self._load_plugin_class(utility_info)
@@ -371,8 +500,20 @@ class DIContainer:
         
         return None
     
+    def get_service_on_demand(self, name: str) -> Optional[Any]:
+        """Получить сервис по требованию, даже если он не в плане запуска (инструменты, бенчмарки)"""
+        
+        # Сначала пробуем стандартный метод
+        service = self.get_service(name)
+        if service:
+            return service
+        
+        # Если не найден - регистрируем из PluginsManager
+        self._register_service_from_manager(name)
+        return self.get_service(name)
+    
     def get_all_utilities(self) -> Dict[str, Any]:
-        """Получить все зарегистрированные утилиты"""
+        """Получить все зарегистрированные утилиты (без еще не инициализированных отложенных)"""
         return self._utilities.copy()
     
     def get_all_services(self) -> Dict[str, Any]:
@@ -406,5 +547,6 @@ class DIContainer:
         self._services.clear()
         self._utilities_classes.clear()
         self._services_classes.clear()
+        self._lazy_utilities.clear()
         
         self.logger.info("DI-контейнер завершен") 
\ No newline at end of file
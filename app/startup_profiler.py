@@ -0,0 +1,201 @@
+import builtins
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Пустой контекст для шагов при отключенном профилировании
+_NULL_STEP = nullcontext()
+
+# Корневые пакеты проекта (остальные не-stdlib модули считаются сторонними)
+PROJECT_ROOTS = ('app', 'plugins')
+
+
+class _Step:
+    """Контекстный менеджер замера шага запуска (время шага без вложенных шагов - self)"""
+
+    __slots__ = ('profiler', 'kind', 'name', 'start', 'children')
+
+    def __init__(self, profiler: 'StartupProfiler', kind: str, name: str):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self.start = 0.0
+        self.children = 0.0
+
+    def __enter__(self):
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        stack = self.profiler._stack
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+        self.profiler.steps.append({
+            'kind': self.kind,
+            'name': self.name,
+            'depth': len(stack),
+            'offset_ms': round((self.start - self.profiler.started_at) * 1000, 2),
+            'total_ms': round(duration * 1000, 2),
+            'self_ms': round((duration - self.children) * 1000, 2),
+            'failed': exc_type is not None,
+        })
+        return False
+
+
+class _ImportTimer:
+    """Обертка builtins.__import__: время первого импорта по корневым пакетам (без вложенных чужих пакетов)"""
+
+    def __init__(self, profiler: 'StartupProfiler'):
+        self.profiler = profiler
+        self.original = builtins.__import__
+        self.modules: Dict[str, Dict[str, Any]] = {}
+        self._local = threading.local()
+
+    def __call__(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Относительные и уже загруженные модули - без замера
+        if level or name in sys.modules:
+            return self.original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        root = name.partition('.')[0]
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+
+            entry = self.modules.get(root)
+            if entry is None:
+                current = self.profiler._stack[-1] if self.profiler._stack else None
+                entry = self.modules[root] = {
+                    'module': root,
+                    'category': self._categorize(root),
+                    'self_ms': 0.0,
+                    'imported_by': f"{current.kind}:{current.name}" if current else 'main',
+                }
+            entry['self_ms'] += (elapsed - nested) * 1000
+
+    @staticmethod
+    def _categorize(root: str) -> str:
+        if root in PROJECT_ROOTS or root.startswith('plugin_'):
+            return 'project'
+        if root in getattr(sys, 'stdlib_module_names', ()) or root in sys.builtin_module_names:
+            return 'stdlib'
+        return 'third_party'
+
+
+class StartupProfiler:
+    """
+    Профилирование запуска (--profile-startup): время фаз Application, поиска плагинов (discovery),
+    импорта модулей плагинов (import), конструкторов (init) и импортов сторонних пакетов.
+    """
+
+    def __init__(self, enabled: bool = False, output_dir: str = "data/profiles"):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.started_at = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+        self._stack: List[_Step] = []
+        self._import_timer: Optional[_ImportTimer] = None
+
+    def step(self, kind: str, name: str):
+        """Контекстный менеджер замера шага (discovery, import, init, phase)"""
+        if not self.enabled:
+            return _NULL_STEP
+        return _Step(self, kind, name)
+
+    def install_import_hook(self):
+        """Начинает замер импортов (вызывать до импорта приложения и плагинов)"""
+        if self.enabled and self._import_timer is None:
+            self._import_timer = _ImportTimer(self)
+            builtins.__import__ = self._import_timer
+
+    def remove_import_hook(self):
+        if self._import_timer is not None and builtins.__import__ is self._import_timer:
+            builtins.__import__ = self._import_timer.original
+
+    def get_report(self) -> Dict[str, Any]:
+        """Отчет: шаги по убыванию собственного времени и импорты по категориям"""
+        imports: Dict[str, List[Dict[str, Any]]] = {'third_party': [], 'stdlib': [], 'project': []}
+        if self._import_timer:
+            for entry in self._import_timer.modules.values():
+                imports[entry['category']].append({**entry, 'self_ms': round(entry['self_ms'], 2)})
+        for entries in imports.values():
+            entries.sort(key=lambda entry: entry['self_ms'], reverse=True)
+
+        totals: Dict[str, float] = {}
+        for step in self.steps:
+            totals[step['kind']] = totals.get(step['kind'], 0.0) + step['self_ms']
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'total_ms': round((time.perf_counter() - self.started_at) * 1000, 2),
+            'self_ms_by_kind': {kind: round(value, 2) for kind, value in sorted(totals.items(), key=lambda item: -item[1])},
+            'phases': [step for step in self.steps if step['kind'] == 'phase'],
+            'steps': sorted((step for step in self.steps if step['kind'] != 'phase'), key=lambda step: step['self_ms'], reverse=True),
+            'imports': {category: entries for category, entries in imports.items()},
+            'import_ms_by_category': {
+                category: round(sum(entry['self_ms'] for entry in entries), 2) for category, entries in imports.items()
+            },
+        }
+
+    def format_report(self, report: Dict[str, Any], top: int = 20) -> str:
+        lines = [f"=== Профиль запуска: {report['total_ms']:.0f} ms ==="]
+
+        lines.append("\nФазы:")
+        for phase in sorted(report['phases'], key=lambda step: step['offset_ms']):
+            lines.append(f"  {phase['name']:<28} {phase['total_ms']:>10.1f} ms")
+
+        lines.append("\nСобственное время по типам шагов:")
+        for kind, value in report['self_ms_by_kind'].items():
+            lines.append(f"  {kind:<28} {value:>10.1f} ms")
+
+        lines.append(f"\nСамые долгие шаги (top {top}, self / total):")
+        for step in report['steps'][:top]:
+            label = f"{step['kind']}:{step['name']}"
+            lines.append(f"  {label:<40} {step['self_ms']:>9.1f} / {step['total_ms']:>9.1f} ms")
+
+        lines.append("\nИмпорт по категориям:")
+        for category, value in report['import_ms_by_category'].items():
+            lines.append(f"  {category:<28} {value:>10.1f} ms")
+
+        lines.append(f"\nСторонние пакеты (top {top}):")
+        for entry in report['imports']['third_party'][:top]:
+            lines.append(f"  {entry['module']:<28} {entry['self_ms']:>10.1f} ms  ← {entry['imported_by']}")
+
+        return '\n'.join(lines)
+
+    def save_report(self, report: Dict[str, Any]) -> str:
+        """Сохраняет отчет в JSON, возвращает путь к файлу"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_path = os.path.join(self.output_dir, f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return file_path
+
+    def finish(self) -> Optional[str]:
+        """Завершает профилирование: печатает отчет и сохраняет JSON. Возвращает путь к файлу"""
+        if not self.enabled:
+            return None
+        self.remove_import_hook()
+        report = self.get_report()
+        print(self.format_report(report))
+        file_path = self.save_report(report)
+        print(f"\nОтчет сохранен: {file_path}")
+        self.enabled = False
+        return file_path
@@ -0,0 +1,366 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zlib
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from plugins.utilities.foundation.logger.logger import Logger
+
+from .application import Application
+
+
+def get_event_key(event: Dict[str, Any]) -> Any:
+    """Ключ упорядочивания события: chat_id (или user_id)"""
+    return event.get('chat_id') or event.get('user_id') or 0
+
+
+def get_event_shard(event: Dict[str, Any], shard_count: int) -> int:
+    """Шард события по chat_id (или user_id) - события одного чата всегда попадают в один воркер"""
+    key = get_event_key(event)
+    try:
+        return abs(int(key)) % shard_count
+    except (TypeError, ValueError):
+        return zlib.crc32(str(key).encode('utf-8')) % shard_count
+
+
+class ShardRouter:
+    """Ingest-процесс: распределяет события по очередям воркеров"""
+
+    def __init__(self, event_queues: List[Any], logger=None):
+        self.event_queues = event_queues
+        self.logger = logger
+        self.forwarded = 0
+        self.backpressure_waits = 0
+
+    async def handle_event(self, event: Dict[str, Any]):
+        """Передает событие воркеру своего шарда (ждет без блокировки loop, если очередь заполнена)"""
+        event_queue = self.event_queues[get_event_shard(event, len(self.event_queues))]
+        while True:
+            try:
+                event_queue.put_nowait(event)
+                self.forwarded += 1
+                return
+            except queue.Full:
+                self.backpressure_waits += 1
+                await asyncio.sleep(0.01)
+
+
+class ShardConsumer:
+    """
+    Воркер: читает события своего шарда и передает их в trigger_manager.
+    Разные чаты обрабатываются параллельно, события одного чата - строго по порядку поступления
+    """
+
+    def __init__(self, event_queue: Any, trigger_manager, logger=None, max_concurrency: int = 100, batch_size: int = 100):
+        self.event_queue = event_queue
+        self.trigger_manager = trigger_manager
+        self.logger = logger
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.processed = 0
+        self.errors = 0
+        self._tasks = set()
+        # Ключ чата -> события, ожидающие своей очереди (есть запись - обработчик чата уже работает)
+        self._chat_queues: Dict[Any, deque] = {}
+
+    def _get_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Блокирующее чтение пачки событий (выполняется в executor)"""
+        try:
+            batch = [self.event_queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.event_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, self._get_batch, 0.5)
+                for event in batch:
+                    # Слот семафора занимает и событие, ждущее своей очереди в чате - ограничивает буфер воркера
+                    await semaphore.acquire()
+                    self._submit(event, semaphore)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+
+    def _submit(self, event: Dict[str, Any], semaphore: asyncio.Semaphore):
+        """Ставит событие в очередь его чата; обработчик чата запускается, если еще не работает"""
+        key = get_event_key(event)
+        pending = self._chat_queues.get(key)
+        if pending is not None:
+            pending.append(event)
+            return
+        self._chat_queues[key] = deque([event])
+        task = asyncio.create_task(self._drain_chat(key, semaphore))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain_chat(self, key: Any, semaphore: asyncio.Semaphore):
+        """Последовательно обрабатывает события одного чата, пока они поступают"""
+        pending = self._chat_queues[key]
+        try:
+            while pending:
+                await self._handle(pending.popleft(), semaphore)
+        finally:
+            # Между последней проверкой и удалением нет await - новое событие чата не потеряется
+            self._chat_queues.pop(key, None)
+            # При отмене освобождаем слоты необработанных событий
+            for _ in pending:
+                semaphore.release()
+
+    async def _handle(self, event: Dict[str, Any], semaphore: asyncio.Semaphore):
+        try:
+            await self.trigger_manager.handle_event(event)
+            self.processed += 1
+        except Exception as e:
+            self.errors += 1
+            if self.logger:
+                self.logger.error(f"Ошибка обработки события шарда: {e}")
+        finally:
+            semaphore.release()
+
+    def qsize(self) -> Optional[int]:
+        try:
+            return self.event_queue.qsize()
+        except NotImplementedError:
+            return None
+
+
+def run_child(name: str, role: str, shard_index: Optional[int], shard_count: int,
+              event_queues: List[Any], health_queue: Any, heartbeat_interval: float):
+    """Точка входа дочернего процесса"""
+    app = Application(role=role, shard_index=shard_index, shard_count=shard_count)
+    logger = app.logger_instance.get_logger(name)
+    components: Dict[str, Any] = {}
+
+    async def connect_ipc(application: Application):
+        di_container = application.di_container
+
+        # Ingest: события из tg_event_bot уходят воркерам вместо локального trigger_manager
+        tg_event_bot = di_container.get_service('tg_event_bot')
+        if tg_event_bot:
+            router = ShardRouter(event_queues, logger)
+            tg_event_bot.set_event_handler(router.handle_event)
+            components['router'] = router
+
+        # Воркер: обработка событий своего шарда
+        if shard_index is not None:
+            trigger_manager = di_container.get_utility_on_demand('trigger_manager')
+            if not trigger_manager:
+                raise RuntimeError("trigger_manager недоступен в воркере")
+            consumer = ShardConsumer(event_queues[shard_index], trigger_manager, logger)
+            application.start_background_task(consumer.run(), 'shard_consumer')
+            components['consumer'] = consumer
+
+        application.start_background_task(heartbeat(application), 'heartbeat')
+
+    async def heartbeat(application: Application):
+        while True:
+            status = application.get_status()
+            status.update({'name': name, 'pid': os.getpid(), 'ts': time.time()})
+            router = components.get('router')
+            if router:
+                status['forwarded'] = router.forwarded
+                status['backpressure_waits'] = router.backpressure_waits
+            consumer = components.get('consumer')
+            if consumer:
+                status['processed'] = consumer.processed
+                status['errors'] = consumer.errors
+                status['queue_size'] = consumer.qsize()
+            try:
+                health_queue.put_nowait(status)
+            except queue.Full:
+                pass
+            await asyncio.sleep(heartbeat_interval)
+
+    app.add_startup_hook(connect_ipc)
+    app.run_sync()
+
+
+class Supervisor:
+    """
+    Многопроцессный режим: один ingest-процесс и N воркеров с шардированием по chat_id.
+    Перезапускает упавшие и зависшие процессы, агрегирует их состояние.
+    """
+
+    def __init__(self, workers: int, queue_size: int = 10000, heartbeat_interval: float = 5.0,
+                 heartbeat_timeout: float = 60.0, max_restart_delay: float = 30.0, health_log_interval: float = 60.0):
+        self.logger = Logger().get_logger("supervisor")
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_restart_delay = max_restart_delay
+        self.health_log_interval = health_log_interval
+
+        # spawn - чистые процессы без унаследованных соединений БД и event loop
+        self._context = multiprocessing.get_context('spawn')
+        self.event_queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.health_queue = self._context.Queue(maxsize=10000)
+
+        self.children: Dict[str, Dict[str, Any]] = {'ingest': self._child_spec('ingest', None)}
+        for index in range(workers):
+            # Обслуживание (очистка очереди и кэша) - только в первом воркере
+            role = 'worker,maintenance' if index == 0 else 'worker'
+            self.children[f'worker-{index}'] = self._child_spec(role, index)
+
+        self._stopping = False
+
+    @staticmethod
+    def _child_spec(role: str, shard_index: Optional[int]) -> Dict[str, Any]:
+        return {
+            'role': role,
+            'shard_index': shard_index,
+            'process': None,
+            'started_at': 0.0,
+            'restarts': 0,
+            'restart_delay': 1.0,
+            'next_start': 0.0,
+            'health': None,
+        }
+
+    def _signal_handler(self, signum, _):
+        self.logger.info(f"Получен сигнал {signum}, останавливаем процессы...")
+        self._stopping = True
+
+    def _start_child(self, name: str):
+        child = self.children[name]
+        process = self._context.Process(
+            target=run_child,
+            name=f"coreness-{name}",
+            args=(name, child['role'], child['shard_index'], self.workers,
+                  self.event_queues, self.health_queue, self.heartbeat_interval),
+            daemon=False
+        )
+        process.start()
+        child['process'] = process
+        child['started_at'] = time.monotonic()
+        child['health'] = None
+        self.logger.info(f"▶️ запущен процесс {name} (роль {child['role']}, pid {process.pid})")
+
+    def _check_children(self):
+        """Перезапускает упавшие процессы с экспоненциальной задержкой, завершает зависшие"""
+        now = time.monotonic()
+        for name, child in self.children.items():
+            process = child['process']
+
+            if process is not None and process.is_alive():
+                # Зависший процесс: нет heartbeat дольше таймаута (с запасом на запуск)
+                last_beat = child['health']['received_at'] if child['health'] else child['started_at']
+                if now - max(last_beat, child['started_at']) > self.heartbeat_timeout:
+                    self.logger.warning(f"процесс {name} не отвечает {self.heartbeat_timeout}s, перезапускаем")
+                    process.terminate()
+                continue
+
+            if process is not None:
+                self.logger.error(f"процесс {name} завершился (код {process.exitcode})")
+                # Стабильно проработавший процесс перезапускаем сразу
+                if now - child['started_at'] > 60:
+                    child['restart_delay'] = 1.0
+                child['next_start'] = now + child['restart_delay']
+                child['restart_delay'] = min(child['restart_delay'] * 2, self.max_restart_delay)
+                child['restarts'] += 1
+                child['process'] = None
+
+            if now >= child['next_start']:
+                self._start_child(name)
+
+    def _collect_health(self, timeout: float):
+        """Читает heartbeat дочерних процессов"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                status = self.health_queue.get(timeout=remaining)
+            except queue.Empty:
+                return
+            child = self.children.get(status.get('name'))
+            if child:
+                status['received_at'] = time.monotonic()
+                child['health'] = status
+
+    def get_health(self) -> Dict[str, Any]:
+        """Агрегированное состояние процессов"""
+        now = time.monotonic()
+        processes = {}
+        for name, child in self.children.items():
+            process = child['process']
+            health = child['health'] or {}
+            processes[name] = {
+                'role': child['role'],
+                'pid': process.pid if process else None,
+                'alive': bool(process and process.is_alive()),
+                'restarts': child['restarts'],
+                'uptime_s': round(now - child['started_at'], 1) if process else 0,
+                'heartbeat_age_s': round(now - health['received_at'], 1) if health else None,
+                'failed_tasks': [task for task, state in health.get('tasks', {}).items() if state == 'failed'],
+                'forwarded': health.get('forwarded'),
+                'processed': health.get('processed'),
+                'errors': health.get('errors'),
+                'queue_size': health.get('queue_size'),
+            }
+        return {
+            'healthy': all(item['alive'] and not item['failed_tasks'] for item in processes.values()),
+            'processes': processes,
+        }
+
+    def _log_health(self):
+        health = self.get_health()
+        self.logger.info(f"состояние процессов: {'ok' if health['healthy'] else 'есть проблемы'}")
+        for name, item in health['processes'].items():
+            counters = ', '.join(
+                f"{key}={item[key]}" for key in ('forwarded', 'processed', 'errors', 'queue_size') if item[key] is not None
+            )
+            self.logger.info(
+                f"  {name}: pid={item['pid']} alive={item['alive']} restarts={item['restarts']} "
+                f"heartbeat={item['heartbeat_age_s']}s {counters}"
+                + (f" failed_tasks={item['failed_tasks']}" if item['failed_tasks'] else "")
+            )
+
+    def _stop_children(self, timeout: float = 15.0):
+        """Graceful shutdown дочерних процессов (SIGTERM, затем kill)"""
+        for child in self.children.values():
+            process = child['process']
+            if process and process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for name, child in self.children.items():
+            process = child['process']
+            if not process:
+                continue
+            process.join(max(deadline - time.monotonic(), 0.1))
+            if process.is_alive():
+                self.logger.warning(f"процесс {name} не завершился за {timeout}s, kill")
+                process.kill()
+                process.join(1)
+
+    def run(self):
+        """Основной цикл супервизора"""
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        self.logger.info(f"Многопроцессный режим: ingest + {self.workers} воркеров")
+        next_health_log = time.monotonic() + self.health_log_interval
+        try:
+            while not self._stopping:
+                self._check_children()
+                self._collect_health(1.0)
+                if time.monotonic() >= next_health_log:
+                    self._log_health()
+                    next_health_log = time.monotonic() + self.health_log_interval
+        finally:
+            self._stop_children()
+            self.logger.info("Супервизор завершен")
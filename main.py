@@ -1,6 +1,32 @@
-from app.application import Application
+import argparse
+import os
+
+from app.startup_profiler import StartupProfiler
 
 if __name__ == "__main__":
-    # Создаем и запускаем приложение
-    app = Application()
-    app.run_sync()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Запуск Coreness")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Многопроцессный режим: ingest-процесс + N воркеров с шардированием по chat_id (0 - один процесс)")
+    parser.add_argument('--role', default=os.environ.get('CORENESS_ROLE'),
+                        help="Роль процесса: ingest, executor, maintenance, all или несколько через запятую (по умолчанию settings_manager.role)")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Замерить время запуска (поиск, импорт и инициализация плагинов, импорт пакетов), отчет в data/profiles")
+    args = parser.parse_args()
+
+    # Замер импортов начинается до импорта приложения и плагинов
+    profiler = StartupProfiler(enabled=args.profile_startup and args.workers == 0)
+    profiler.install_import_hook()
+
+    with profiler.step('phase', 'import_application'):
+        from app.application import Application
+        from app.supervisor import Supervisor
+
+    if args.workers > 0:
+        if args.profile_startup:
+            print("--profile-startup не поддерживается в многопроцессном режиме")
+        # Запускаем супервизор дочерних процессов
+        Supervisor(workers=args.workers).run()
+    else:
+        # Создаем и запускаем приложение
+        app = Application(role=args.role, profiler=profiler)
+        app.run_sync()
@@ -1,15 +1,25 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import (FSInputFile, InputMediaDocument,
                            InputMediaPhoto, InputMediaVideo)
 
+from .raw_api import RawApiError, RawBotApi
 from .utils import MessengerUtils
 
 # Максимальное количество файлов в media group
 MAX_MEDIA_GROUP = 10
 
+# Метод Bot API одиночного вложения по его типу (поле файла совпадает с типом)
+SEND_METHODS = {
+    'photo': 'sendPhoto',
+    'animation': 'sendAnimation',
+    'video': 'sendVideo',
+    'document': 'sendDocument',
+    'audio': 'sendAudio',
+}
+
 
 class AttachmentHandler:
     """Обработчик вложений для tg_messenger сервиса"""
@@ -18,6 +28,10 @@ class AttachmentHandler:
         self.logger = kwargs.get('logger')
         self.settings_manager = kwargs.get('settings_manager')
         self.utils = MessengerUtils(**kwargs)
+        
+        settings = self.settings_manager.get_plugin_settings('tg_messenger')
+        self.raw_send = settings.get('raw_send', True)
+        self.raw_api = RawBotApi()
     
     def _parse_attachments(self, action: dict) -> List[dict]:
         """
@@ -100,7 +114,6 @@ class AttachmentHandler:
                     self.logger.warning(f"Вложение не найдено: {file_path}")
                     continue
                 try:
-                    file = FSInputFile(file_path)
                     caption = text if not text_sent else None
                     
                     # Подготавливаем параметры для отправки
@@ -114,47 +127,18 @@ class AttachmentHandler:
                     if message_reply and message_id:
                         send_kwargs['reply_to_message_id'] = message_id
                     
-                    msg = None
                     try:
-                        if att['type'] == 'photo':
-                            send_kwargs.update(photo=file, caption=caption)
-                            msg = await bot.send_photo(**send_kwargs)
-                        elif att['type'] == 'animation':
-                            send_kwargs.update(animation=file, caption=caption)
-                            msg = await bot.send_animation(**send_kwargs)
-                        elif att['type'] == 'video':
-                            send_kwargs.update(video=file, caption=caption)
-                            msg = await bot.send_video(**send_kwargs)
-                        elif att['type'] == 'document':
-                            send_kwargs.update(document=file, caption=caption)
-                            msg = await bot.send_document(**send_kwargs)
-                        elif att['type'] == 'audio':
-                            send_kwargs.update(audio=file, caption=caption)
-                            msg = await bot.send_audio(**send_kwargs)
-                    except TelegramBadRequest as e:
+                        message_id_sent = await self._send_single(bot, att['type'], file_path, caption, send_kwargs)
+                    except (TelegramBadRequest, RawApiError) as e:
                         if 'message to reply not found' in str(e).lower() and message_reply and message_id:
                             self.logger.warning(f"ответ на сообщение не удался (сообщение для ответа не найдено) для chat_id={chat_id}, message_id={message_id}: {e}. Отправляю вложение без reply_to_message_id.")
                             send_kwargs.pop('reply_to_message_id', None)
-                            if att['type'] == 'photo':
-                                send_kwargs.update(photo=file, caption=caption)
-                                msg = await bot.send_photo(**send_kwargs)
-                            elif att['type'] == 'animation':
-                                send_kwargs.update(animation=file, caption=caption)
-                                msg = await bot.send_animation(**send_kwargs)
-                            elif att['type'] == 'video':
-                                send_kwargs.update(video=file, caption=caption)
-                                msg = await bot.send_video(**send_kwargs)
-                            elif att['type'] == 'document':
-                                send_kwargs.update(document=file, caption=caption)
-                                msg = await bot.send_document(**send_kwargs)
-                            elif att['type'] == 'audio':
-                                send_kwargs.update(audio=file, caption=caption)
-                                msg = await bot.send_audio(**send_kwargs)
+                            message_id_sent = await self._send_single(bot, att['type'], file_path, caption, send_kwargs)
                         else:
                             raise
                     
-                    if msg:
-                        last_message_id = msg.message_id
+                    if message_id_sent:
+                        last_message_id = message_id_sent
                     text_sent = True
                     any_sent = True
                     first_group = False
@@ -170,7 +154,6 @@ class AttachmentHandler:
                         self.logger.warning(f"Вложение не найдено: {file_path}")
                         continue
                     try:
-                        file = FSInputFile(file_path)
                         caption = text if not text_sent else None
                         
                         # Подготавливаем параметры для отправки
@@ -185,27 +168,17 @@ class AttachmentHandler:
                             send_kwargs['reply_to_message_id'] = message_id
                         
                         try:
-                            if group_type == 'animation':
-                                send_kwargs.update(animation=file, caption=caption)
-                                msg = await bot.send_animation(**send_kwargs)
-                            elif group_type == 'audio':
-                                send_kwargs.update(audio=file, caption=caption)
-                                msg = await bot.send_audio(**send_kwargs)
-                        except TelegramBadRequest as e:
+                            message_id_sent = await self._send_single(bot, group_type, file_path, caption, send_kwargs)
+                        except (TelegramBadRequest, RawApiError) as e:
                             if 'message to reply not found' in str(e).lower() and message_reply and message_id:
                                 self.logger.warning(f"ответ на сообщение не удался (сообщение для ответа не найдено) для chat_id={chat_id}, message_id={message_id}: {e}. Отправляю вложение без reply_to_message_id.")
                                 send_kwargs.pop('reply_to_message_id', None)
-                                if group_type == 'animation':
-                                    send_kwargs.update(animation=file, caption=caption)
-                                    msg = await bot.send_animation(**send_kwargs)
-                                elif group_type == 'audio':
-                                    send_kwargs.update(audio=file, caption=caption)
-                                    msg = await bot.send_audio(**send_kwargs)
+                                message_id_sent = await self._send_single(bot, group_type, file_path, caption, send_kwargs)
                             else:
                                 raise
                         
-                        if msg:
-                            last_message_id = msg.message_id
+                        if message_id_sent:
+                            last_message_id = message_id_sent
                         text_sent = True
                         any_sent = True
                         first_group = False
@@ -265,12 +238,31 @@ class AttachmentHandler:
         
         # Если ни одно вложение не отправлено, а текст есть — отправить текстовое сообщение
         if not any_sent and text:
-            msg = await bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
-            if msg:
-                last_message_id = msg.message_id
+            if self.raw_send:
+                result = await self.raw_api.call(
+                    bot, 'sendMessage', dict(chat_id=chat_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+                )
+                last_message_id = result['message_id']
+            else:
+                msg = await bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
+                if msg:
+                    last_message_id = msg.message_id
         elif not any_sent and not text:
             # Нет ни вложений, ни текста - это ошибка
             self.logger.error("Не отправлено ни вложений, ни текста")
             return None
         
         return last_message_id
+
+    async def _send_single(self, bot, att_type: str, file_path: str, caption, send_kwargs: dict) -> Optional[int]:
+        """Отправляет одно вложение, возвращает message_id (raw_send - без разбора полной модели ответа)"""
+        if att_type not in SEND_METHODS:
+            return None
+        if self.raw_send:
+            result = await self.raw_api.call(
+                bot, SEND_METHODS[att_type], dict(send_kwargs, caption=caption), files={att_type: file_path}
+            )
+            return result['message_id']
+        send_method = getattr(bot, f"send_{att_type}")
+        msg = await send_method(**send_kwargs, **{att_type: FSInputFile(file_path), 'caption': caption})
+        return msg.message_id if msg else None
@@ -0,0 +1,76 @@
+import os
+from typing import Any, Dict, Optional
+
+from aiohttp import ClientTimeout, FormData
+
+
+class RawApiError(Exception):
+    """Ошибка Bot API облегченной отправки (код, описание и retry_after из ответа)"""
+
+    def __init__(self, method: str, error_code: Optional[int], description: Optional[str], retry_after: Optional[int] = None):
+        super().__init__(f"Telegram API {method}: [{error_code}] {description}")
+        self.method = method
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class RawBotApi:
+    """
+    Облегченная отправка через HTTP-сессию бота aiogram: payload собирается напрямую,
+    из ответа берутся только message_id и chat_id, без построения pydantic-модели Message
+    """
+
+    async def call(self, bot, method: str, payload: Dict[str, Any], files: Dict[str, str] = None) -> Dict[str, Any]:
+        """
+        Вызывает метод Bot API (files - поле -> путь к локальному файлу для загрузки).
+        Возвращает {'message_id', 'chat_id'}, при ошибке Telegram - RawApiError
+        """
+        session = bot.session
+        client = await session.create_session()
+        url = session.api.api_url(token=bot.token, method=method)
+        timeout = ClientTimeout(total=session.timeout)
+
+        opened = []
+        try:
+            if files:
+                form = FormData(quote_fields=False)
+                for name, value in self._prepare_payload(payload).items():
+                    form.add_field(name, value if isinstance(value, str) else session.json_dumps(value))
+                for name, file_path in files.items():
+                    file = open(file_path, 'rb')
+                    opened.append(file)
+                    form.add_field(name, file, filename=os.path.basename(file_path))
+                request = client.post(url, data=form, timeout=timeout)
+            else:
+                request = client.post(url, data=session.json_dumps(self._prepare_payload(payload)),
+                                      headers={'Content-Type': 'application/json'}, timeout=timeout)
+            async with request as response:
+                raw = await response.text()
+        finally:
+            for file in opened:
+                file.close()
+
+        return self._parse_response(session, method, raw)
+
+    def _prepare_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Убирает пустые поля, клавиатуры aiogram превращает в словари"""
+        prepared = {}
+        for name, value in payload.items():
+            if value is None:
+                continue
+            if hasattr(value, 'model_dump'):
+                value = value.model_dump(mode='json', exclude_none=True, by_alias=True)
+            prepared[name] = value
+        return prepared
+
+    def _parse_response(self, session, method: str, raw: str) -> Dict[str, Any]:
+        data = session.json_loads(raw)
+        if data.get('ok'):
+            result = data.get('result')
+            if isinstance(result, dict):
+                return {'message_id': result.get('message_id'), 'chat_id': (result.get('chat') or {}).get('id')}
+            return {'message_id': None, 'chat_id': None}
+
+        parameters = data.get('parameters') or {}
+        raise RawApiError(method, data.get('error_code'), data.get('description'), parameters.get('retry_after'))
@@ -1,6 +1,9 @@
+import time
+
 from aiogram.exceptions import TelegramBadRequest
 
 from .attach import AttachmentHandler
+from .raw_api import RawApiError, RawBotApi
 from .utils import MessengerUtils
 
 
@@ -12,10 +15,13 @@ class MessageSender:
         self.settings_manager = kwargs.get('settings_manager')
         self.placeholder_processor = kwargs.get('placeholder_processor')
         self.tg_button_mapper = kwargs.get('tg_button_mapper')
+        self.event_tracer = kwargs.get('event_tracer')
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings('tg_messenger')
         self.enable_placeholder = settings.get('enable_placeholder', True)
+        self.raw_send = settings.get('raw_send', True)
+        self.raw_api = RawBotApi()
         
         # Инициализируем зависимости
         self.attachment_handler = AttachmentHandler(**kwargs)
@@ -95,6 +101,8 @@ class MessageSender:
             reply_markup = self.utils.build_reply_markup(inline, reply, self.tg_button_mapper)
 
             # Отправляем или редактируем сообщение
+            trace_id = action.get('trace_id')
+            api_started_at = time.time()
             try:
                 last_message_id = None
                 if callback_edit and message_id:
@@ -112,26 +120,34 @@ class MessageSender:
                         if message_reply and message_id:
                             send_kwargs['reply_to_message_id'] = message_id
                             try:
-                                msg = await bot.send_message(**send_kwargs)
-                                last_message_id = msg.message_id
-                            except TelegramBadRequest as e:
+                                last_message_id = await self._send_text(bot, send_kwargs)
+                            except (TelegramBadRequest, RawApiError) as e:
                                 if 'message to reply not found' in str(e).lower():
                                     self.logger.warning(f"ответ на сообщение не удался (сообщение для ответа не найдено) для chat_id={chat_id}, message_id={message_id}: {e}. Отправляю новое сообщение без reply_to_message_id.")
                                     send_kwargs.pop('reply_to_message_id', None)
-                                    msg = await bot.send_message(**send_kwargs)
-                                    last_message_id = msg.message_id
+                                    last_message_id = await self._send_text(bot, send_kwargs)
                                 else:
                                     raise
                         else:
-                            msg = await bot.send_message(**send_kwargs)
-                            last_message_id = msg.message_id
+                            last_message_id = await self._send_text(bot, send_kwargs)
                     else:
                         # Нет ни текста, ни вложений - это ошибка
                         self.logger.error("Тип действия 'send' требует либо 'text', либо 'attachment'")
                         return {'success': False, 'error': 'Не указан текст или вложение'}
+            except RawApiError as e:
+                self.logger.error(f"Критическая ошибка при отправке сообщения: {e}")
+                return {
+                    'success': False,
+                    'error': f'Ошибка отправки сообщения: {str(e)}',
+                    'error_code': e.error_code,
+                    'retry_after': e.retry_after
+                }
             except Exception as e:
                 self.logger.error(f"Критическая ошибка при отправке сообщения: {e}")
                 return {'success': False, 'error': f'Ошибка отправки сообщения: {str(e)}'}
+            finally:
+                if trace_id and self.event_tracer:
+                    self.event_tracer.record_span(trace_id, 'bot_api', api_started_at)
 
             # Удаляем исходное сообщение если указан атрибут remove
             if remove and message_id:
@@ -148,6 +164,14 @@ class MessageSender:
             self.logger.error(f"Неожиданная ошибка в send_message: {e}")
             return {'success': False, 'error': f'Неожиданная ошибка: {str(e)}'}
 
+    async def _send_text(self, bot, send_kwargs: dict):
+        """Отправляет текстовое сообщение, возвращает message_id (raw_send - без разбора полной модели ответа)"""
+        if self.raw_send:
+            result = await self.raw_api.call(bot, 'sendMessage', send_kwargs)
+            return result['message_id']
+        msg = await bot.send_message(**send_kwargs)
+        return msg.message_id
+
     async def _edit_message(self, bot, chat_id, message_id, text, reply_markup, parse_mode):
         """Редактирует сообщение с fallback на отправку нового."""
         try:
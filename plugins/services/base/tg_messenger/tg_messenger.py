@@ -1,5 +1,7 @@
 import asyncio
 import json
+import time
+from typing import Optional
 
 from aiogram.exceptions import TelegramBadRequest
 
@@ -14,6 +16,9 @@ class TgMessengerService:
         self.settings_manager = kwargs['settings_manager']
         self.bot = kwargs['tg_bot_initializer'].get_bot()
         self.placeholder_processor = kwargs.get('placeholder_processor')
+        self.metrics_collector = kwargs.get('metrics_collector')
+        self.event_tracer = kwargs.get('event_tracer')
+        self.task_manager = kwargs.get('task_manager')
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings('tg_messenger')
@@ -21,6 +26,7 @@ class TgMessengerService:
         self.interval = settings.get('queue_read_interval', 0.05)
         self.batch_size = settings.get('queue_batch_size', 50)
         self.parse_mode = settings.get('parse_mode', None)
+        self.task_queue = settings.get('task_queue', 'high')
         
         # Инициализируем зависимости
         self.message_sender = MessageSender(**kwargs)
@@ -54,42 +60,106 @@ class TgMessengerService:
         self.logger.info(f"старт фонового цикла обработки очереди действий (interval={self.interval}, batch_size={self.batch_size}).")
         while True:
             try:
-                with self.database_service.session_scope('actions') as (_, repos):
-                    actions_repo = repos['actions']
-                    # Обрабатываем действия типа 'send' и 'remove'
-                    actions = actions_repo.get_pending_actions_by_type_parsed(['send', 'remove'], limit=self.batch_size)
-                    
-                    for action in actions:
-                        action_id = action['id']
-                        try:
-                            result = await self._handle_action(action)
-                            status = 'completed' if result.get('success') else 'failed'
-                            
-                            # Подготавливаем response_data для сохранения в БД
-                            response_data = {}
-                            if result.get('success'):
-                                if 'last_message_id' in result:
-                                    response_data['last_message_id'] = result['last_message_id']
-                            else:
-                                if 'error' in result:
-                                    response_data['error'] = result['error']
-                            
-                            # Сериализуем response_data в JSON-строку
-                            response_data_str = json.dumps(response_data, ensure_ascii=False) if response_data else None
-                            
-                        except Exception as e:
-                            self.logger.exception(f"Ошибка при обработке действия {action_id}: {e}")
-                            status = 'failed'
-                            response_data_str = json.dumps({'error': f'Ошибка обработки: {str(e)}'}, ensure_ascii=False)
-                        
-                        # Обновляем статус действия и response_data
-                        if not actions_repo.update_action(action_id, status=status, response_data=response_data_str):
-                            self.logger.error(f"Не удалось обновить статус действия {action_id} на {status}")
-                    
+                await self.process_batch()
             except Exception as e:
                 self.logger.error(f"ошибка в основном цикле: {e}")
+                if self.metrics_collector:
+                    self.metrics_collector.inc('messenger_loop_errors_total')
             await asyncio.sleep(self.interval)
 
+    async def process_batch(self) -> int:
+        """
+        Обрабатывает одну пачку pending-действий типа 'send' и 'remove'. Возвращает количество обработанных действий.
+        """
+        with self.database_service.session_scope('actions') as (_, repos):
+            actions_repo = repos['actions']
+            # Обрабатываем действия типа 'send' и 'remove'
+            actions = actions_repo.get_pending_actions_by_type_parsed(['send', 'remove'], limit=self.batch_size)
+            if self.metrics_collector and actions:
+                self.metrics_collector.set_gauge('messenger_batch_size', len(actions))
+            
+            if self.task_manager:
+                # Чаты обрабатываются параллельно через task_manager, действия одного чата - по порядку
+                chats = {}
+                for action in actions:
+                    chats.setdefault(action.get('chat_id'), []).append(action)
+                handled = set()
+                results = await asyncio.gather(*[
+                    self.task_manager.execute(
+                        self._process_chat_actions(chat_actions, actions_repo, handled),
+                        queue_name=self.task_queue,
+                        task_id=f"tg_messenger:{chat_id}"
+                    )
+                    for chat_id, chat_actions in chats.items()
+                ], return_exceptions=True)
+                for (chat_id, chat_actions), result in zip(chats.items(), results):
+                    if isinstance(result, BaseException):
+                        self._fail_unhandled_actions(chat_id, chat_actions, handled, actions_repo, result)
+            else:
+                await self._process_chat_actions(actions, actions_repo)
+            
+            return len(actions)
+
+    def _fail_unhandled_actions(self, chat_id, actions: list, handled: set, actions_repo, error: BaseException):
+        """Задача чата завершилась исключением (очередь недоступна, таймаут, отмена) - необработанные действия помечаются failed"""
+        unhandled = [action for action in actions if action['id'] not in handled]
+        self.logger.error(f"ошибка обработки действий чата {chat_id}: {error!r}, не обработано действий: {len(unhandled)}")
+        response_data_str = json.dumps({'error': f'Ошибка обработки: {error!r}'}, ensure_ascii=False)
+        for action in unhandled:
+            if self.metrics_collector:
+                self.metrics_collector.inc('messenger_actions_total', action_type=action.get('type', 'unknown'), status='error')
+            if not actions_repo.update_action(action['id'], status='failed', response_data=response_data_str):
+                self.logger.error(f"Не удалось обновить статус действия {action['id']} на failed")
+
+    async def _process_chat_actions(self, actions: list, actions_repo, handled: Optional[set] = None):
+        """Последовательно обрабатывает действия (одного чата) и сохраняет их статусы; handled - ID действий с сохраненным статусом"""
+        for action in actions:
+            action_id = action['id']
+            trace_id = action.get('trace_id')
+            if trace_id and self.event_tracer:
+                self.event_tracer.record_dequeued(trace_id, action_id)
+            try:
+                start = time.perf_counter()
+                result = await self._handle_action(action)
+                status = 'completed' if result.get('success') else 'failed'
+                
+                if self.metrics_collector:
+                    action_type = action.get('type', 'unknown')
+                    self.metrics_collector.observe('send_latency_seconds', time.perf_counter() - start, action_type=action_type)
+                    self.metrics_collector.inc('messenger_actions_total', action_type=action_type, status=status)
+                
+                # Подготавливаем response_data для сохранения в БД
+                response_data = {}
+                if result.get('success'):
+                    if 'last_message_id' in result:
+                        response_data['last_message_id'] = result['last_message_id']
+                else:
+                    if 'error' in result:
+                        response_data['error'] = result['error']
+                    # Код ошибки и retry_after (облегченная отправка raw_send)
+                    for field in ('error_code', 'retry_after'):
+                        if result.get(field) is not None:
+                            response_data[field] = result[field]
+                
+                # Сериализуем response_data в JSON-строку
+                response_data_str = json.dumps(response_data, ensure_ascii=False) if response_data else None
+                
+            except Exception as e:
+                self.logger.exception(f"Ошибка при обработке действия {action_id}: {e}")
+                status = 'failed'
+                if self.metrics_collector:
+                    self.metrics_collector.inc('messenger_actions_total', action_type=action.get('type', 'unknown'), status='error')
+                response_data_str = json.dumps({'error': f'Ошибка обработки: {str(e)}'}, ensure_ascii=False)
+            
+            # Обновляем статус действия и response_data
+            if not actions_repo.update_action(action_id, status=status, response_data=response_data_str):
+                self.logger.error(f"Не удалось обновить статус действия {action_id} на {status}")
+            if handled is not None:
+                handled.add(action_id)
+            
+            if trace_id and self.event_tracer:
+                self.event_tracer.finish(trace_id)
+
     def _extract_common_params(self, action: dict) -> dict:
         chat_id = action['chat_id']
         message_id = action.get('message_id')
@@ -9,18 +9,23 @@ class UserManager:
         self.logger = kwargs['logger']
         self.settings_manager = kwargs['settings_manager']
         self.datetime_formatter = kwargs['datetime_formatter']
+        self.task_manager = kwargs.get('task_manager')
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings('user_manager')
         self.queue_read_interval = settings.get('queue_read_interval', 0.1)
         self.queue_batch_size = settings.get('queue_batch_size', 50)
         self.state_expire = settings.get('state_expire', 600)
+        self.task_queue = settings.get('task_queue', 'medium')
 
     async def run(self):
         self.logger.info(f"старт фонового цикла (interval={self.queue_read_interval}, batch_size={self.queue_batch_size})")
         while True:
             try:
-                await self._process_queue()
+                if self.task_manager:
+                    await self.task_manager.execute(self._process_queue(), queue_name=self.task_queue, task_id='user_manager')
+                else:
+                    await self._process_queue()
             except Exception as e:
                 self.logger.error(f'Ошибка при обработке очереди: {e}')
             await asyncio.sleep(self.queue_read_interval)
@@ -8,6 +8,7 @@ class ActionQueueCleaner:
         self.database_service = kwargs['database_service']
         self.datetime_formatter = kwargs['datetime_formatter']
         self.settings_manager = kwargs['settings_manager']
+        self.task_manager = kwargs.get('task_manager')
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings('action_queue_cleaner')
@@ -15,25 +16,35 @@ class ActionQueueCleaner:
         self.queue_batch_size = settings.get('queue_batch_size', 1000)
         self.older_than_hours = settings.get('older_than_hours', 2)
         self.threshold_for_vacuum = settings.get('threshold_for_vacuum', 10000)
+        self.task_queue = settings.get('task_queue', 'heavy')
 
     async def run(self):
         self.logger.info(f"старт фонового цикла (interval={self.queue_read_interval}s, batch_size={self.queue_batch_size}, older_than={self.older_than_hours}h)")
         while True:
             try:
-                deleted_total = 0
-                while True:
-                    deleted = self._delete_batch()
-                    deleted_total += deleted
-                    if deleted < self.queue_batch_size:
-                        break
-                    await asyncio.sleep(1)  # пауза между батчами
-        
-                if deleted_total >= self.threshold_for_vacuum:
-                    self._vacuum()
+                if self.task_manager:
+                    await self.task_manager.execute(self._clean(), queue_name=self.task_queue, task_id='action_queue_cleaner')
+                else:
+                    await self._clean()
             except Exception as e:
                 self.logger.error(f"ActionQueueCleaner: ошибка при чистке: {e}")
             await asyncio.sleep(self.queue_read_interval)
 
+    async def _clean(self):
+        """Один цикл чистки очереди действий"""
+        self._release_expired_claims()
+
+        deleted_total = 0
+        while True:
+            deleted = self._delete_batch()
+            deleted_total += deleted
+            if deleted < self.queue_batch_size:
+                break
+            await asyncio.sleep(1)  # пауза между батчами
+
+        if deleted_total >= self.threshold_for_vacuum:
+            self._vacuum()
+
     def _delete_batch(self) -> int:
         with self.database_service.session_scope('actions') as (session, repos):
             actions_repo = repos['actions']
@@ -43,10 +54,17 @@ class ActionQueueCleaner:
             session.commit()
             return deleted
 
+    def _release_expired_claims(self):
+        """Возвращает в очередь действия упавшего процесса - аренда захвата истекла (PostgreSQL, статус processing)"""
+        if self.database_service.dialect != 'postgresql':
+            return
+        with self.database_service.session_scope('actions') as (_, repos):
+            repos['actions'].release_expired_claims()
+
     def _vacuum(self):
 
         try:
-            self.database_service.engine.execute("VACUUM;")
+            self.database_service.vacuum()
     
         except Exception as e:
             self.logger.error(f"ActionQueueCleaner: ошибка VACUUM: {e}")
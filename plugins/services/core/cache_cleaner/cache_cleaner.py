@@ -1,7 +1,12 @@
 import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Tuple
+from typing import Dict, List, Tuple
+
+# Недокачанные файлы MTProto и состояние их частей (file_manager, parallel_downloader)
+PARTIAL_SUFFIXES = ('.part', '.parts')
 
 
 class CacheCleaner:
@@ -10,6 +15,7 @@ class CacheCleaner:
         self.database_service = kwargs['database_service']
         self.datetime_formatter = kwargs['datetime_formatter']
         self.settings_manager = kwargs['settings_manager']
+        self.task_manager = kwargs.get('task_manager')
 
         settings = self.settings_manager.get_plugin_settings('cache_cleaner')
         self.queue_read_interval: int = settings.get('queue_read_interval', 600)
@@ -18,38 +24,53 @@ class CacheCleaner:
         self.older_than_without_file_hours: int = settings.get('older_than_without_file_hours', 2400)
         self.threshold_for_vacuum: int = settings.get('threshold_for_vacuum', 10000)
         self.dry_run: bool = settings.get('dry_run', False)
+        self.task_queue: str = settings.get('task_queue', 'heavy')
+        self.cache_folder: str = settings.get('cache_folder', 'download')
+        self.max_cache_size_mb: float = settings.get('max_cache_size_mb', 10240)
+        self.low_watermark: float = settings.get('low_watermark', 0.9)
+        self.orphan_grace_hours: float = settings.get('orphan_grace_hours', 1)
+        self.partial_grace_hours: float = settings.get('partial_grace_hours', 72)
+        self.delete_workers: int = settings.get('delete_workers', 4)
+
+        # Удаление файлов - блокирующие вызовы, выполняются в своем пуле
+        self._file_executor = ThreadPoolExecutor(max_workers=self.delete_workers, thread_name_prefix='cache_cleaner')
 
     async def run(self):
         self.logger.info(
             f"старт фонового цикла cache_cleaner (interval={self.queue_read_interval}s, batch_size={self.queue_batch_size}, "
-            f"with_file_retention={self.older_than_with_file_hours}h, without_file_retention={self.older_than_without_file_hours}h)"
+            f"with_file_retention={self.older_than_with_file_hours}h, without_file_retention={self.older_than_without_file_hours}h, "
+            f"max_size={self.max_cache_size_mb or '-'}MB)"
         )
         while True:
             try:
-                deleted_total = 0
-
-                # Сначала удаляем записи с файлами
-                while True:
-                    deleted = self._delete_batch(with_files=True)
-                    deleted_total += deleted
-                    if deleted < self.queue_batch_size:
-                        break
-                    await asyncio.sleep(1)
-
-                # Затем записи без файлов
-                while True:
-                    deleted = self._delete_batch(with_files=False)
-                    deleted_total += deleted
-                    if deleted < self.queue_batch_size:
-                        break
-                    await asyncio.sleep(1)
-
-                if deleted_total >= self.threshold_for_vacuum and not self.dry_run:
-                    self._vacuum()
+                if self.task_manager:
+                    await self.task_manager.execute(self._clean(), queue_name=self.task_queue, task_id='cache_cleaner')
+                else:
+                    await self._clean()
             except Exception as e:
                 self.logger.error(f"CacheCleaner: ошибка при чистке: {e}")
             await asyncio.sleep(self.queue_read_interval)
 
+    async def _clean(self):
+        """Один цикл чистки кэша (БД и файловая система - в потоках, вне event loop)"""
+        loop = asyncio.get_running_loop()
+        deleted_total = 0
+
+        # Сначала удаляем записи с файлами, затем записи без файлов
+        for with_files in (True, False):
+            while True:
+                deleted = await loop.run_in_executor(None, self._delete_batch, with_files)
+                deleted_total += deleted
+                if deleted < self.queue_batch_size:
+                    break
+                await asyncio.sleep(1)
+
+        # Бесхозные файлы и вытеснение давно не используемых файлов сверх лимита размера
+        deleted_total += await loop.run_in_executor(None, self._reconcile_cache_folder)
+
+        if deleted_total >= self.threshold_for_vacuum and not self.dry_run:
+            await loop.run_in_executor(None, self._vacuum)
+
     def _get_cutoffs(self) -> Tuple[object, object]:
         now = self.datetime_formatter.now_local()
         with_file_cutoff = now - timedelta(hours=self.older_than_with_file_hours)
@@ -60,52 +81,146 @@ class CacheCleaner:
         with_file_cutoff, without_file_cutoff = self._get_cutoffs()
         cutoff = with_file_cutoff if with_files else without_file_cutoff
 
-        deleted_count = 0
         with self.database_service.session_scope('cache') as (session, repos):
-            cache_repo = repos['cache']
-
-            records = cache_repo.list_old_cache(cutoff=cutoff, with_files=with_files, limit=self.queue_batch_size)
-            if not records:
-                return 0
-
-            for rec in records:
-                hash_key = rec.get('hash_key')
-                file_path = rec.get('hash_file_path')
-                if self.dry_run:
-                    self.logger.info(f"[dry-run] удаление кэша hash_key={hash_key} file_path={file_path or '-'}")
-                    deleted_count += 1
-                    continue
+            records = repos['cache'].list_old_cache(cutoff=cutoff, with_files=with_files, limit=self.queue_batch_size)
+        if not records:
+            return 0
+
+        hash_keys = [rec.get('hash_key') for rec in records]
+        file_paths = [self._resolve_path(rec['hash_file_path']) for rec in records if with_files and rec.get('hash_file_path')]
+        return self._delete_records(hash_keys, file_paths)
 
-                # Пытаемся удалить связанный файл здесь (с резолвингом относительного пути)
-                if with_files and file_path:
-                    try:
-                        resolved_path = file_path
-                        if not os.path.isabs(file_path):
-                            try:
-                                resolved_path = self.settings_manager.resolve_file_path(file_path)
-                            except Exception:
-                                resolved_path = file_path
-
-                        if os.path.exists(resolved_path):
-                            os.remove(resolved_path)
-                        else:
-                            pass
-                    except Exception as fe:
-                        self.logger.error(f"Ошибка удаления файла {file_path}: {fe}")
-
-                try:
-                    ok = cache_repo.delete_cache(hash_key)
-                    if ok:
-                        deleted_count += 1
-                except Exception as e:
-                    self.logger.error(f"CacheCleaner: ошибка удаления {hash_key}: {e}")
+    def _delete_records(self, hash_keys: List[str], file_paths: List[str]) -> int:
+        """Удаляет файлы (параллельно) и записи кэша (одним запросом на батч)"""
+        if self.dry_run:
+            for file_path in file_paths:
+                self.logger.info(f"[dry-run] удаление файла кэша {file_path}")
+            self.logger.info(f"[dry-run] удаление {len(hash_keys)} записей кэша")
+            return len(hash_keys)
 
+        self._remove_files(file_paths)
+
+        deleted_count = 0
+        for start in range(0, len(hash_keys), self.queue_batch_size):
+            with self.database_service.session_scope('cache') as (session, repos):
+                deleted_count += repos['cache'].delete_cache_bulk(hash_keys[start:start + self.queue_batch_size])
         return deleted_count
 
+    def _remove_files(self, file_paths: List[str]) -> int:
+        """Удаляет файлы в пуле потоков, возвращает количество удаленных"""
+        return sum(self._file_executor.map(self._remove_file, file_paths))
+
+    def _remove_file(self, file_path: str) -> bool:
+        try:
+            os.remove(file_path)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as fe:
+            self.logger.error(f"Ошибка удаления файла {file_path}: {fe}")
+            return False
+
+    def _resolve_path(self, file_path: str) -> str:
+        """Абсолютный путь файла кэша (в БД пути относительные)"""
+        if not os.path.isabs(file_path):
+            try:
+                file_path = self.settings_manager.resolve_file_path(file_path)
+            except Exception:
+                pass
+        return os.path.normpath(os.path.abspath(file_path))
+
+    # === Сверка папки кэша и вытеснение по размеру ===
+
+    def _reconcile_cache_folder(self) -> int:
+        """
+        Сверяет папку кэша с таблицей cache: удаляет незарегистрированные (бесхозные) файлы,
+        затем при превышении max_cache_size_mb вытесняет давно не используемые файлы до low_watermark
+        """
+        folder = self._resolve_path(self.cache_folder)
+        if not os.path.isdir(folder):
+            return 0
+
+        files = self._scan_folder(folder)
+        with self.database_service.session_scope('cache') as (session, repos):
+            registered = {self._resolve_path(path) for path in repos['cache'].iter_cache_file_paths(self.queue_batch_size)}
+
+        # Свежие файлы могут еще скачиваться или ждать регистрации в кэше;
+        # недокачанные части MTProto (.part и состояние .parts) хранятся дольше - по ним идет докачка
+        now = time.time()
+        orphan_cutoff = now - self.orphan_grace_hours * 3600
+        partial_cutoff = now - self.partial_grace_hours * 3600
+        orphans = [
+            path for path, (_, mtime) in files.items()
+            if path not in registered and mtime < (partial_cutoff if path.endswith(PARTIAL_SUFFIXES) else orphan_cutoff)
+        ]
+        if orphans:
+            if self.dry_run:
+                for path in orphans:
+                    self.logger.info(f"[dry-run] удаление бесхозного файла {path}")
+            else:
+                removed = self._remove_files(orphans)
+                self.logger.info(f"CacheCleaner: удалено бесхозных файлов: {removed}")
+            for path in orphans:
+                files.pop(path, None)
+
+        return self._evict_lru(files)
+
+    def _scan_folder(self, folder: str) -> Dict[str, Tuple[int, float]]:
+        """Размер и mtime всех файлов папки (рекурсивно, потоковым os.scandir)"""
+        files = {}
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                stat = entry.stat(follow_symlinks=False)
+                                files[os.path.normpath(entry.path)] = (stat.st_size, stat.st_mtime)
+                        except OSError:
+                            continue
+            except OSError as e:
+                self.logger.warning(f"CacheCleaner: не удалось прочитать папку {directory}: {e}")
+        return files
+
+    def _evict_lru(self, files: Dict[str, Tuple[int, float]]) -> int:
+        """Вытесняет давно не используемые файлы кэша, пока размер папки выше лимита"""
+        if not self.max_cache_size_mb:
+            return 0
+
+        total_size = sum(size for size, _ in files.values())
+        max_size = self.max_cache_size_mb * 1024 * 1024
+        if total_size <= max_size:
+            return 0
+
+        target_size = max_size * self.low_watermark
+        hash_keys, file_paths = [], []
+        with self.database_service.session_scope('cache') as (session, repos):
+            for rec in repos['cache'].iter_cache_files_lru(self.queue_batch_size):
+                if total_size <= target_size:
+                    break
+                path = self._resolve_path(rec['hash_file_path'])
+                if path not in files:
+                    # Файл вне папки кэша или уже удален
+                    continue
+                hash_keys.append(rec['hash_key'])
+                file_paths.append(path)
+                total_size -= files[path][0]
+
+        self.logger.info(
+            f"CacheCleaner: размер кэша превышает {self.max_cache_size_mb}MB, вытесняется файлов: {len(file_paths)}"
+        )
+        return self._delete_records(hash_keys, file_paths)
+
     def _vacuum(self):
         try:
-            self.database_service.engine.execute("VACUUM;")
+            self.database_service.vacuum()
         except Exception as e:
             self.logger.error(f"CacheCleaner: ошибка VACUUM: {e}")
 
-
+    def shutdown(self):
+        """Останавливает пул удаления файлов"""
+        self._file_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+
+class LoopMonitor:
+    """
+    Монитор event loop: измеряет задержку планирования периодическим таймером,
+    а из watchdog-потока снимает стек блокирующего кода и копит топ мест блокировки.
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+        self.metrics_collector = kwargs.get('metrics_collector')
+
+        # Получаем настройки через settings_manager
+        settings = self.settings_manager.get_plugin_settings('loop_monitor')
+        self.check_interval = settings.get('check_interval', 0.1)
+        self.lag_threshold = settings.get('lag_threshold', 0.05)
+        self.report_interval = settings.get('report_interval', 60)
+        self.top_n = settings.get('top_n', 10)
+        self.lag_window = settings.get('lag_window', 10000)
+
+        # Корень проекта - для выбора "своего" места вызова в стеке
+        self.project_root = os.path.abspath(os.getcwd())
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stop_event = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+        # Статистика
+        self._lags = deque(maxlen=self.lag_window)
+        self._max_lag = 0.0
+        self._blocked_samples: Counter = Counter()  # место вызова -> количество сэмплов
+        self._blocked_time: Counter = Counter()     # место вызова -> суммарное время блокировки (оценка)
+        self._blocked_stacks: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    async def run(self):
+        """Периодический таймер измерения задержки event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._start_watchdog()
+
+        self.logger.info(f"старт мониторинга event loop (interval={self.check_interval}s, threshold={self.lag_threshold * 1000:.0f}ms)")
+        next_report = time.monotonic() + self.report_interval
+
+        try:
+            while True:
+                expected = self._loop.time() + self.check_interval
+                await asyncio.sleep(self.check_interval)
+                lag = max(self._loop.time() - expected, 0.0)
+                self._last_beat = time.monotonic()
+
+                with self._lock:
+                    self._lags.append(lag)
+                    if lag > self._max_lag:
+                        self._max_lag = lag
+
+                if self.metrics_collector:
+                    self.metrics_collector.observe('loop_lag_seconds', lag)
+
+                if lag >= self.lag_threshold:
+                    self.logger.debug(f"задержка event loop: {lag * 1000:.1f}ms")
+
+                if self._last_beat >= next_report:
+                    self._log_report()
+                    next_report = self._last_beat + self.report_interval
+        finally:
+            self.shutdown()
+
+    # === Watchdog ===
+
+    def _start_watchdog(self):
+        """Запускает watchdog-поток снятия стеков"""
+        if self._watchdog and self._watchdog.is_alive():
+            return
+        self._stop_event.clear()
+        self._watchdog = threading.Thread(target=self._watchdog_loop, name='loop_monitor_watchdog', daemon=True)
+        self._watchdog.start()
+
+    def _watchdog_loop(self):
+        """Сэмплирует стек потока event loop, пока тот заблокирован дольше порога"""
+        sample_interval = max(self.lag_threshold / 2, 0.005)
+
+        while not self._stop_event.wait(sample_interval):
+            blocked_for = time.monotonic() - self._last_beat - self.check_interval
+            if blocked_for < self.lag_threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            try:
+                stack = traceback.extract_stack(frame)
+            except Exception:
+                continue
+            finally:
+                del frame
+
+            call_site = self._find_call_site(stack)
+            task_name = self._get_current_task_name()
+            key = f"{call_site} [{task_name}]" if task_name else call_site
+
+            with self._lock:
+                self._blocked_samples[key] += 1
+                self._blocked_time[key] += sample_interval
+                if key not in self._blocked_stacks:
+                    self._blocked_stacks[key] = traceback.format_list(stack[-12:])
+
+    def _find_call_site(self, stack: traceback.StackSummary) -> str:
+        """Самый глубокий кадр из кода проекта (иначе - самый глубокий кадр вообще)"""
+        for frame in reversed(stack):
+            filename = os.path.abspath(frame.filename)
+            if filename.startswith(self.project_root) and 'site-packages' not in filename:
+                return f"{os.path.relpath(filename, self.project_root)}:{frame.lineno} {frame.name}"
+        if stack:
+            frame = stack[-1]
+            return f"{frame.filename}:{frame.lineno} {frame.name}"
+        return "<unknown>"
+
+    def _get_current_task_name(self) -> Optional[str]:
+        """Имя корутины, выполняющейся в event loop в данный момент"""
+        try:
+            task = asyncio.current_task(self._loop)
+            return task.get_name() if task else None
+        except Exception:
+            return None
+
+    # === Отчеты ===
+
+    def get_report(self) -> Dict[str, Any]:
+        """Возвращает статистику задержек и топ блокирующих мест вызова"""
+        with self._lock:
+            lags = sorted(self._lags)
+            top = self._blocked_time.most_common(self.top_n)
+            samples = dict(self._blocked_samples)
+            stacks = {key: self._blocked_stacks.get(key, []) for key, _ in top}
+            max_lag = self._max_lag
+
+        def percentile(p: float) -> float:
+            if not lags:
+                return 0.0
+            return lags[min(len(lags) - 1, int(round(p / 100 * (len(lags) - 1))))]
+
+        return {
+            'samples': len(lags),
+            'lag_ms': {
+                'p50': round(percentile(50) * 1000, 2),
+                'p90': round(percentile(90) * 1000, 2),
+                'p99': round(percentile(99) * 1000, 2),
+                'max': round(max_lag * 1000, 2),
+            },
+            'top_blocking': [
+                {
+                    'call_site': key,
+                    'blocked_ms': round(blocked * 1000, 1),
+                    'samples': samples.get(key, 0),
+                    'stack': stacks.get(key, []),
+                }
+                for key, blocked in top
+            ],
+        }
+
+    def _log_report(self):
+        """Пишет в лог сводку задержек и топ блокирующих мест"""
+        report = self.get_report()
+        lag = report['lag_ms']
+        self.logger.info(f"задержка event loop: p50={lag['p50']}ms, p90={lag['p90']}ms, p99={lag['p99']}ms, max={lag['max']}ms")
+
+        for index, item in enumerate(report['top_blocking'], start=1):
+            self.logger.info(f"  #{index} блокировка ~{item['blocked_ms']}ms ({item['samples']} сэмплов): {item['call_site']}")
+
+    def shutdown(self):
+        """Останавливает watchdog-поток"""
+        self._stop_event.set()
+        if self._watchdog and self._watchdog.is_alive() and threading.current_thread() is not self._watchdog:
+            self._watchdog.join(timeout=1)
+        self._watchdog = None
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+
+class MetricsExporter:
+    """
+    Сервис экспорта метрик: отдает /metrics в формате Prometheus на локальном порту
+    и периодически обновляет глубину очереди действий по action_type.
+    При наличии event_tracer также отдает /stages (перцентили стадий) и /trace (Chrome trace-event JSON).
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+        self.metrics_collector = kwargs['metrics_collector']
+        self.database_service = kwargs['database_service']
+        self.event_tracer = kwargs.get('event_tracer')
+
+        # Получаем настройки через settings_manager
+        settings = self.settings_manager.get_plugin_settings('metrics_exporter')
+        self.host = settings.get('host', '127.0.0.1')
+        self.port = settings.get('port', 9464)
+        self.queue_depth_interval = settings.get('queue_depth_interval', 10)
+        self.export_traces_on_shutdown = settings.get('export_traces_on_shutdown', True)
+
+        self._server = None
+        self._known_action_types = set()
+
+    async def run(self):
+        """Запускает HTTP эндпоинт и цикл обновления глубины очереди"""
+        if not self.metrics_collector.enabled:
+            self.logger.warning("сбор метрик отключен (metrics_collector.metrics_enabled=false), эндпоинт будет отдавать пустой ответ")
+
+        try:
+            self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        except Exception as e:
+            self.logger.error(f"не удалось запустить эндпоинт метрик на {self.host}:{self.port}: {e}")
+            return
+
+        self.logger.info(f"▶️ эндпоинт метрик: http://{self.host}:{self.port}/metrics")
+        try:
+            while True:
+                if self.metrics_collector.enabled:
+                    try:
+                        self._update_queue_depth()
+                    except Exception as e:
+                        self.logger.error(f"ошибка обновления глубины очереди: {e}")
+                await asyncio.sleep(self.queue_depth_interval)
+        finally:
+            self.shutdown()
+
+    def _update_queue_depth(self):
+        """Обновляет gauge глубины очереди pending-действий по типам"""
+        with self.database_service.session_scope('actions') as (_, repos):
+            depth = repos['actions'].count_pending_by_type()
+
+        # Типы, по которым очередь опустела, обнуляем явно
+        for action_type in self._known_action_types - set(depth):
+            self.metrics_collector.set_gauge('actions_queue_depth', 0, action_type=action_type)
+        for action_type, count in depth.items():
+            self.metrics_collector.set_gauge('actions_queue_depth', count, action_type=action_type)
+        self._known_action_types |= set(depth)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Минимальный обработчик HTTP запроса (GET /metrics, /stages, /trace)"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Дочитываем заголовки до пустой строки
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            method = parts[0] if parts else ''
+            path = parts[1].split('?', 1)[0] if len(parts) > 1 else ''
+
+            if method == 'GET' and path == '/metrics':
+                body = self.metrics_collector.render_prometheus().encode('utf-8')
+                status = '200 OK'
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif method == 'GET' and path == '/stages' and self.event_tracer:
+                body = json.dumps(self.event_tracer.get_stage_percentiles(), ensure_ascii=False, indent=2).encode('utf-8')
+                status = '200 OK'
+                content_type = 'application/json; charset=utf-8'
+            elif method == 'GET' and path == '/trace' and self.event_tracer:
+                body = json.dumps(self.event_tracer.get_chrome_trace(), ensure_ascii=False).encode('utf-8')
+                status = '200 OK'
+                content_type = 'application/json; charset=utf-8'
+            else:
+                body = b'not found\n'
+                status = '404 Not Found'
+                content_type = 'text/plain; charset=utf-8'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except Exception as e:
+            self.logger.warning(f"ошибка обработки запроса метрик: {e}")
+        finally:
+            writer.close()
+
+    def shutdown(self):
+        """Останавливает HTTP эндпоинт и сохраняет сэмплированные трассы"""
+        if self.event_tracer and self.event_tracer.enabled and self.export_traces_on_shutdown:
+            self.event_tracer.export_chrome_trace()
+            self.export_traces_on_shutdown = False
+        if self._server:
+            self._server.close()
+            self._server = None
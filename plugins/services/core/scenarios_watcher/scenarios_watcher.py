@@ -0,0 +1,133 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .inotify import InotifyWatcher
+
+
+class ScenariosWatcher:
+    """
+    Горячая перезагрузка сценариев и триггеров: следит за файлами пресета (inotify, иначе опрос mtime)
+    и перезагружает scenarios_manager в потоке, не блокируя event loop.
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+        self.scenarios_manager = kwargs['scenarios_manager']
+        self.metrics_collector = kwargs.get('metrics_collector')
+
+        settings = self.settings_manager.get_plugin_settings('scenarios_watcher')
+        self.mode: str = settings.get('mode', 'auto')
+        self.poll_interval: float = settings.get('poll_interval', 2.0)
+        self.debounce: float = settings.get('debounce', 0.5)
+
+    async def run(self):
+        if self.mode in ('auto', 'inotify'):
+            try:
+                watcher = InotifyWatcher()
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"inotify недоступен ({e}), переключаемся на опрос файлов каждые {self.poll_interval}s")
+            else:
+                await self._run_inotify(watcher)
+                return
+        await self._run_polling()
+
+    # === inotify ===
+
+    async def _run_inotify(self, watcher: InotifyWatcher):
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def on_readable():
+            if watcher.read_events():
+                changed.set()
+
+        self._add_watches(watcher)
+        loop.add_reader(watcher.fd, on_readable)
+        self.logger.info(f"старт наблюдения за сценариями (inotify, debounce={self.debounce}s)")
+        try:
+            while True:
+                await changed.wait()
+                await self._wait_quiet(changed)
+                # Могли появиться новые подпапки сценариев
+                self._add_watches(watcher)
+                await self._reload()
+        finally:
+            loop.remove_reader(watcher.fd)
+            watcher.close()
+
+    async def _wait_quiet(self, changed: asyncio.Event):
+        """Ждет, пока изменения затихнут на debounce секунд (редактор пишет файл в несколько шагов)"""
+        while True:
+            changed.clear()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=self.debounce)
+            except asyncio.TimeoutError:
+                return
+
+    def _add_watches(self, watcher: InotifyWatcher):
+        """Наблюдение за папкой пресета и всеми папками сценариев"""
+        for directory in self._get_watch_dirs():
+            try:
+                watcher.add_watch(directory)
+            except OSError as e:
+                self.logger.warning(f"не удалось наблюдать за {directory}: {e}")
+
+    def _get_watch_dirs(self) -> List[str]:
+        dirs = []
+        for path in self.scenarios_manager.get_watch_paths():
+            if os.path.isdir(path):
+                dirs.extend(root for root, _, _ in os.walk(path))
+            elif os.path.isdir(os.path.dirname(path)):
+                # Файлы наблюдаем через папку - замена файла переименованием меняет inode
+                dirs.append(os.path.dirname(path))
+        return dirs
+
+    # === Опрос ===
+
+    async def _run_polling(self):
+        loop = asyncio.get_running_loop()
+        self.logger.info(f"старт наблюдения за сценариями (опрос каждые {self.poll_interval}s)")
+        snapshot = await loop.run_in_executor(None, self._get_files_snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await loop.run_in_executor(None, self._get_files_snapshot)
+            if current != snapshot:
+                snapshot = current
+                await self._reload()
+
+    def _get_files_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """mtime и размер всех YAML файлов пресета"""
+        snapshot = {}
+        for path in self.scenarios_manager.get_watch_paths():
+            if os.path.isdir(path):
+                files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+            else:
+                files = [path]
+            for file_path in files:
+                if not file_path.endswith(('.yaml', '.yml')):
+                    continue
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    # === Перезагрузка ===
+
+    async def _reload(self) -> Optional[bool]:
+        """Перезагружает сценарии в потоке: разбор, валидация и индексы строятся вне event loop"""
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(None, self.scenarios_manager.reload)
+        except Exception as e:
+            self.logger.error(f"ошибка перезагрузки сценариев: {e}")
+            ok = False
+
+        if self.metrics_collector:
+            self.metrics_collector.inc('scenarios_reloads_total', status='ok' if ok else 'failed')
+        if ok:
+            self.logger.info(f"сценарии перезагружены (версия {self.scenarios_manager.get_model().version})")
+        return ok
@@ -1,9 +1,15 @@
 import asyncio
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List, Optional
 
 from aiogram import Dispatcher, types
 
 from .media_group_processor import MediaGroupProcessor
+from .trigger_prefilter import TriggerPrefilter
+from .update_recorder import UpdateRecorder
+
+# Имя индекса префильтра в снимке сценариев
+PREFILTER_INDEX = 'tg_event_bot.prefilter'
 
 
 class TgEventBot:
@@ -20,6 +26,10 @@ class TgEventBot:
         self.datetime_formatter = kwargs['datetime_formatter']
         self.tg_media_group_merger = kwargs['tg_media_group_merger']
         self.event_parser = kwargs['event_parser']
+        self.metrics_collector = kwargs.get('metrics_collector')
+        self.event_tracer = kwargs.get('event_tracer')
+        self.scenarios_manager = kwargs.get('scenarios_manager')
+        self.tg_api_utils = kwargs.get('tg_api_utils')
         
         # Получаем время запуска из settings_manager
         self.startup_time = self.settings_manager.get_startup_time()
@@ -29,6 +39,9 @@ class TgEventBot:
         self.media_group_timeout = settings.get('media_group_timeout', 1.0)
         self.media_group_enabled = settings.get('media_group_enabled', True)
         self.max_event_age_seconds = settings.get('max_event_age_seconds', 60)
+        self.batch_mode = settings.get('batch_mode', False)
+        self.batch_limit = settings.get('batch_limit', 100)
+        self.polling_timeout = settings.get('polling_timeout', 30)
         
         # Создаем MediaGroupProcessor с tg_media_group_merger
         self.media_group_processor = MediaGroupProcessor(
@@ -36,8 +49,42 @@ class TgEventBot:
             logger=self.logger,
             media_group_merger=self.tg_media_group_merger
         )
+        
+        # Опциональная запись сырых updates для воспроизведения (tools/telegram/update_replay.py)
+        self.update_recorder = None
+        if settings.get('record_updates', False):
+            self.update_recorder = UpdateRecorder(
+                directory=settings.get('record_dir', 'data/recordings/updates'),
+                max_file_mb=settings.get('record_max_file_mb', 100),
+                max_files=settings.get('record_max_files', 20),
+                logger=self.logger
+            )
+        
+        # Префильтр по триггерам: сообщения, которые не могут совпасть, отбрасываются до парсинга
+        self._prefilter_enabled = bool(settings.get('prefilter_enabled', True) and self.scenarios_manager)
+        self.prefilter_dropped = 0
+        if self._prefilter_enabled:
+            # Префильтр хранится в снимке сценариев и строится до его публикации
+            self.scenarios_manager.subscribe(PREFILTER_INDEX, self._build_prefilter)
+        
+        # Получатель событий: по умолчанию trigger_manager, в многопроцессном режиме - маршрутизатор шардов
+        self._event_handler = self.trigger_manager.handle_event
+        # Получатель пачки событий (batch_mode): None - события пачки передаются _event_handler по одному
+        self._batch_handler = self.trigger_manager.handle_events
+        # Offset getUpdates пакетного режима - сохраняется между перезапусками run()
+        self._batch_offset: Optional[int] = None
         self._is_running = False
 
+    def _build_prefilter(self, model) -> TriggerPrefilter:
+        """Строит префильтр из снимка триггеров (вызывается из потока перезагрузки)"""
+        normalize_id = self.tg_api_utils.normalize_entity_id if self.tg_api_utils else None
+        return TriggerPrefilter(model.triggers, normalize_id)
+
+    def set_event_handler(self, handler):
+        """Заменяет получателя событий (async handler(event)); пачки тоже передаются ему по одному событию"""
+        self._event_handler = handler
+        self._batch_handler = None
+
     async def run(self):
         """
         Запускает polling событий Telegram через aiogram Dispatcher.
@@ -52,7 +99,13 @@ class TgEventBot:
                 self.logger.error("❌ Бот недоступен, polling не запускается")
                 return
             
+            if self.batch_mode:
+                await self._run_batch_polling(bot)
+                return
+            
             dp = Dispatcher()
+            if self.update_recorder:
+                dp.update.outer_middleware(self._record_update_middleware)
             router = self._create_router()
             dp.include_router(router)
             await dp.start_polling(bot)
@@ -64,6 +117,76 @@ class TgEventBot:
                 # Рекурсивно перезапускаем polling
                 await self.run()
 
+    async def _run_batch_polling(self, bot):
+        """
+        Polling пачками: все updates одного getUpdates разбираются вместе и передаются в trigger_manager
+        одной пачкой (одна транзакция на пачку) - быстрое догоняние после простоя
+        """
+        self.logger.info(f"пакетный режим polling (до {self.batch_limit} updates за запрос)")
+        while self._is_running:
+            updates = await bot.get_updates(
+                offset=self._batch_offset,
+                limit=self.batch_limit,
+                timeout=self.polling_timeout,
+                allowed_updates=['message', 'callback_query']
+            )
+            if not updates:
+                continue
+            self._batch_offset = updates[-1].update_id + 1
+            await self._process_updates_batch(updates)
+
+    async def _process_updates_batch(self, updates: List[types.Update]):
+        """Разбирает пачку updates и передает прошедшие фильтры события в порядке поступления"""
+        received_at = time.time()
+        events = []
+        for update in updates:
+            try:
+                if self.update_recorder:
+                    self.update_recorder.record(update.model_dump(mode='json', exclude_none=True), received_at)
+                
+                if update.message:
+                    event = await self._parse_message_update(update.message)
+                elif update.callback_query:
+                    event = self.event_parser.parse_bot_api_callback(update.callback_query)
+                else:
+                    continue
+                
+                if event and self._accept_event(event, received_at):
+                    events.append(event)
+            except Exception as e:
+                # Ошибка одного update не должна терять остальную пачку
+                self.logger.error(f"Ошибка разбора update {update.update_id}: {e}")
+        
+        if not events:
+            return
+        
+        start = time.perf_counter()
+        if self._batch_handler:
+            try:
+                await self._batch_handler(events)
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки пачки из {len(events)} событий: {e}")
+        else:
+            for event in events:
+                try:
+                    await self._event_handler(event)
+                except Exception as e:
+                    self.logger.error(f"Ошибка обработки события chat_id={event.get('chat_id')}, user_id={event.get('user_id')}: {e}")
+        
+        if self.metrics_collector:
+            self.metrics_collector.observe('event_batch_dispatch_seconds', time.perf_counter() - start)
+
+    async def _record_update_middleware(self, handler, update: types.Update, data: Dict[str, Any]):
+        """Записывает сырой update до обработки"""
+        self.update_recorder.record(update.model_dump(mode='json', exclude_none=True), time.time())
+        return await handler(update, data)
+
+    def shutdown(self):
+        """Закрывает файл записи updates"""
+        self._is_running = False
+        if self.update_recorder:
+            self.update_recorder.close()
+
     def _create_router(self):
         """
         Создаёт и настраивает router с обработчиками событий Telegram.
@@ -74,29 +197,36 @@ class TgEventBot:
         # Обработчик обычных сообщений
         @router.message()
         async def handle_message(message: types.Message):
-            # --- Новый блок: обработка вступления новых участников ---
-            if message.new_chat_members:
-                event = self.event_parser.parse_bot_api_new_member(message)
-                if event:
-                    await self._dispatch_event(event)
-                return
-            # --- Конец нового блока ---
-            event = await self._handle_message(message)
+            received_at = time.time()
+            event = await self._parse_message_update(message)
             if event:
-                await self._dispatch_event(event)
+                await self._dispatch_event(event, received_at)
 
         # Обработчик callback кнопок
         @router.callback_query()
         async def handle_callback(callback: types.CallbackQuery):
+            received_at = time.time()
             event = self.event_parser.parse_bot_api_callback(callback)
             if event:
-                await self._dispatch_event(event)
+                await self._dispatch_event(event, received_at)
 
         # Отредактированные сообщения, опросы, inline запросы - не обрабатываем
         # aiogram автоматически их проигнорирует без регистрации обработчиков
 
         return router
 
+    async def _parse_message_update(self, message: types.Message) -> Optional[Dict[str, Any]]:
+        """
+        Разбирает сообщение из update: вступление участников, префильтр, обычное сообщение.
+        Возвращает event или None (отброшено или ушло в группировку media group).
+        """
+        # Обработка вступления новых участников
+        if message.new_chat_members:
+            return self.event_parser.parse_bot_api_new_member(message)
+        if self._is_prefiltered(message):
+            return None
+        return await self._handle_message(message)
+
     async def _handle_message(self, message: types.Message):
         """
         Обрабатывает входящее сообщение. Возвращает event или None.
@@ -115,6 +245,29 @@ class TgEventBot:
         else:
             return event
 
+    def _is_prefiltered(self, message: types.Message) -> bool:
+        """
+        Сообщение не может совпасть ни с одним триггером - отбрасывается до парсинга, дедупликации и записи в БД.
+        Вместо лога на каждое сообщение - счетчик. Части media group не фильтруются: текст может быть в другой части
+        """
+        prefilter = self.scenarios_manager.get_model().get_index(PREFILTER_INDEX) if self._prefilter_enabled else None
+        if prefilter is None or not message.chat or message.media_group_id:
+            return False
+        
+        from_user = message.from_user
+        if prefilter.can_match(
+            chat_id=message.chat.id,
+            text=message.text or message.caption,
+            is_forward=bool(message.forward_from or message.forward_from_chat),
+            is_bot=bool(from_user.is_bot) if from_user else False
+        ):
+            return False
+        
+        self.prefilter_dropped += 1
+        if self.metrics_collector:
+            self.metrics_collector.inc('events_dropped_total', reason='prefilter')
+        return True
+
     def _should_ignore_message(self, message: types.Message) -> bool:
         """
         Проверяет, нужно ли игнорировать сообщение.
@@ -166,16 +319,43 @@ class TgEventBot:
     async def _media_group_callback(self, event: dict):
         await self._dispatch_event(event)
 
-    async def _dispatch_event(self, event: Dict[str, Any]):
+    async def _dispatch_event(self, event: Dict[str, Any], received_at: Optional[float] = None):
         """
         Централизованная обработка и отправка event в trigger_manager.
         Здесь можно добавить pre-processing, валидацию, логику модификации event.
         """
         # event уже является безопасным словарем (из event_parser)
+        start = time.perf_counter()
+        if not self._accept_event(event, received_at):
+            return
+        
+        await self._event_handler(event)
+        
+        if self.metrics_collector:
+            self.metrics_collector.observe('event_dispatch_seconds', time.perf_counter() - start)
+
+    def _accept_event(self, event: Dict[str, Any], received_at: Optional[float] = None) -> bool:
+        """
+        Трассировка, метрики и фильтры перед передачей event: системные сообщения и возраст события.
+        True - событие передается получателю.
+        """
+        # Correlation id события: пробрасывается через trigger_manager в actions и до MessageSender
+        if self.event_tracer:
+            trace_id = self.event_tracer.start_trace(received_at)
+            if trace_id:
+                event['trace_id'] = trace_id
+                if received_at:
+                    self.event_tracer.record_span(trace_id, 'parse', received_at)
+        
+        metrics = self.metrics_collector
+        if metrics:
+            metrics.inc('events_total', source_type=event.get('source_type', 'unknown'))
         
         # Пост-обработка: фильтруем системные сообщения без полезного содержимого
         if self._should_ignore_event(event):
-            return
+            if metrics:
+                metrics.inc('events_dropped_total', reason='ignored')
+            return False
         
         event_date = event.get('event_date')
         try:
@@ -183,9 +363,12 @@ class TgEventBot:
             event_dt = self.datetime_formatter.parse(event_date) if isinstance(event_date, str) else event_date
             delta = (startup_dt - event_dt).total_seconds()
             if self.max_event_age_seconds > delta:
-                await self.trigger_manager.handle_event(event)
-            else:
-                return
+                return True
+            if metrics:
+                metrics.inc('events_dropped_total', reason='too_old')
+            return False
         except Exception as e:
             self.logger.warning(f"⚠️ Ошибка при фильтрации event по времени: {e}")
-            await self.trigger_manager.handle_event(event)
+            if metrics:
+                metrics.inc('events_errors_total', stage='dispatch')
+            return True
@@ -0,0 +1,125 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Цель триггера: (область чатов, forward_enabled, bot_enabled)
+# Область чатов: (all, group, private, нормализованные ID чатов)
+Scope = Tuple[bool, bool, bool, frozenset]
+Target = Tuple[Scope, bool, bool]
+
+
+class TriggerPrefilter:
+    """
+    Дешевая проверка сообщения до парсинга: может ли оно совпасть хоть с одним текстовым триггером.
+    Строится из снимка триггеров по правилам trigger_processing
+    (exact, regex, starts_with, contains, "*", from_chat, forward_enabled, bot_enabled).
+    Триггеры состояний зависят от БД - при их наличии пропускаются все сообщения
+    """
+
+    def __init__(self, triggers: Dict[str, Any], normalize_id: Optional[Callable[[int], Optional[int]]] = None):
+        self.normalize_id = normalize_id or (lambda chat_id: chat_id)
+
+        text_triggers = triggers.get('text') or {}
+        self.pass_all = bool(text_triggers.get('state'))
+
+        self.universal = self._compile_targets(text_triggers.get('*'))
+        self.exact: Dict[str, List[Target]] = {}
+        for key, value in (text_triggers.get('exact') or {}).items():
+            self.exact.setdefault(str(key).lower(), []).extend(self._compile_targets(value))
+        self.starts_with = [(str(key).lower(), self._compile_targets(value))
+                            for key, value in (text_triggers.get('starts_with') or {}).items()]
+        self.contains = [(str(key).lower(), self._compile_targets(value))
+                         for key, value in (text_triggers.get('contains') or {}).items()]
+        self.regex = []
+        for pattern, value in (text_triggers.get('regex') or {}).items():
+            try:
+                self.regex.append((re.compile(pattern, re.IGNORECASE), self._compile_targets(value)))
+            except re.error:
+                # Некорректное выражение не совпадает и в trigger_processing (там же логируется)
+                continue
+
+        # Быстрый отказ по чату: объединение областей всех текстовых триггеров
+        all_targets = list(self.universal)
+        for targets in self.exact.values():
+            all_targets.extend(targets)
+        for _, targets in self.starts_with + self.contains + self.regex:
+            all_targets.extend(targets)
+        self.chat_scope = self._merge_scopes([target[0] for target in all_targets])
+
+    def _compile_targets(self, value) -> List[Target]:
+        """Значение триггера (строка, словарь или список) -> цели; строка по умолчанию только для private"""
+        if isinstance(value, str):
+            triggers = [{'scenario': value, 'from_chat': ['private']}]
+        elif isinstance(value, dict):
+            triggers = [value] if 'scenario' in value else []
+        elif isinstance(value, list):
+            triggers = [item for item in value if isinstance(item, dict) and 'scenario' in item]
+        else:
+            triggers = []
+
+        return [
+            (self._compile_scope(trigger.get('from_chat', ['private'])),
+             bool(trigger.get('forward_enabled', False)),
+             bool(trigger.get('bot_enabled', False)))
+            for trigger in triggers if trigger.get('scenario')
+        ]
+
+    def _compile_scope(self, from_chat) -> Scope:
+        if not from_chat:
+            # Пустой фильтр пропускает все чаты
+            return True, False, False, frozenset()
+        if not isinstance(from_chat, list):
+            from_chat = [from_chat]
+        ids = frozenset(self.normalize_id(item) for item in from_chat if isinstance(item, int) and not isinstance(item, bool))
+        return 'all' in from_chat, 'group' in from_chat, 'private' in from_chat, ids
+
+    def _merge_scopes(self, scopes: List[Scope]) -> Scope:
+        return (any(scope[0] for scope in scopes),
+                any(scope[1] for scope in scopes),
+                any(scope[2] for scope in scopes),
+                frozenset().union(*(scope[3] for scope in scopes)))
+
+    @staticmethod
+    def _in_scope(scope: Scope, chat_type: str, chat_key) -> bool:
+        is_all, is_group, is_private, ids = scope
+        return (is_all or (is_group and chat_type == 'group')
+                or (is_private and chat_type == 'private') or chat_key in ids)
+
+    def can_match(self, chat_id: int, text: Optional[str], is_forward: bool = False, is_bot: bool = False) -> bool:
+        """False - сообщение гарантированно не совпадет ни с одним триггером"""
+        if self.pass_all:
+            return True
+
+        # Тип чата определяется по знаку ID, как в trigger_processing
+        chat_type = 'group' if chat_id < 0 else 'private'
+        chat_key = self.normalize_id(chat_id)
+        if not self._in_scope(self.chat_scope, chat_type, chat_key):
+            return False
+
+        def accepts(targets: List[Target]) -> bool:
+            for scope, forward_enabled, bot_enabled in targets:
+                if is_forward and not forward_enabled:
+                    continue
+                if is_bot and not bot_enabled:
+                    continue
+                if self._in_scope(scope, chat_type, chat_key):
+                    return True
+            return False
+
+        if accepts(self.universal):
+            return True
+        if not text:
+            return False
+
+        lower_text = text.lower()
+        if accepts(self.exact.get(lower_text, ())):
+            return True
+        for prefix, targets in self.starts_with:
+            if lower_text.startswith(prefix) and accepts(targets):
+                return True
+        for keyword, targets in self.contains:
+            if keyword in lower_text and accepts(targets):
+                return True
+        for pattern, targets in self.regex:
+            if pattern.search(text) and accepts(targets):
+                return True
+        return False
@@ -0,0 +1,76 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class UpdateRecorder:
+    """
+    Запись сырых Telegram updates в ротируемые JSONL файлы.
+    Каждая строка: {"received_at": <unix time>, "update": <update JSON>}.
+    Записи читает tools/telegram/update_replay.py.
+    """
+
+    def __init__(self, directory: str, max_file_mb: float = 100, max_files: int = 20,
+                 flush_interval: float = 1.0, logger=None):
+        self.directory = directory
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.logger = logger
+
+        self._file = None
+        self._file_bytes = 0
+        self._last_flush = 0.0
+        self.recorded = 0
+
+    def record(self, update: Dict[str, Any], received_at: Optional[float] = None):
+        """Добавляет update в текущий файл (с ротацией по размеру)"""
+        line = json.dumps({'received_at': received_at or time.time(), 'update': update}, ensure_ascii=False) + '\n'
+        data = line.encode('utf-8')
+
+        try:
+            if self._file is None or self._file_bytes + len(data) > self.max_file_bytes:
+                self._rotate()
+
+            self._file.write(data)
+            self._file_bytes += len(data)
+            self.recorded += 1
+
+            # Буферизованная запись со сбросом не чаще flush_interval
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Ошибка записи update: {e}")
+
+    def _rotate(self):
+        """Закрывает текущий файл, открывает новый и удаляет старые"""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+
+        file_path = os.path.join(self.directory, f"updates_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl")
+        self._file = open(file_path, 'ab')
+        self._file_bytes = 0
+        if self.logger:
+            self.logger.info(f"запись updates в {file_path}")
+
+        files = sorted(glob.glob(os.path.join(self.directory, 'updates_*.jsonl')))
+        for old_file in files[:-self.max_files] if self.max_files > 0 else []:
+            try:
+                os.remove(old_file)
+            except OSError:
+                pass
+
+    def close(self):
+        """Сбрасывает буфер и закрывает текущий файл"""
+        if self._file:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
@@ -0,0 +1,38 @@
+from typing import Optional
+
+
+class BatchSession:
+    """
+    Сессия пакетной записи: commit() репозиториев выполняет только flush (ID новых строк доступны сразу),
+    транзакция фиксируется один раз в finish(). rollback() любого репозитория помечает пакет неудачным -
+    изменения всего пакета отменяются
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self.failed = False
+        self.error: Optional[Exception] = None
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def commit(self):
+        self._session.flush()
+
+    def rollback(self):
+        self.failed = True
+        self._session.rollback()
+
+    def finish(self) -> bool:
+        """Фиксирует пакет одной транзакцией. False - пакет отменен"""
+        if self.failed:
+            self._session.rollback()
+            return False
+        try:
+            self._session.commit()
+            return True
+        except Exception as e:
+            self._session.rollback()
+            self.failed = True
+            self.error = e
+            return False
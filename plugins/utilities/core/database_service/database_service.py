@@ -1,9 +1,14 @@
 import os
+import socket
+import threading
+import time
+import uuid
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from .batch_session import BatchSession
 from .models import Action, Base, Cache, InviteLink, Request, User, UserState, PromoCode
 from .repositories.actions import ActionsRepository
 from .repositories.cache import CacheRepository
@@ -24,23 +29,66 @@ class DatabaseService:
         self.data_converter = kwargs['data_converter']
         self.action_parser = kwargs['action_parser']
         self.placeholder_processor = kwargs.get('placeholder_processor')
+        self.metrics_collector = kwargs.get('metrics_collector')
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings("database_service")
         
         self.database_url = settings.get('database_url', 'sqlite:///data/core.db')
         self.echo = settings.get('echo', False)
+        self.pool_size = settings.get('pool_size', 10)
+        self.max_overflow = settings.get('max_overflow', 20)
+        self.pool_timeout = settings.get('pool_timeout', 30)
+        self.pool_recycle = settings.get('pool_recycle', 1800)
+        self.pool_pre_ping = settings.get('pool_pre_ping', True)
+        self.claim_lease_seconds = settings.get('claim_lease_seconds', 60)
+        
+        # Владелец захватов очереди действий (PostgreSQL): пока процесс жив, heartbeat продлевает аренду его захватов
+        self.claimer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._claim_heartbeat = None
+        self._claim_heartbeat_lock = threading.Lock()
+        
+        # Шард процесса (многопроцессный режим) - для разделения очереди действий между воркерами
+        shard = self.settings_manager.get_shard()
+        self.shard_index = shard[0] if shard else None
         
         # Создаём директорию для базы данных, если её нет
         self._ensure_database_directory()
         
         # Создаём engine и фабрику сессий
-        self.engine = create_engine(self.database_url, echo=self.echo, future=True)
+        self.engine = create_engine(self.database_url, echo=self.echo, future=True, **self._get_pool_options())
+        self.dialect = self.engine.dialect.name
         self.session_factory = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, future=True)
         
         # Создаём таблицы при инициализации
         self.create_all()
 
+        self._check_compression()
+
+    def _get_pool_options(self) -> dict:
+        """Параметры пула соединений (для SQLite используется пул по умолчанию)"""
+        if self.database_url.startswith('sqlite'):
+            return {}
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': self.pool_pre_ping,
+        }
+
+    def _check_compression(self):
+        """
+        PostgreSQL сжимает JSONB сам (TOAST), а сжатое data_converter значение не является JSON -
+        отключаем сжатие записи. Ранее сжатые значения по-прежнему распаковываются при чтении
+        """
+        if self.dialect == 'postgresql' and getattr(self.data_converter, 'compression_enabled', False):
+            self.data_converter.compression_enabled = False
+            self.logger.warning(
+                "PostgreSQL: JSON-колонки хранятся в JSONB и сжимаются TOAST - "
+                "data_converter.compression_enabled отключен"
+            )
+
     def _ensure_database_directory(self):
         """Создаёт директорию для базы данных, если её нет."""
         try:
@@ -65,25 +113,36 @@ class DatabaseService:
             # Не прерываем инициализацию - возможно, директория уже существует
 
     @contextmanager
-    def session_scope(self, *repo_names):
-        """Контекстный менеджер для сессии и репозиториев."""
+    def session_scope(self, *repo_names, batch: bool = False):
+        """
+        Контекстный менеджер для сессии и репозиториев.
+        batch=True - одна транзакция на весь блок: commit репозиториев выполняет flush,
+        фиксация при выходе (session.failed - пакет отменен из-за ошибки)
+        """
         session = self.session_factory()
         try:
+            repo_session = BatchSession(session) if batch else session
             repos = {}
             if 'actions' in repo_names:
+                if self.dialect == 'postgresql':
+                    self._ensure_claim_heartbeat()
                 repos['actions'] = ActionsRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=Action,
                     datetime_formatter=self.datetime_formatter,
                     data_preparer=self.data_preparer,
                     data_converter=self.data_converter,
                     action_parser=self.action_parser,
-                    placeholder_processor=self.placeholder_processor
+                    placeholder_processor=self.placeholder_processor,
+                    metrics_collector=self.metrics_collector,
+                    shard_index=self.shard_index,
+                    claimer_id=self.claimer_id,
+                    claim_lease_seconds=self.claim_lease_seconds
                 )
             if 'users' in repo_names:
                 repos['users'] = UsersRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=User,
                     datetime_formatter=self.datetime_formatter,
@@ -92,7 +151,7 @@ class DatabaseService:
                 )
             if 'user_states' in repo_names:
                 repos['user_states'] = UserStatesRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=UserState,
                     datetime_formatter=self.datetime_formatter,
@@ -101,7 +160,7 @@ class DatabaseService:
                 )
             if 'requests' in repo_names:
                 repos['requests'] = RequestsRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=Request,
                     datetime_formatter=self.datetime_formatter,
@@ -110,7 +169,7 @@ class DatabaseService:
                 )
             if 'invite_links' in repo_names:
                 repos['invite_links'] = InviteLinksRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=InviteLink,
                     datetime_formatter=self.datetime_formatter,
@@ -119,7 +178,7 @@ class DatabaseService:
                 )
             if 'cache' in repo_names:
                 repos['cache'] = CacheRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=Cache,
                     datetime_formatter=self.datetime_formatter,
@@ -128,7 +187,7 @@ class DatabaseService:
                 )
             if 'promo_codes' in repo_names:
                 repos['promo_codes'] = PromoCodesRepository(
-                    session=session,
+                    session=repo_session,
                     logger=self.logger,
                     model=PromoCode,
                     datetime_formatter=self.datetime_formatter,
@@ -136,10 +195,34 @@ class DatabaseService:
                     data_converter=self.data_converter
                 )
 
-            yield session, repos
+            yield repo_session, repos
+            
+            if batch and not repo_session.finish():
+                reason = f": {repo_session.error}" if repo_session.error else " (ошибка операции в пакете)"
+                self.logger.error(f"Пакетная транзакция отменена{reason}")
         finally:
             session.close()
 
+    def _ensure_claim_heartbeat(self):
+        """Запускает поток продления аренды захваченных действий (один на процесс, при первом обращении к очереди)"""
+        if self._claim_heartbeat is not None:
+            return
+        with self._claim_heartbeat_lock:
+            if self._claim_heartbeat is None:
+                self._claim_heartbeat = threading.Thread(target=self._renew_claims_loop, name='action_claims_heartbeat', daemon=True)
+                self._claim_heartbeat.start()
+
+    def _renew_claims_loop(self):
+        """Продлевает аренду захватов процесса чаще, чем она истекает; после падения процесса аренда истекает сама"""
+        interval = max(self.claim_lease_seconds / 3, 1)
+        while True:
+            time.sleep(interval)
+            try:
+                with self.session_scope('actions') as (_, repos):
+                    repos['actions'].renew_claims()
+            except Exception as e:
+                self.logger.warning(f"Ошибка продления захвата действий: {e}")
+
     def create_all(self):
         """Создаёт все таблицы в БД согласно моделям."""
         try:
@@ -148,6 +231,14 @@ class DatabaseService:
         except Exception as e:
             self.logger.error(f"Ошибка при создании таблиц: {e}")
     
+    def vacuum(self):
+        """Освобождает место после массового удаления (SQLite: VACUUM, PostgreSQL: VACUUM ANALYZE)."""
+        statement = "VACUUM ANALYZE" if self.dialect == 'postgresql' else "VACUUM"
+        # VACUUM нельзя выполнять внутри транзакции
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(statement))
+        self.logger.info(f"{statement} выполнен")
+    
     def get_table_class_map(self):
         """Получает карту таблиц: имя таблицы -> класс модели."""
         table_class_map = {}
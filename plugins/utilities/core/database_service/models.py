@@ -1,9 +1,47 @@
-from sqlalchemy import (Boolean, Column, DateTime, Index, Integer, String,
-                        Text, func)
+import json
+
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Index, Integer,
+                        String, Text, func)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
 
 Base = declarative_base()
 
+# Telegram id не помещаются в int4 PostgreSQL; в SQLite остается INTEGER
+TelegramId = BigInteger().with_variant(Integer, 'sqlite')
+
+
+class JSONText(TypeDecorator):
+    """
+    JSON-колонка: в PostgreSQL - нативный JSONB, в остальных БД - TEXT.
+    Репозитории работают с JSON-строками (data_preparer/data_converter) независимо от БД.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'postgresql' or value is None:
+            return value
+        if isinstance(value, str):
+            # Строку JSON храним как документ, остальные строки (например, сжатые) - как JSON-строку
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    def process_result_value(self, value, dialect):
+        if dialect.name != 'postgresql' or value is None or isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+
+
 # Используем SQL-функцию для получения локального времени сервера
 def dtf_now_local():
     return func.now()
@@ -14,31 +52,36 @@ class Action(Base):
     action_type = Column(String, nullable=False)
     
     # Четкое разделение данных по источникам
-    event_data = Column(Text, nullable=False)       # JSON с данными события (user_id, chat_id, event_text и т.д.)
-    action_data = Column(Text, nullable=False)      # JSON с конфигурацией действия из сценария (type, text, placeholder и т.д.)
-    response_data = Column(Text, nullable=True)     # JSON с результатом выполнения действия
-    prev_data = Column(Text, nullable=True)         # JSON с информацией с предыдущих действий по цепочке
-    placeholder_data = Column(Text, nullable=True)  # JSON с данными после обработки плейсхолдеров
+    event_data = Column(JSONText, nullable=False)       # JSON с данными события (user_id, chat_id, event_text и т.д.)
+    action_data = Column(JSONText, nullable=False)      # JSON с конфигурацией действия из сценария (type, text, placeholder и т.д.)
+    response_data = Column(JSONText, nullable=True)     # JSON с результатом выполнения действия
+    prev_data = Column(JSONText, nullable=True)         # JSON с информацией с предыдущих действий по цепочке
+    placeholder_data = Column(JSONText, nullable=True)  # JSON с данными после обработки плейсхолдеров
     
     # Служебные поля
     status = Column(String, default='pending')
     prev_action_id = Column(Integer, nullable=True)
-    unlock_status = Column(Text, nullable=True)  # Ожидаемый статус предыдущего действия для разблокировки
-    chain_drop_status = Column(Text, nullable=True)  # Статусы для дропа цепочки (JSON массив, например ["failed"])
+    unlock_status = Column(JSONText, nullable=True)  # Ожидаемый статус предыдущего действия для разблокировки
+    chain_drop_status = Column(JSONText, nullable=True)  # Статусы для дропа цепочки (JSON массив, например ["failed"])
     is_unlocker_checked = Column(Boolean, default=False)  # Флаг проверки анлокером
+    trace_id = Column(String, nullable=True)  # Correlation id события (event_tracer)
+    shard = Column(Integer, nullable=True)  # Шард процесса-создателя (многопроцессный режим), NULL - без шардирования
     created_at = Column(DateTime, nullable=False, default=dtf_now_local)
     processed_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String, nullable=True)  # Процесс, захвативший действие (PostgreSQL, статус processing)
+    lease_until = Column(DateTime, nullable=True)  # Срок аренды захвата - продлевается процессом-владельцем, пока он жив
     __table_args__ = (
         Index('idx_actions_status_created', 'status', 'created_at'),
         Index('idx_actions_prev_action_id', 'prev_action_id'),
         Index('idx_actions_prev_action_status', 'prev_action_id', 'status'),
         Index('idx_actions_created_at', 'created_at'),
         Index('idx_actions_unlocker_check', 'is_unlocker_checked', 'status', 'created_at'),
+        Index('idx_actions_shard_status_created', 'shard', 'status', 'created_at'),
     )
 
 class User(Base):
     __tablename__ = 'users'
-    user_id = Column(Integer, primary_key=True)  # Telegram user_id
+    user_id = Column(TelegramId, primary_key=True)  # Telegram user_id
     username = Column(String, nullable=True)
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
@@ -52,19 +95,19 @@ class User(Base):
 
 class UserState(Base):
     __tablename__ = 'user_states'
-    user_id = Column(Integer, primary_key=True)  # Telegram user_id
+    user_id = Column(TelegramId, primary_key=True)  # Telegram user_id
     state_type = Column(String, nullable=False)
-    state_data = Column(Text, nullable=True)  # JSON с данными состояния
+    state_data = Column(JSONText, nullable=True)  # JSON с данными состояния
     updated_at = Column(DateTime, nullable=False, default=dtf_now_local, onupdate=dtf_now_local)
     expired_at = Column(DateTime, nullable=False, default=dtf_now_local)
 
 class Request(Base):
     __tablename__ = 'requests'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)  # Telegram user_id
+    user_id = Column(TelegramId, nullable=False)  # Telegram user_id
     request_name = Column(String, nullable=True)  # Классификатор запроса (опционально)
     request_text = Column(Text, nullable=True)  # Текст запроса пользователя (может быть None)
-    attachments = Column(Text, nullable=True)  # JSON с вложениями (файлы, фото, видео и т.д.)
+    attachments = Column(JSONText, nullable=True)  # JSON с вложениями (файлы, фото, видео и т.д.)
     request_info = Column(Text, nullable=True)  # JSON с дополнительной информацией по запросу
     created_at = Column(DateTime, nullable=False, default=dtf_now_local)
     updated_at = Column(DateTime, nullable=False, default=dtf_now_local, onupdate=dtf_now_local)
@@ -78,7 +121,7 @@ class InviteLink(Base):
     __tablename__ = 'invite_links'
     id = Column(Integer, primary_key=True, autoincrement=True)
     invite_link = Column(String, nullable=False)  # https://t.me/+37WZrw-pREI2NWMy
-    chat_id = Column(Integer, nullable=False)  # ID группы, где создана ссылка
+    chat_id = Column(TelegramId, nullable=False)  # ID группы, где создана ссылка
     created_at = Column(DateTime, nullable=False, default=dtf_now_local)
     __table_args__ = (
         Index('idx_invite_links_link', 'invite_link'),
@@ -89,9 +132,10 @@ class Cache(Base):
     __tablename__ = 'cache'
     id = Column(Integer, primary_key=True, autoincrement=True)
     hash_key = Column(String, nullable=False, unique=True)  # уникальный хеш
-    hash_metadata = Column(Text, nullable=True)             # JSON с метаданными
+    hash_metadata = Column(JSONText, nullable=True)         # JSON с метаданными
     hash_file_path = Column(String, nullable=True)          # путь к файлу (может быть NULL)
     created_at = Column(DateTime, nullable=False, default=dtf_now_local)
+    accessed_at = Column(DateTime, nullable=True)           # последнее обращение (NULL - не было, считается created_at)
     __table_args__ = (
         Index('idx_cache_hash_key', 'hash_key', unique=True),
         Index('idx_cache_created_at', 'created_at'),
@@ -103,7 +147,7 @@ class PromoCode(Base):
     hash_id = Column(String, nullable=False, unique=True)     # Уникальный хэш-идентификатор
     promo_code = Column(String, nullable=False)               # Код промокода (НЕ уникальный)
     promo_name = Column(String, nullable=False)               # Название акции
-    user_id = Column(Integer, nullable=True)                  # Привязка к пользователю (NULL = для всех)
+    user_id = Column(TelegramId, nullable=True)               # Привязка к пользователю (NULL = для всех)
     salt = Column(String, nullable=False, default='default')  # Соль для детерминированной генерации
     started_at = Column(DateTime, nullable=False, default=dtf_now_local)
     expired_at = Column(DateTime, nullable=False)
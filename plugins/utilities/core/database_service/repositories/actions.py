@@ -1,6 +1,10 @@
+import time
+from datetime import timedelta
 from typing import Any, Dict, List, Optional, Union
 
-from sqlalchemy import select, update
+from sqlalchemy import and_, func, or_, select, update
+
+from .dialect import get_dialect_name
 
 
 class ActionsRepository:
@@ -10,7 +14,8 @@ class ActionsRepository:
     # JSON-поля, которые нужно автоматически декодировать
     JSON_FIELDS = ['event_data', 'action_data', 'prev_data', 'response_data', 'placeholder_data', 'chain_drop_status', 'unlock_status']
     
-    def __init__(self, session, logger, model, datetime_formatter, data_preparer, data_converter, action_parser, placeholder_processor=None):
+    def __init__(self, session, logger, model, datetime_formatter, data_preparer, data_converter, action_parser, placeholder_processor=None, metrics_collector=None, shard_index=None,
+                 claimer_id=None, claim_lease_seconds=60):
         self.logger = logger
         self.session = session
         self.model = model
@@ -19,12 +24,21 @@ class ActionsRepository:
         self.data_converter = data_converter
         self.action_parser = action_parser
         self.placeholder_processor = placeholder_processor
+        self.metrics_collector = metrics_collector
+        # Шард процесса: действия помечаются шардом при создании и читаются только своим шардом
+        self.shard_index = shard_index
+        # Владелец захватов (PostgreSQL) и срок аренды захвата без продления
+        self.claimer_id = claimer_id
+        self.claim_lease_seconds = claim_lease_seconds
+        self.dialect = get_dialect_name(session)
 
     def add_action(self, **fields) -> int:
         """Добавляет новое действие в очередь. """
         try:
             # Добавляем автоматическое поле created_at
             fields['created_at'] = self.datetime_formatter.now_local()
+            if self.shard_index is not None:
+                fields.setdefault('shard', self.shard_index)
             
             # Подготавливаем поля через универсальный подготовщик
             prepared_fields = self.data_preparer.prepare_for_insert(
@@ -39,18 +53,25 @@ class ActionsRepository:
             
             # Создаем и сохраняем действие
             action = self.model(**prepared_fields)
+            start = time.perf_counter()
             self.session.add(action)
             self.session.commit()
             self.session.flush()
             
             action_id = getattr(action, 'id', 0)
             action_type = fields.get('action_type', 'unknown')
+            
+            if self.metrics_collector:
+                self.metrics_collector.observe('db_commit_seconds', time.perf_counter() - start, operation='add_action')
+                self.metrics_collector.inc('actions_created_total', action_type=action_type)
     
             return action_id
             
         except Exception as e:
             self.session.rollback()
             self.logger.error(f"Ошибка добавления действия: {e}")
+            if self.metrics_collector:
+                self.metrics_collector.inc('db_errors_total', operation='add_action')
             return 0
 
     def get_pending_actions_by_type(self, action_type: Union[str, List[str]], limit: int = 50) -> List[Dict[str, Any]]:
@@ -59,14 +80,23 @@ class ActionsRepository:
             # Формируем запрос в зависимости от типа параметра
             if isinstance(action_type, str):
                 stmt = (select(self.model)
-                       .where(self.model.status == 'pending', self.model.action_type == action_type)
-                       .order_by(self.model.created_at.asc())
-                       .limit(limit))
+                       .where(self.model.status == 'pending', self.model.action_type == action_type))
             else:
                 stmt = (select(self.model)
-                       .where(self.model.status == 'pending', self.model.action_type.in_(action_type))
-                       .order_by(self.model.created_at.asc())
-                       .limit(limit))
+                       .where(self.model.status == 'pending', self.model.action_type.in_(action_type)))
+            
+            # В многопроцессном режиме читаем только свой шард (действия без шарда - нулевой шард)
+            if self.shard_index is not None:
+                if self.shard_index == 0:
+                    stmt = stmt.where((self.model.shard == 0) | (self.model.shard.is_(None)))
+                else:
+                    stmt = stmt.where(self.model.shard == self.shard_index)
+            
+            stmt = stmt.order_by(self.model.created_at.asc()).limit(limit)
+
+            # PostgreSQL: атомарный захват пачки - несколько процессов читают очередь без дублей
+            if self.dialect == 'postgresql':
+                return self._claim_pending_actions(stmt)
 
             # Выполняем запрос и конвертируем через универсальный конвертер
             actions = self.session.execute(stmt).scalars().all()
@@ -76,6 +106,81 @@ class ActionsRepository:
             self.logger.error(f"Ошибка получения pending действий по типу/типам {action_type}: {e}")
             return []
 
+    def _claim_pending_actions(self, stmt) -> List[Dict[str, Any]]:
+        """Переводит выбранные pending-действия в processing (FOR UPDATE SKIP LOCKED) и возвращает их."""
+        claimed_ids = stmt.with_only_columns(self.model.id).with_for_update(skip_locked=True)
+        now = self.datetime_formatter.now_local()
+        claim = (update(self.model)
+                .where(self.model.id.in_(claimed_ids))
+                .values(status='processing', processed_at=now, claimed_by=self.claimer_id,
+                        lease_until=now + timedelta(seconds=self.claim_lease_seconds))
+                .returning(self.model))
+        try:
+            actions = self.session.execute(claim, execution_options={'synchronize_session': False}).scalars().all()
+            # RETURNING не гарантирует порядок - восстанавливаем порядок очереди
+            actions = sorted(actions, key=lambda action: (action.created_at, action.id))
+            # Конвертируем до commit: после commit объекты истекают и потребовали бы повторных SELECT
+            result = self.data_converter.to_dict_list(actions, json_fields=self.JSON_FIELDS)
+            self.session.commit()
+            return result
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def renew_claims(self) -> int:
+        """Продлевает аренду действий, захваченных этим процессом (heartbeat database_service)."""
+        try:
+            lease_until = self.datetime_formatter.now_local() + timedelta(seconds=self.claim_lease_seconds)
+            stmt = (update(self.model)
+                   .where(self.model.status == 'processing', self.model.claimed_by == self.claimer_id)
+                   .values(lease_until=lease_until))
+            result = self.session.execute(stmt)
+            self.session.commit()
+            return result.rowcount
+            
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Ошибка продления захвата действий: {e}")
+            return 0
+
+    def release_expired_claims(self) -> int:
+        """
+        Возвращает в pending действия, чья аренда захвата истекла - процесс-владелец упал и не продлевает ее.
+        Захваты без аренды (сделанные до ее появления) освобождаются по времени захвата
+        """
+        try:
+            now = self.datetime_formatter.now_local()
+            expired = or_(
+                self.model.lease_until < now,
+                and_(self.model.lease_until.is_(None),
+                     self.model.processed_at < now - timedelta(seconds=self.claim_lease_seconds))
+            )
+            stmt = (update(self.model)
+                   .where(self.model.status == 'processing', expired)
+                   .values(status='pending', claimed_by=None, lease_until=None))
+            result = self.session.execute(stmt)
+            self.session.commit()
+            if result.rowcount:
+                self.logger.warning(f"Возвращено в очередь действий с истекшим захватом: {result.rowcount}")
+            return result.rowcount
+            
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Ошибка возврата действий с истекшим захватом: {e}")
+            return 0
+
+    def count_pending_by_type(self) -> Dict[str, int]:
+        """Возвращает количество pending-действий по каждому action_type."""
+        try:
+            stmt = (select(self.model.action_type, func.count(self.model.id))
+                   .where(self.model.status == 'pending')
+                   .group_by(self.model.action_type))
+            return {action_type or 'unknown': count for action_type, count in self.session.execute(stmt).all()}
+            
+        except Exception as e:
+            self.logger.error(f"Ошибка подсчета pending действий по типам: {e}")
+            return {}
+
     def get_pending_actions_by_type_parsed(self, action_type: Union[str, List[str]], limit: int = 50) -> List[Dict[str, Any]]:
         """Получить список pending-действий для указанного типа или типов с автоматическим парсингом и обработкой плейсхолдеров."""
         actions = self.get_pending_actions_by_type(action_type, limit)
@@ -107,10 +212,14 @@ class ActionsRepository:
                 return False
             
             # Выполняем обновление
+            start = time.perf_counter()
             stmt = update(self.model).where(self.model.id == action_id).values(**prepared_fields)
             result = self.session.execute(stmt)
             self.session.commit()
             
+            if self.metrics_collector:
+                self.metrics_collector.observe('db_commit_seconds', time.perf_counter() - start, operation='update_action')
+            
             # Принудительно обновляем сессию чтобы избежать кэширования
             self.session.expire_all()
             
@@ -123,6 +232,8 @@ class ActionsRepository:
         except Exception as e:
             self.session.rollback()
             self.logger.error(f"Ошибка обновления действия {action_id}: {e}")
+            if self.metrics_collector:
+                self.metrics_collector.inc('db_errors_total', operation='update_action')
             return False
 
     def get_actions_by_prev_action_id(self, prev_action_id: int, statuses: Union[str, List[str]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
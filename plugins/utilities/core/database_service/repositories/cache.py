@@ -1,9 +1,10 @@
 import os
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Iterator, Optional, List
 
-from sqlalchemy import select, or_
+from sqlalchemy import delete, func, select, update, or_
 
 from ..models import Cache
+from .dialect import get_upsert_insert
 
 
 class CacheRepository:
@@ -119,9 +120,13 @@ class CacheRepository:
     def add_or_update_cache(self, hash_key: str, **fields) -> bool:
         """
         Универсальный метод для добавления или обновления кэша
-        Классический подход: select → insert/update
+        INSERT ... ON CONFLICT, если БД поддерживает, иначе select → insert/update
         """
         try:
+            upsert_insert = get_upsert_insert(self.session)
+            if upsert_insert:
+                return self._upsert_cache(upsert_insert, hash_key, **fields)
+
             # Проверяем существование записи
             existing_record = self.session.query(self.model).filter(
                 self.model.hash_key == hash_key
@@ -141,6 +146,46 @@ class CacheRepository:
             self.logger.error(f"Ошибка add_or_update_cache для {hash_key}: {e}")
             return False
 
+    def _upsert_cache(self, upsert_insert, hash_key: str, **fields) -> bool:
+        """Атомарный upsert по hash_key (семантика как у add_cache/update_cache)"""
+        hash_file_path = fields.pop('hash_file_path', None)
+        
+        insert_fields = {
+            'hash_key': hash_key,
+            'hash_file_path': hash_file_path,
+            'created_at': self.datetime_formatter.now_local()
+        }
+        if fields:
+            insert_fields['hash_metadata'] = fields
+        
+        prepared_fields = self.data_preparer.prepare_for_insert(
+            model=self.model,
+            fields=insert_fields,
+            json_fields=self.JSON_FIELDS
+        )
+        
+        if not prepared_fields:
+            self.logger.error("Не удалось подготовить поля для upsert кэша")
+            return False
+        
+        stmt = upsert_insert(self.model).values(**prepared_fields)
+        
+        # Обновляем только переданные поля (как update_cache)
+        set_fields = {}
+        if hash_file_path is not None:
+            set_fields['hash_file_path'] = stmt.excluded.hash_file_path
+        if fields:
+            set_fields['hash_metadata'] = stmt.excluded.hash_metadata
+        
+        if set_fields:
+            stmt = stmt.on_conflict_do_update(index_elements=[self.model.hash_key], set_=set_fields)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[self.model.hash_key])
+        
+        self.session.execute(stmt)
+        self.session.commit()
+        return True
+
     def delete_cache(self, hash_key: str) -> bool:
         """Удалить запись из кэша"""
         try:
@@ -171,6 +216,21 @@ class CacheRepository:
             self.logger.error(f"Ошибка удаления кэша для {hash_key}: {e}")
             return False
 
+    def touch_cache(self, hash_key: str) -> bool:
+        """Отметить обращение к записи (время последнего доступа для LRU вытеснения)"""
+        try:
+            stmt = (update(self.model)
+                    .where(self.model.hash_key == hash_key)
+                    .values(accessed_at=self.datetime_formatter.now_local()))
+            result = self.session.execute(stmt)
+            self.session.commit()
+            return result.rowcount > 0
+            
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Ошибка обновления времени доступа кэша для {hash_key}: {e}")
+            return False
+
     def has_cache(self, hash_key: str) -> bool:
         """Проверить наличие записи в кэше"""
         try:
@@ -199,4 +259,41 @@ class CacheRepository:
             return self.data_converter.to_dict_list(records, json_fields=self.JSON_FIELDS)
         except Exception as e:
             self.logger.error(f"Ошибка выборки устаревшего кэша: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def delete_cache_bulk(self, hash_keys: List[str]) -> int:
+        """Удалить записи кэша одним запросом DELETE ... WHERE hash_key IN (...). Файлы не удаляются"""
+        if not hash_keys:
+            return 0
+        try:
+            result = self.session.execute(delete(self.model).where(self.model.hash_key.in_(hash_keys)))
+            self.session.commit()
+            return result.rowcount
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Ошибка массового удаления кэша ({len(hash_keys)} записей): {e}")
+            return 0
+
+    def iter_cache_file_paths(self, batch_size: int) -> Iterator[str]:
+        """Пути файлов всех записей кэша (потоково, батчами batch_size)"""
+        try:
+            stmt = (select(self.model.hash_file_path)
+                    .where(self.model.hash_file_path.isnot(None), self.model.hash_file_path != '')
+                    .execution_options(yield_per=batch_size))
+            for (file_path,) in self.session.execute(stmt):
+                yield file_path
+        except Exception as e:
+            self.logger.error(f"Ошибка выборки путей файлов кэша: {e}")
+
+    def iter_cache_files_lru(self, batch_size: int) -> Iterator[Dict[str, Any]]:
+        """Записи кэша с файлами от давно не использованных к недавним (потоково, батчами batch_size)"""
+        try:
+            last_access = func.coalesce(self.model.accessed_at, self.model.created_at)
+            stmt = (select(self.model.hash_key, self.model.hash_file_path)
+                    .where(self.model.hash_file_path.isnot(None), self.model.hash_file_path != '')
+                    .order_by(last_access, self.model.id)
+                    .execution_options(yield_per=batch_size))
+            for hash_key, file_path in self.session.execute(stmt):
+                yield {'hash_key': hash_key, 'hash_file_path': file_path}
+        except Exception as e:
+            self.logger.error(f"Ошибка выборки кэша по времени доступа: {e}")
@@ -0,0 +1,17 @@
+from sqlalchemy.dialects import postgresql
+
+# insert() диалектов, для которых репозитории используют ON CONFLICT.
+# SQLite намеренно остается на прежнем пути select → insert/update
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+}
+
+
+def get_dialect_name(session) -> str:
+    """Имя диалекта БД сессии ('sqlite', 'postgresql', ...)"""
+    return session.get_bind().dialect.name
+
+
+def get_upsert_insert(session):
+    """insert() с on_conflict_do_update для диалекта сессии (None - использовать select → insert/update)"""
+    return _UPSERT_INSERTS.get(get_dialect_name(session))
@@ -2,6 +2,8 @@ from typing import Any, Dict, Optional
 
 from sqlalchemy import select, update
 
+from .dialect import get_upsert_insert
+
 
 class UserStatesRepository:
     """
@@ -65,6 +67,11 @@ class UserStatesRepository:
             if 'updated_at' not in fields:
                 fields['updated_at'] = self.datetime_formatter.now_local()
 
+            # Атомарный upsert (ON CONFLICT) там, где БД его поддерживает
+            upsert_insert = get_upsert_insert(self.session)
+            if upsert_insert:
+                return self._upsert_user_state(upsert_insert, user_id, **fields)
+
             # Проверяем существование состояния
             stmt = select(self.model).where(self.model.user_id == user_id)
             user_state = self.session.execute(stmt).scalar_one_or_none()
@@ -119,4 +126,24 @@ class UserStatesRepository:
         except Exception as e:
             self.session.rollback()
             self.logger.error(f"Ошибка операции с состоянием пользователя {user_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def _upsert_user_state(self, upsert_insert, user_id: int, **fields) -> bool:
+        """INSERT ... ON CONFLICT (user_id) DO UPDATE - одним запросом без предварительного SELECT."""
+        fields['user_id'] = user_id
+        prepared_fields = self.data_preparer.prepare_for_insert(
+            model=self.model,
+            fields=fields,
+            json_fields=self.JSON_FIELDS
+        )
+        
+        if not prepared_fields:
+            self.logger.error("Не удалось подготовить поля для upsert состояния пользователя")
+            return False
+
+        stmt = upsert_insert(self.model).values(**prepared_fields)
+        set_fields = {name: stmt.excluded[name] for name in prepared_fields if name != 'user_id'}
+        stmt = stmt.on_conflict_do_update(index_elements=[self.model.user_id], set_=set_fields)
+        self.session.execute(stmt)
+        self.session.commit()
+        return True
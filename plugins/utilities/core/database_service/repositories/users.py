@@ -1,12 +1,17 @@
 from typing import Any, Dict, Optional
 
-from sqlalchemy import select, update
+from sqlalchemy import func, select, update
+
+from .dialect import get_upsert_insert
 
 
 class UsersRepository:
     """
     Репозиторий для работы с таблицей Users (пользователи бота).
     """
+    # Поля, которые не затираются пустым значением
+    PROTECTED_FIELDS = ['username', 'first_name', 'last_name']
+
     def __init__(self, session, logger, model, datetime_formatter, data_preparer, data_converter):
         self.logger = logger
         self.session = session
@@ -132,6 +137,11 @@ class UsersRepository:
                 self.logger.error("user_id или entity_id обязательны для работы метода")
                 return False
             
+            # Атомарный upsert (ON CONFLICT) там, где БД его поддерживает
+            upsert_insert = get_upsert_insert(self.session)
+            if upsert_insert:
+                return self._upsert_user(upsert_insert, **fields)
+            
             # Исключаем user_id из полей для обновления
             fields_for_update = fields.copy()
             fields_for_update.pop('user_id', None)
@@ -158,6 +168,51 @@ class UsersRepository:
             self.logger.error(f"Ошибка операции с пользователем {user_id}: {e}")
             return False
 
+    def _upsert_user(self, upsert_insert, **fields) -> bool:
+        """INSERT ... ON CONFLICT (user_id) DO UPDATE с той же защитой полей, что и update_user_with_protection."""
+        try:
+            # Добавляем автоматические поля
+            if 'created_at' not in fields:
+                fields['created_at'] = self.datetime_formatter.now_local()
+            if 'updated_at' not in fields:
+                fields['updated_at'] = self.datetime_formatter.now_local()
+            
+            prepared_fields = self.data_preparer.prepare_for_insert(
+                model=self.model,
+                fields=fields
+            )
+            
+            if not prepared_fields:
+                self.logger.error("Не удалось подготовить поля для upsert пользователя")
+                return False
+            
+            stmt = upsert_insert(self.model).values(**prepared_fields)
+            excluded = stmt.excluded
+            
+            set_fields = {}
+            for field_name in prepared_fields:
+                if field_name in ('user_id', 'created_at'):
+                    continue
+                column = getattr(self.model, field_name)
+                if field_name in self.PROTECTED_FIELDS:
+                    # Пустое значение не затирает заполненное поле
+                    set_fields[field_name] = func.coalesce(func.nullif(excluded[field_name], ''), column)
+                elif field_name == 'is_bot':
+                    # MTProto может вернуть None для bot - оставляем известное значение
+                    set_fields[field_name] = func.coalesce(excluded[field_name], column)
+                else:
+                    set_fields[field_name] = excluded[field_name]
+            
+            stmt = stmt.on_conflict_do_update(index_elements=[self.model.user_id], set_=set_fields)
+            self.session.execute(stmt)
+            self.session.commit()
+            return True
+            
+        except Exception as e:
+            self.session.rollback()
+            self.logger.error(f"Ошибка upsert пользователя {fields.get('user_id')}: {e}")
+            return False
+
     def update_user_with_protection(self, user_id: int, existing_user_data: Optional[Dict] = None, **fields) -> bool:
         """Обновляет пользователя с защитой от затирания важных полей."""
         try:
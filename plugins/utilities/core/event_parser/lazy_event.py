@@ -0,0 +1,136 @@
+from typing import Any, Callable, Dict, Optional
+
+
+class LazyEvent(dict):
+    """
+    Событие с ленивыми полями: значение вычисляется loader'ом при первом обращении и сохраняется.
+    Для потребителей ведет себя как обычный dict: операции над всем словарем
+    (итерация, items, сравнение, JSON, pickle) сначала вычисляют оставшиеся поля
+    """
+
+    __slots__ = ('_loaders',)
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, loaders: Optional[Dict[str, Callable[[], Any]]] = None):
+        super().__init__(data or {})
+        self._loaders = {key: loader for key, loader in (loaders or {}).items() if not dict.__contains__(self, key)}
+
+    def _load(self, key):
+        loader = self._loaders.pop(key, None)
+        if loader is not None:
+            dict.__setitem__(self, key, loader())
+
+    def _load_all(self):
+        for key in list(self._loaders):
+            self._load(key)
+
+    def is_loaded(self, key) -> bool:
+        """Вычислено ли поле (для отладки и метрик)"""
+        return key not in self._loaders
+
+    def _loaded(self) -> Dict[str, Any]:
+        # dict.copy для подкласса с __iter__ идет через keys() и вычислил бы все поля
+        return {key: dict.__getitem__(self, key) for key in dict.__iter__(self)}
+
+    def materialize(self) -> Dict[str, Any]:
+        """Обычный dict со всеми полями"""
+        self._load_all()
+        return self._loaded()
+
+    # === Доступ к отдельным полям ===
+
+    def __getitem__(self, key):
+        if key in self._loaders:
+            self._load(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self._loaders:
+            self._load(key)
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._loaders
+
+    def __setitem__(self, key, value):
+        self._loaders.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self._loaders.pop(key, None) is not None and not dict.__contains__(self, key):
+            return
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self._loaders:
+            self._load(key)
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key in self._loaders:
+            self._load(key)
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self) -> 'LazyEvent':
+        """Копия без вычисления: невычисленные поля остаются ленивыми"""
+        return LazyEvent(self._loaded(), self._loaders)
+
+    def clear(self):
+        self._loaders.clear()
+        dict.clear(self)
+
+    # === Операции над всем словарем ===
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._loaders)
+
+    def __iter__(self):
+        self._load_all()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._load_all()
+        return dict.keys(self)
+
+    def values(self):
+        self._load_all()
+        return dict.values(self)
+
+    def items(self):
+        self._load_all()
+        return dict.items(self)
+
+    def popitem(self):
+        self._load_all()
+        return dict.popitem(self)
+
+    def __eq__(self, other):
+        self._load_all()
+        if isinstance(other, LazyEvent):
+            other._load_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __or__(self, other):
+        merged = self.materialize()
+        merged.update(other)
+        return merged
+
+    def __repr__(self):
+        self._load_all()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        # Loader'ы держат объекты aiogram - в другой процесс уходит обычный dict
+        return dict, (self.materialize(),)
@@ -1,6 +1,8 @@
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List
 from aiogram import types
 
+from .lazy_event import LazyEvent
+
 
 class TgBotParser:
     """
@@ -16,13 +18,14 @@ class TgBotParser:
     def parse_message(self, message: types.Message) -> Optional[Dict[str, Any]]:
         """
         Парсинг сообщения Bot API в стандартный формат события.
+        Дорогие поля (разметка текста, вложения) вычисляются при первом обращении.
         """
         try:
-            # Создание события с вложениями
-            event = self._create_message_event(message)
+            # Создание события: простые поля сразу, дорогие - через loader'ы
+            event, loaders = self._create_message_event(message)
             if event:
-                # Конвертируем в безопасный словарь
-                return self.data_converter.to_safe_dict(event)
+                # Конвертируем в безопасный словарь (ленивые поля конвертируются при вычислении)
+                return LazyEvent(self.data_converter.to_safe_dict(event), loaders)
             return None
 
         except Exception as e:
@@ -139,8 +142,11 @@ class TgBotParser:
             self.logger.error(f"❌ Ошибка парсинга Bot API new_member: {e}")
             return None
 
-    def _create_message_event(self, message: types.Message) -> Dict[str, Any]:
-        """Создаёт событие из Bot API сообщения с извлечением вложений."""
+    def _create_message_event(self, message: types.Message) -> tuple:
+        """
+        Создаёт событие из Bot API сообщения.
+        Возвращает (простые поля, loader'ы ленивых полей: разметка текста, вложения).
+        """
         # Универсальный маппинг для Bot API
         if message.from_user:
             # Сообщения от пользователей
@@ -156,13 +162,10 @@ class TgBotParser:
                 'chat_title': getattr(message.chat, 'title', None),
                 'message_id': message.message_id,
                 'event_text': message.text or message.caption,
-                'event_text_markdown': message.md_text or message.caption,
-                'event_text_html': message.html_text or message.caption,
                 'event_date': self.datetime_formatter.to_iso_string(
                     self.datetime_formatter.to_local(message.date) if message.date else self.datetime_formatter.now_local()
                 ),
                 'media_group_id': message.media_group_id,
-                'attachments': []
             }
         else:
             # Сообщения от каналов/групп (channel_post, group_post)
@@ -178,13 +181,10 @@ class TgBotParser:
                 'chat_title': getattr(message.chat, 'title', None),
                 'message_id': message.message_id,
                 'event_text': message.text or message.caption,
-                'event_text_markdown': message.md_text or message.caption,
-                'event_text_html': message.html_text or message.caption,
                 'event_date': self.datetime_formatter.to_iso_string(
                     self.datetime_formatter.to_local(message.date) if message.date else self.datetime_formatter.now_local()
                 ),
                 'media_group_id': message.media_group_id,
-                'attachments': []
             }
 
         # Добавляем флаги is_reply и is_forward
@@ -213,7 +213,6 @@ class TgBotParser:
             event['reply_username'] = message.reply_to_message.from_user.username if message.reply_to_message.from_user else None
             event['reply_first_name'] = message.reply_to_message.from_user.first_name if message.reply_to_message.from_user else None
             event['reply_last_name'] = getattr(message.reply_to_message.from_user, 'last_name', None) if message.reply_to_message.from_user else None
-            event['reply_attachments'] = self._extract_attachments(message.reply_to_message)
             
             # Универсальные поля
             if message.reply_to_message.from_user:
@@ -249,10 +248,26 @@ class TgBotParser:
                 else:
                     event['forward_entity_type'] = 'chat'
 
-        # Извлекаем вложения
-        event['attachments'] = self._extract_attachments(message)
+        # Разметка текста (обход entities) и вложения - по первому обращению
+        loaders = {
+            'event_text_markdown': self._lazy(lambda: message.md_text or message.caption),
+            'event_text_html': self._lazy(lambda: message.html_text or message.caption),
+            'attachments': self._lazy(lambda: self._extract_attachments(message), []),
+        }
+        if message.reply_to_message:
+            loaders['reply_attachments'] = self._lazy(lambda: self._extract_attachments(message.reply_to_message), [])
+
+        return event, loaders
 
-        return event
+    def _lazy(self, compute: Callable[[], Any], default: Any = None) -> Callable[[], Any]:
+        """Loader ленивого поля: результат приводится к безопасному виду, ошибка логируется"""
+        def loader():
+            try:
+                return self.data_converter.to_safe_dict(compute())
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка вычисления поля события Bot API: {e}")
+                return default
+        return loader
 
     def _extract_attachments(self, message: types.Message) -> List[Dict[str, Any]]:
         """Извлекает вложения из Bot API сообщения."""
@@ -264,6 +279,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'photo',
                 'file_id': largest_photo.file_id,
+                'file_unique_id': largest_photo.file_unique_id,
                 'file_size': largest_photo.file_size,
             })
 
@@ -284,6 +300,7 @@ class TgBotParser:
             attachments.append({
                 'type': attachment_type,
                 'file_id': message.document.file_id,
+                'file_unique_id': message.document.file_unique_id,
                 'file_size': message.document.file_size,
                 'mime_type': mime_type,
                 'file_name': file_name
@@ -293,6 +310,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'video',
                 'file_id': message.video.file_id,
+                'file_unique_id': message.video.file_unique_id,
                 'file_size': message.video.file_size
             })
 
@@ -300,6 +318,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'audio',
                 'file_id': message.audio.file_id,
+                'file_unique_id': message.audio.file_unique_id,
                 'file_size': message.audio.file_size
             })
 
@@ -307,6 +326,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'voice',
                 'file_id': message.voice.file_id,
+                'file_unique_id': message.voice.file_unique_id,
                 'file_size': message.voice.file_size
             })
 
@@ -320,6 +340,7 @@ class TgBotParser:
             attachments.append({
                 'type': attachment_type,
                 'file_id': message.sticker.file_id,
+                'file_unique_id': message.sticker.file_unique_id,
                 'file_size': message.sticker.file_size
             })
 
@@ -327,6 +348,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'animation',
                 'file_id': message.animation.file_id,
+                'file_unique_id': message.animation.file_unique_id,
                 'file_size': message.animation.file_size
             })
 
@@ -334,6 +356,7 @@ class TgBotParser:
             attachments.append({
                 'type': 'video_note',
                 'file_id': message.video_note.file_id,
+                'file_unique_id': message.video_note.file_unique_id,
                 'file_size': message.video_note.file_size
             })
             
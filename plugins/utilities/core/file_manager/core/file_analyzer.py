@@ -1,23 +1,18 @@
+import asyncio
+import json
+import multiprocessing
 import os
-from typing import Dict, Any, Optional, List
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Optional, List, Tuple
 from pathlib import Path
 
-# Импорт для работы с аудио
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
-    AudioSegment = None
-
-# Импорт для работы с видео
-try:
-    import ffmpeg
-    FFMPEG_AVAILABLE = True
-except ImportError:
-    FFMPEG_AVAILABLE = False
-    ffmpeg = None
-
 # Импорт для определения MIME-типов
 try:
     import magic
@@ -26,11 +21,106 @@ except ImportError:
     MAGIC_AVAILABLE = False
     magic = None
 
+# Аудио форматы контейнера (format_name ffprobe) -> (расширение, content_type, media_type)
+PROBE_AUDIO_FORMATS = {
+    'ogg': ('ogg', 'audio/ogg;codecs=opus', 'voice'),
+    'opus': ('ogg', 'audio/ogg;codecs=opus', 'voice'),
+    'mp3': ('mp3', 'audio/mpeg', 'audio'),
+    'mpeg': ('mp3', 'audio/mpeg', 'audio'),
+    'wav': ('wav', 'audio/wav', 'audio'),
+    'wave': ('wav', 'audio/wav', 'audio'),
+}
+
+
+def detect_mime_type(file_path: str) -> Optional[str]:
+    """MIME-тип по содержимому через libmagic"""
+    if not MAGIC_AVAILABLE:
+        return None
+    return magic.from_file(file_path, mime=True)
+
+
+def probe_media(file_path: str, ffprobe_path: Optional[str], timeout: float) -> Dict[str, Any]:
+    """
+    Параметры медиафайла из заголовков контейнера (ffprobe), без декодирования содержимого.
+    Без ffprobe поддерживается только WAV (стандартный модуль wave)
+    """
+    if ffprobe_path:
+        completed = subprocess.run(
+            [ffprobe_path, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', file_path],
+            capture_output=True, timeout=timeout, check=False
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.decode('utf-8', errors='replace').strip() or 'ffprobe error')
+        return json.loads(completed.stdout)
+
+    with wave.open(file_path, 'rb') as wav:
+        frames, rate, channels = wav.getnframes(), wav.getframerate(), wav.getnchannels()
+    return {
+        'format': {'format_name': 'wav', 'duration': str(frames / rate if rate else 0.0), 'size': str(os.path.getsize(file_path))},
+        'streams': [{'codec_type': 'audio', 'sample_rate': str(rate), 'channels': channels}],
+    }
+
+
+class _AnalysisCache:
+    """
+    LRU кэш результатов анализа, ключ - (путь, размер, mtime, вид анализа).
+    Ошибки (в том числе таймауты) хранятся не дольше error_ttl секунд - временный сбой не закрепляется за файлом
+    """
+
+    def __init__(self, max_size: int = 1024, error_ttl: float = 30.0):
+        self.max_size = max_size
+        self.error_ttl = error_ttl
+        # ключ -> ((значение, ошибка), момент устаревания или None)
+        self._items: 'OrderedDict[Tuple, Tuple[Tuple[Any, Optional[str]], Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tuple[Any, Optional[str]]]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            item, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def put(self, key: Tuple, item: Tuple[Any, Optional[str]]):
+        if item[1] is not None and self.error_ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.error_ttl if item[1] is not None else None
+        with self._lock:
+            self._items[key] = (item, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+# Общие для всех экземпляров FileAnalyzer (file_manager не singleton): кэш и пулы анализа
+_analysis_cache = _AnalysisCache()
+_executors: Dict[Tuple[str, int], Executor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(kind: str, workers: int) -> Executor:
+    with _executors_lock:
+        executor = _executors.get((kind, workers))
+        if executor is None:
+            if kind == 'process':
+                # spawn - дочерние процессы без унаследованных потоков и соединений
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file_analysis')
+            _executors[(kind, workers)] = executor
+        return executor
+
 
 class FileAnalyzer:
     """
     Модуль анализа файлов с поддержкой аудио и видео.
     Определяет форматы, проверяет размеры и длительность.
+    Тяжелый анализ (libmagic, ffprobe) кэшируется по пути, размеру и mtime; async-методы выполняют его в пуле с таймаутом.
     """
     
     def __init__(self, **kwargs):
@@ -39,21 +129,102 @@ class FileAnalyzer:
         
         # Получаем настройки
         settings = self.settings_manager.get_plugin_settings("file_manager")
+        self.analysis_executor: str = settings.get('analysis_executor', 'thread')
+        self.analysis_workers: int = settings.get('analysis_workers', 4)
+        self.analysis_timeout: float = settings.get('analysis_timeout', 30.0)
+        _analysis_cache.max_size = settings.get('analysis_cache_size', 1024)
+        _analysis_cache.error_ttl = settings.get('analysis_error_ttl', 30.0)
+        self.ffprobe_path: Optional[str] = shutil.which(settings.get('ffprobe_path', 'ffprobe'))
         
         # Проверяем доступность библиотек
         self._check_dependencies()
 
     def _check_dependencies(self):
         """Проверяет доступность необходимых библиотек"""
-        if not PYDUB_AVAILABLE:
-            self.logger.warning("pydub недоступен - ограниченная поддержка аудио")
-        
-        if not FFMPEG_AVAILABLE:
-            self.logger.warning("ffmpeg-python недоступен - ограниченная поддержка видео")
+        if not self.ffprobe_path:
+            self.logger.warning("ffprobe недоступен - длительность определяется только для WAV")
         
         if not MAGIC_AVAILABLE:
             self.logger.warning("python-magic недоступен - определение MIME-типов отключено")
 
+    # === Кэш и пул анализа ===
+
+    def _analyze(self, kind: str, file_path: str) -> Tuple[Any, Optional[str]]:
+        """
+        Результат тяжелого анализа (kind: mime или probe) - из кэша или вычисленный.
+        Возвращает (значение, ошибка)
+        """
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, kind)
+        cached = _analysis_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if kind == 'mime':
+            func, args = detect_mime_type, (file_path,)
+        else:
+            func, args = probe_media, (file_path, self.ffprobe_path, self.analysis_timeout)
+
+        try:
+            if self.analysis_executor == 'process':
+                value = _get_executor('process', self.analysis_workers).submit(func, *args).result(self.analysis_timeout)
+            else:
+                value = func(*args)
+            item = (value, None)
+        except Exception as e:
+            item = (None, str(e) or type(e).__name__)
+
+        _analysis_cache.put(key, item)
+        return item
+
+    async def _run_in_pool(self, func, *args):
+        """Выполняет синхронный анализ в пуле потоков с таймаутом (не блокирует event loop)"""
+        loop = asyncio.get_running_loop()
+        executor = _get_executor('thread', self.analysis_workers)
+        return await asyncio.wait_for(loop.run_in_executor(executor, partial(func, *args)), timeout=self.analysis_timeout)
+
+    async def validate_file_async(self, file_path: str, max_size_mb: float = None,
+                                  max_duration_seconds: int = None, check_exists: bool = True) -> Dict[str, Any]:
+        """validate_file в пуле анализа с таймаутом"""
+        try:
+            return await self._run_in_pool(self.validate_file, file_path, max_size_mb, max_duration_seconds, check_exists)
+        except asyncio.TimeoutError:
+            return {
+                'valid': False,
+                'errors': [f"Превышен таймаут анализа файла ({self.analysis_timeout} сек)"],
+                'warnings': [],
+                'file_info': {},
+                'extension_info': {},
+                'duration_info': {}
+            }
+
+    async def get_file_info_async(self, file_path: str) -> Dict[str, Any]:
+        """get_file_info в пуле анализа с таймаутом"""
+        try:
+            return await self._run_in_pool(self.get_file_info, file_path)
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'error': f"Превышен таймаут анализа файла ({self.analysis_timeout} сек)",
+                'extension': None,
+                'content_type': None,
+                'mime_type': None,
+                'media_type': None,
+                'detection_method': None
+            }
+
+    async def get_file_duration_async(self, file_path: str, extension_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """get_file_duration в пуле анализа с таймаутом"""
+        try:
+            return await self._run_in_pool(self.get_file_duration, file_path, extension_info)
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'error': f"Превышен таймаут анализа файла ({self.analysis_timeout} сек)",
+                'file_type': 'unknown',
+                'duration_seconds': 0.0
+            }
+
     def validate_file(self, file_path: str, max_size_mb: float = None,
                      max_duration_seconds: int = None, check_exists: bool = True) -> Dict[str, Any]:
         """
@@ -149,8 +320,10 @@ class FileAnalyzer:
                 if any(ord(char) > 127 for char in file_path):
                     self.logger.warning(f"Путь содержит кириллические символы, пропускаем MIME-тип: {file_path}")
                 else:
-                    try:
-                        mime_type = magic.from_file(file_path, mime=True)
+                    mime_type, error = self._analyze('mime', file_path)
+                    if error:
+                        self.logger.warning(f"Ошибка определения MIME-типа: {error}")
+                    elif mime_type:
                         result['mime_type'] = mime_type
                         result['content_type'] = mime_type
                         
@@ -163,44 +336,21 @@ class FileAnalyzer:
                             result['detection_method'] = 'mime_type'
                             result['success'] = True
                             return result
-                            
-                    except Exception as e:
-                        self.logger.warning(f"Ошибка определения MIME-типа: {e}")
             
-            # Попытка определения через pydub (для аудио файлов)
-            if PYDUB_AVAILABLE:
-                try:
-                    from pydub import AudioSegment
-                    audio = AudioSegment.from_file(file_path)
-                    # Определяем расширение по типу аудио
-                    if hasattr(audio, 'format_info'):
-                        detected_format = audio.format_info.get('format', '').lower()
-                        if detected_format in ['ogg', 'opus']:
-                            result['extension'] = 'ogg'
-                            result['content_type'] = 'audio/ogg;codecs=opus'
-                            result['mime_type'] = 'audio/ogg;codecs=opus'
-                            result['media_type'] = 'voice'
-                            result['detection_method'] = 'pydub'
-                            result['success'] = True
-                            return result
-                        elif detected_format in ['mp3', 'mpeg']:
-                            result['extension'] = 'mp3'
-                            result['content_type'] = 'audio/mpeg'
-                            result['mime_type'] = 'audio/mpeg'
-                            result['media_type'] = 'audio'
-                            result['detection_method'] = 'pydub'
-                            result['success'] = True
-                            return result
-                        elif detected_format in ['wav', 'wave']:
-                            result['extension'] = 'wav'
-                            result['content_type'] = 'audio/wav'
-                            result['mime_type'] = 'audio/wav'
-                            result['media_type'] = 'audio'
-                            result['detection_method'] = 'pydub'
-                            result['success'] = True
-                            return result
-                except Exception as e:
-                    pass
+            # Определение аудио формата по заголовкам контейнера (ffprobe, без декодирования)
+            probe, _ = self._analyze('probe', file_path)
+            if probe:
+                format_names = (probe.get('format', {}).get('format_name') or '').lower().split(',')
+                for format_name in format_names:
+                    if format_name in PROBE_AUDIO_FORMATS:
+                        extension, content_type, media_type = PROBE_AUDIO_FORMATS[format_name]
+                        result['extension'] = extension
+                        result['content_type'] = content_type
+                        result['mime_type'] = content_type
+                        result['media_type'] = media_type
+                        result['detection_method'] = 'ffprobe'
+                        result['success'] = True
+                        return result
             
             # Fallback к расширению файла
             file_ext = Path(file_path).suffix.lower().lstrip('.')
@@ -243,88 +393,19 @@ class FileAnalyzer:
 
     def get_file_duration(self, file_path: str, extension_info: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Получение длительности файла (аудио/видео)
+        Получение длительности файла (аудио/видео) из заголовков контейнера (ffprobe), без декодирования
         """
         try:
-            # Если знаем расширение, используем оптимальный метод
-            if extension_info and extension_info.get('success'):
-                detected_extension = extension_info['extension'].lower()
-                
-                # Аудио форматы
-                if detected_extension in ['mp3', 'ogg', 'opus', 'flac', 'wav', 'm4a', 'aac']:
-                    if PYDUB_AVAILABLE:
-                        try:
-                            audio = AudioSegment.from_file(file_path)
-                            duration_ms = len(audio)
-                            duration_seconds = duration_ms / 1000.0
-                            
-                            return {
-                                'success': True,
-                                'file_type': 'audio',
-                                'duration_seconds': duration_seconds,
-                                'sample_rate': audio.frame_rate,
-                                'channels': audio.channels,
-                            }
-                        except Exception as e:
-                            pass
-                
-                # Видео форматы
-                elif detected_extension in ['mp4', 'avi', 'mov', 'mkv', 'webm']:
-                    if FFMPEG_AVAILABLE:
-                        try:
-                            probe = ffmpeg.probe(file_path)
-                            duration = float(probe['format']['duration'])
-                            
-                            return {
-                                'success': True,
-                                'file_type': 'video',
-                                'duration_seconds': duration,
-                                'format': probe['format']['format_name'],
-                                'bit_rate': probe['format'].get('bit_rate'),
-                                'size': probe['format'].get('size')
-                            }
-                        except Exception as e:
-                            pass
-            
-            # Fallback: пробуем оба метода (если расширение не определено или не распознано)
-            # Сначала пробуем как аудио
-            if PYDUB_AVAILABLE:
-                try:
-                    audio = AudioSegment.from_file(file_path)
-                    duration_ms = len(audio)
-                    duration_seconds = duration_ms / 1000.0
-                    
-                    return {
-                        'success': True,
-                        'file_type': 'audio',
-                        'duration_seconds': duration_seconds,
-                        'sample_rate': audio.frame_rate,
-                        'channels': audio.channels
-                    }
-                except Exception as e:
-                    pass
-            
-            # Пробуем как видео
-            if FFMPEG_AVAILABLE:
-                try:
-                    probe = ffmpeg.probe(file_path)
-                    duration = float(probe['format']['duration'])
-                    
-                    return {
-                        'success': True,
-                        'file_type': 'video',
-                        'duration_seconds': duration,
-                        'format': probe['format']['format_name'],
-                        'bit_rate': probe['format'].get('bit_rate'),
-                        'size': probe['format'].get('size')
-                    }
-                except Exception as e:
-                    pass
+            probe, error = self._analyze('probe', file_path)
+            if probe:
+                duration_info = self._get_duration_from_probe(probe)
+                if duration_info:
+                    return duration_info
             
             # Не удалось определить длительность
             return {
                 'success': False,
-                'error': 'Файл не поддерживается для определения длительности',
+                'error': 'Файл не поддерживается для определения длительности' + (f": {error}" if error else ''),
                 'file_type': 'unknown',
                 'duration_seconds': 0.0
             }
@@ -338,6 +419,40 @@ class FileAnalyzer:
                 'duration_seconds': 0.0
             }
 
+    def _get_duration_from_probe(self, probe: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Длительность и параметры из результата ffprobe (None - нет аудио/видео потоков или длительности)"""
+        file_format = probe.get('format', {})
+        streams = probe.get('streams', [])
+        # Обложка аудио (attached_pic) не делает файл видео
+        video_streams = [
+            stream for stream in streams
+            if stream.get('codec_type') == 'video' and not stream.get('disposition', {}).get('attached_pic')
+        ]
+        audio_streams = [stream for stream in streams if stream.get('codec_type') == 'audio']
+        
+        duration = file_format.get('duration') or next((stream['duration'] for stream in streams if stream.get('duration')), None)
+        if duration is None or not (video_streams or audio_streams):
+            return None
+        
+        if video_streams:
+            return {
+                'success': True,
+                'file_type': 'video',
+                'duration_seconds': float(duration),
+                'format': file_format.get('format_name'),
+                'bit_rate': file_format.get('bit_rate'),
+                'size': file_format.get('size')
+            }
+        
+        audio = audio_streams[0]
+        return {
+            'success': True,
+            'file_type': 'audio',
+            'duration_seconds': float(duration),
+            'sample_rate': int(audio.get('sample_rate') or 0),
+            'channels': audio.get('channels'),
+        }
+
     def get_content_type(self, file_path: str) -> Dict[str, Any]:
         """
         Определение Content-Type (MIME-типа) файла
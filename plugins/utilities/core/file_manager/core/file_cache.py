@@ -53,6 +53,9 @@ class FileCache:
                 cached_data = cache_repo.get_cache(cache_key)
                 
                 if cached_data:
+                    # Время последнего обращения - для вытеснения давно не используемых файлов (cache_cleaner)
+                    cache_repo.touch_cache(cache_key)
+                    
                     # Объединяем метаданные с путем к файлу
                     result = cached_data.get('hash_metadata', {}).copy()
                     
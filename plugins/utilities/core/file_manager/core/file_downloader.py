@@ -1,7 +1,14 @@
+import asyncio
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Any, Callable, Dict, Optional
 from aiogram import Bot
 
+from .parallel_downloader import DEFAULT_PART_SIZE, ParallelDownloader, TelethonPartSource
+
+# Общие для всех экземпляров FileDownloader (file_manager не singleton): скачивания в процессе по ключу содержимого
+_inflight_downloads: Dict[str, asyncio.Future] = {}
+
 
 class FileDownloader:
     """
@@ -20,6 +27,17 @@ class FileDownloader:
         # Получаем настройки папки по умолчанию
         settings = self.settings_manager.get_plugin_settings("file_manager")
         self.default_download_folder = settings.get('default_download_folder', 'download')
+        self.dedup_downloads: bool = settings.get('dedup_downloads', True)
+        self.mtproto_parallel_threshold: int = int(settings.get('mtproto_parallel_threshold_mb', 10) * 1024 * 1024)
+        
+        # Параллельное скачивание больших файлов MTProto частями
+        self.parallel_downloader = ParallelDownloader(
+            self.logger,
+            part_size=settings.get('mtproto_part_size_kb', DEFAULT_PART_SIZE // 1024) * 1024,
+            workers=settings.get('mtproto_part_workers', 4),
+            max_parallel_parts=settings.get('mtproto_max_parallel_parts', 16),
+            part_retries=settings.get('mtproto_part_retries', 3)
+        )
         
         # Инициализируем кэш
         from .file_cache import FileCache
@@ -53,11 +71,19 @@ class FileDownloader:
             return 'bot_api'  # Fallback к Bot API
     
     async def download_file(self, file_id: str, target_folder: str = None, media_type: str = None, 
-                           access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None) -> Dict[str, Any]:
+                           access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None,
+                           file_unique_id: str = None, file_size: int = None,
+                           progress_callback: Optional[Callable[[int, int], Any]] = None,
+                           workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Универсальный метод скачивания файла.
         Автоматически определяет нужный API, создает папку и скачивает файл.
         Возвращает абсолютный путь к готовому файлу.
+        Уже скачанный в target_folder файл (по file_unique_id или id MTProto) отдается из хранилища без сетевых запросов,
+        одновременные запросы одного файла объединяются в одно скачивание.
+        Большие файлы MTProto (известен file_size) скачиваются параллельными частями с докачкой,
+        progress_callback(скачано_байт, всего_байт) вызывается по мере скачивания частей,
+        workers - параллельных частей для этого файла (по умолчанию mtproto_part_workers).
         """
         try:
             # Определяем папку для скачивания
@@ -77,47 +103,138 @@ class FileDownloader:
             # Определяем тип API
             api_type = self._determine_api_type(file_id)
             
-            # Скачиваем файл через соответствующий API
+            # Проверяем наличие обязательных параметров для MTProto
+            if api_type == 'mtproto' and (access_hash is None or file_reference is None):
+                self.logger.warning(f"  - ⚠️ MTProto скачивание НЕ удалось: нет access_hash или file_reference")
+                return {
+                    'success': False,
+                    'error': f'Для MTProto скачивания необходимы access_hash и file_reference',
+                    'file_id': file_id,
+                    'media_type': media_type,
+                    'api_type': 'mtproto'
+                }
+            
+            download_args = (file_id, resolved_target_folder, media_type, api_type,
+                             access_hash, file_reference, thumb_size, download_type, file_size, progress_callback, workers)
+            
+            content_key = self._get_content_key(api_type, file_id, file_unique_id, media_type, thumb_size, download_type,
+                                                resolved_target_folder)
+            if not self.dedup_downloads or content_key is None:
+                # Ключ содержимого станет известен только после скачивания (хеш файла)
+                return await self._download_and_store(*download_args, content_key=None)
+            
+            # Файл уже в хранилище - без сетевых запросов
+            stored = await self._get_stored_file(content_key, file_id, api_type)
+            if stored:
+                return stored
+            
+            # Одновременные запросы одного файла ждут одно скачивание
+            task = _inflight_downloads.get(content_key)
+            if task is None:
+                task = asyncio.ensure_future(self._download_and_store(*download_args, content_key=content_key))
+                _inflight_downloads[content_key] = task
+                task.add_done_callback(lambda _: _inflight_downloads.pop(content_key, None))
+            
+            # shield - отмена одного из ожидающих не прерывает общее скачивание
+            result = await asyncio.shield(task)
+            return dict(result)
+            
+        except Exception as e:
+            self.logger.error(f"Ошибка скачивания файла {file_id}: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'file_id': file_id,
+                'media_type': media_type,
+                'api_type': 'unknown'
+            }
+
+    def _get_content_key(self, api_type: str, file_id: str, file_unique_id: Optional[str], media_type: Optional[str],
+                         thumb_size: Optional[str], download_type: Optional[str], target_folder: str) -> Optional[str]:
+        """
+        Ключ содержимого файла до скачивания (None - только по хешу содержимого после скачивания).
+        Bot API: file_unique_id одинаков у пересланных копий; MTProto: id документа/фото постоянен
+        """
+        if api_type == 'bot_api':
+            return self._with_folder(f"tg_unique:{file_unique_id}", target_folder) if file_unique_id else None
+        file_type = download_type or media_type or 'document'
+        return self._with_folder(f"mtproto:{file_type}:{file_id}:{thumb_size or ''}", target_folder)
+
+    @staticmethod
+    def _with_folder(content_key: str, target_folder: str) -> str:
+        """Ключ дедупликации в пределах папки: вызывающий получает файл только из запрошенного target_folder"""
+        return f"{content_key}@{os.path.abspath(target_folder)}"
+
+    def _get_store_cache_key(self, content_key: str) -> str:
+        return self.hash_manager.generate_hash(file_content_key=content_key)
+
+    async def _get_stored_file(self, content_key: str, file_id: str, api_type: str) -> Optional[Dict[str, Any]]:
+        """Файл из хранилища по ключу содержимого (None - нет записи или файл уже удален)"""
+        cached = await self.file_cache.get_cached_file_info(self._get_store_cache_key(content_key))
+        file_path = cached.get('file_path') if cached else None
+        if not file_path or not os.path.isfile(file_path):
+            return None
+        
+        return {
+            'success': True,
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'file_size': os.path.getsize(file_path),
+            'media_type': cached.get('media_type'),
+            'api_type': api_type,
+            'file_id': file_id,
+            'from_cache': True
+        }
+
+    async def _download_and_store(self, file_id: str, target_folder: str, media_type: Optional[str], api_type: str,
+                                  access_hash: Optional[int], file_reference: Optional[bytes], thumb_size: Optional[str],
+                                  download_type: Optional[str], file_size: Optional[int],
+                                  progress_callback: Optional[Callable[[int, int], Any]], workers: Optional[int],
+                                  content_key: Optional[str]) -> Dict[str, Any]:
+        """Скачивает файл через соответствующий API и сохраняет его в хранилище (кэш)"""
+        try:
             if api_type == 'bot_api':
-                result = await self._download_via_bot_api(file_id, resolved_target_folder, media_type)
+                result = await self._download_via_bot_api(file_id, target_folder, media_type)
             else:  # mtproto
-                # Проверяем наличие обязательных параметров для MTProto
-                if access_hash is None or file_reference is None:
-                    self.logger.warning(f"  - ⚠️ MTProto скачивание НЕ удалось: нет access_hash или file_reference")
-                    return {
-                        'success': False,
-                        'error': f'Для MTProto скачивания необходимы access_hash и file_reference',
-                        'file_id': file_id,
-                        'media_type': media_type,
-                        'api_type': 'mtproto'
-                    }
+                result = await self._download_via_mtproto(file_id, target_folder, media_type, access_hash, file_reference, thumb_size, download_type,
+                                                         file_size, progress_callback, workers)
+            
+            if not result.get('success'):
+                self.logger.warning(f"  - ⚠️ Скачивание НЕ удалось для file_id: {file_id}")
+                return result
+            
+            if self.dedup_downloads and content_key is None:
+                # Нет file_unique_id - дедупликация по хешу содержимого (потоково, вне event loop)
+                loop = asyncio.get_running_loop()
+                content_hash = await loop.run_in_executor(None, self.hash_manager.generate_content_hash, result['file_path'])
+                content_key = self._with_folder(f"content:{content_hash}", target_folder)
                 
-                result = await self._download_via_mtproto(file_id, resolved_target_folder, media_type, access_hash, file_reference, thumb_size, download_type)
+                stored = await self._get_stored_file(content_key, file_id, api_type)
+                if stored and stored['file_path'] != result['file_path']:
+                    os.remove(result['file_path'])
+                    return stored
             
-            # Если скачивание успешно, сохраняем в кэш
-            if result.get('success'):
-                # Генерируем ключ кэша
-                # Создаем уникальный ключ кэша: file_id + текущее время
-                # Это гарантирует что каждый файл будет сохранен как новая запись
-                import time
+            if content_key:
+                cache_key = self._get_store_cache_key(content_key)
+            else:
+                # Без дедупликации каждый файл сохраняется как новая запись: file_id + текущее время
                 timestamp = int(time.time() * 1000000)  # микросекунды для уникальности
                 cache_key = self.hash_manager.generate_hash(f"file_cache_{file_id}_{timestamp}")
-                
-                metadata = {
-                    'file_id': file_id,
-                    'media_type': result.get('media_type') or media_type,
-                    'api_type': api_type,
-                    'file_size': result.get('file_size', 0)
-                }
-                
-                cache_result = await self.file_cache.save_file_to_cache(
-                    file_path=result.get('file_path'),
-                    cache_key=cache_key,
-                    **metadata
-                )
-            else:
-                self.logger.warning(f"  - ⚠️ Скачивание НЕ удалось для file_id: {file_id}")
             
+            metadata = {
+                'file_id': file_id,
+                'media_type': result.get('media_type') or media_type,
+                'api_type': api_type,
+                'file_size': result.get('file_size', 0)
+            }
+            if content_key:
+                metadata['content_key'] = content_key
+            
+            await self.file_cache.save_file_to_cache(
+                file_path=result.get('file_path'),
+                cache_key=cache_key,
+                **metadata
+            )
             return result
             
         except Exception as e:
@@ -127,7 +244,7 @@ class FileDownloader:
                 'error': str(e),
                 'file_id': file_id,
                 'media_type': media_type,
-                'api_type': 'unknown'
+                'api_type': api_type
             }
     
     async def _download_via_bot_api(self, file_id: str, target_folder: str, media_type: str = None) -> Dict[str, Any]:
@@ -204,7 +321,7 @@ class FileDownloader:
                 }
             
             # Получаем полную информацию о файле через анализатор
-            file_info = self.file_analyzer.get_file_info(temp_file_path)
+            file_info = await self.file_analyzer.get_file_info_async(temp_file_path)
             
             # Определяем расширение и media_type
             if file_info.get('success') and file_info.get('extension'):
@@ -245,11 +362,14 @@ class FileDownloader:
             }
     
     async def _download_via_mtproto(self, file_id: str, target_folder: str, media_type: str = None, 
-                                   access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None) -> Dict[str, Any]:
+                                   access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None,
+                                   file_size: int = None, progress_callback: Optional[Callable[[int, int], Any]] = None,
+                                   workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Скачивает файл через MTProto API с определением реального расширения.
         target_folder уже обработан в основном методе и не может быть None.
         access_hash и file_reference уже проверены в основном методе.
+        Файлы от mtproto_parallel_threshold_mb скачиваются параллельными частями (нужен file_size).
         """
         try:
             # Проверяем доступность MTProto клиента
@@ -313,14 +433,27 @@ class FileDownloader:
                         thumb_size=doc_thumb_size
                     )
                 
-                await self.tg_mtproto.safe_api_call(
-                    client.download_file,
-                    input_location,
-                    temp_file_path
-                )
+                if file_size and file_size >= self.mtproto_parallel_threshold:
+                    # Постоянное имя частичного файла - прерванное скачивание продолжится с недостающих частей
+                    partial_file_path = os.path.join(target_folder, f"mtproto-{file_type}-{file_id}-{thumb_size or 'full'}.part")
+                    source = TelethonPartSource(client, input_location)
+                    try:
+                        await self.parallel_downloader.download(
+                            source, partial_file_path, file_size, workers=workers, progress_callback=progress_callback
+                        )
+                    finally:
+                        await source.close()
+                    os.replace(partial_file_path, temp_file_path)
+                else:
+                    await self.tg_mtproto.safe_api_call(
+                        client.download_file,
+                        input_location,
+                        temp_file_path,
+                        progress_callback=progress_callback
+                    )
                 
                 # Получаем полную информацию о файле через анализатор
-                file_info = self.file_analyzer.get_file_info(temp_file_path)
+                file_info = await self.file_analyzer.get_file_info_async(temp_file_path)
                 
                 # Определяем расширение и media_type
                 if file_info.get('success') and file_info.get('extension') and file_info['extension'] != 'tmp':
@@ -0,0 +1,191 @@
+import asyncio
+import inspect
+import os
+import struct
+from typing import Any, Callable, Dict, Optional, Set
+
+# Размер части по умолчанию: GetFileRequest требует limit кратный 4 КБ и делящий 1 МБ
+DEFAULT_PART_SIZE = 512 * 1024
+MAX_PART_SIZE = 1024 * 1024
+
+# Индекс скачанной части в файле состояния (рядом с частичным файлом)
+_PART_INDEX = struct.Struct('<I')
+
+# Общие для всех экземпляров (file_manager не singleton): глобальный лимит одновременных запросов частей
+_part_semaphores: Dict[int, asyncio.Semaphore] = {}
+
+
+def _get_part_semaphore(limit: int) -> asyncio.Semaphore:
+    semaphore = _part_semaphores.get(limit)
+    if semaphore is None:
+        semaphore = _part_semaphores[limit] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+class TelethonPartSource:
+    """
+    Источник частей файла через MTProto (upload.getFile).
+    При FILE_MIGRATE_X переключается на sender нужного DC, как это делает сам Telethon
+    """
+
+    def __init__(self, client, location, dc_id: Optional[int] = None):
+        self.client = client
+        self.location = location
+        self.dc_id = dc_id
+        self._sender = None
+        self._lock = asyncio.Lock()
+
+    async def _get_sender(self):
+        async with self._lock:
+            if self._sender is None and self.dc_id and self.dc_id != self.client.session.dc_id:
+                self._sender = await self.client._borrow_exported_sender(self.dc_id)
+            return self._sender
+
+    async def get_part(self, offset: int, limit: int) -> bytes:
+        from telethon.errors import FileMigrateError
+        from telethon.tl.functions.upload import GetFileRequest
+
+        request = GetFileRequest(location=self.location, offset=offset, limit=limit)
+        # Переход в каждый DC - не больше одного раза на запрос части (защита от зацикливания миграций)
+        migrated_to: Set[int] = set()
+        while True:
+            sender = await self._get_sender()
+            try:
+                if sender is None:
+                    result = await self.client(request)
+                else:
+                    result = await self.client._call(sender, request)
+                return result.bytes
+            except FileMigrateError as e:
+                if e.new_dc in migrated_to:
+                    raise
+                migrated_to.add(e.new_dc)
+                # Файл хранится в другом DC - дальнейшие части запрашиваем там
+                async with self._lock:
+                    if self.dc_id != e.new_dc:
+                        await self._release_sender()
+                        self.dc_id = e.new_dc
+
+    async def _release_sender(self):
+        if self._sender is not None:
+            await self.client._return_exported_sender(self._sender)
+            self._sender = None
+
+    async def close(self):
+        async with self._lock:
+            await self._release_sender()
+
+
+class ParallelDownloader:
+    """
+    Параллельное скачивание файла частями фиксированного размера.
+    Части пишутся по своим смещениям в частичный файл, скачанные части отмечаются в файле состояния -
+    прерванное скачивание продолжается с недостающих частей.
+    Источник частей - любой объект с async get_part(offset, limit) -> bytes
+    """
+
+    def __init__(self, logger, part_size: int = DEFAULT_PART_SIZE, workers: int = 4,
+                 max_parallel_parts: int = 16, part_retries: int = 3):
+        self.logger = logger
+        if part_size % 4096 or MAX_PART_SIZE % part_size:
+            raise ValueError(f"Размер части {part_size} должен быть кратен 4096 и делить {MAX_PART_SIZE}")
+        self.part_size = part_size
+        self.workers = workers
+        self.max_parallel_parts = max_parallel_parts
+        self.part_retries = part_retries
+
+    async def download(self, source: Any, file_path: str, file_size: int, workers: int = None,
+                       progress_callback: Optional[Callable[[int, int], Any]] = None) -> int:
+        """
+        Скачивает файл размера file_size в file_path (workers - параллельных частей для этого файла).
+        progress_callback(скачано_байт, всего_байт) может быть обычной или async функцией
+        """
+        state_path = f"{file_path}.parts"
+        parts_total = (file_size + self.part_size - 1) // self.part_size
+        done = self._load_done_parts(file_path, state_path, parts_total)
+        pending = [index for index in range(parts_total) if index not in done]
+        progress = {'downloaded': sum(self._part_length(index, file_size) for index in done)}
+        if done:
+            self.logger.info(f"Докачка {file_path}: уже есть {len(done)} из {parts_total} частей")
+
+        fd = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with open(state_path, 'ab') as state:
+                queue = iter(pending)
+                semaphore = _get_part_semaphore(self.max_parallel_parts)
+
+                async def worker():
+                    for index in queue:
+                        offset = index * self.part_size
+                        async with semaphore:
+                            data = await self._fetch_part(source, offset)
+                        length = self._part_length(index, file_size)
+                        if len(data) < length:
+                            raise IOError(f"Часть {index}: получено {len(data)} из {length} байт")
+                        os.pwrite(fd, data[:length], offset)
+                        state.write(_PART_INDEX.pack(index))
+                        state.flush()
+                        progress['downloaded'] += length
+                        await self._report_progress(progress_callback, progress['downloaded'], file_size)
+
+                worker_count = min(workers or self.workers, len(pending))
+                await self._run_workers([worker() for _ in range(worker_count)])
+            os.ftruncate(fd, file_size)
+        finally:
+            os.close(fd)
+
+        os.remove(state_path)
+        return file_size
+
+    def _part_length(self, index: int, file_size: int) -> int:
+        return min(self.part_size, file_size - index * self.part_size)
+
+    def _load_done_parts(self, file_path: str, state_path: str, parts_total: int) -> Set[int]:
+        """Скачанные части предыдущей попытки (без частичного файла докачка невозможна)"""
+        if not os.path.exists(file_path):
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            return set()
+        try:
+            with open(state_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return set()
+        # Недописанная последняя запись отбрасывается
+        usable = len(data) - len(data) % _PART_INDEX.size
+        return {index for (index,) in _PART_INDEX.iter_unpack(data[:usable]) if index < parts_total}
+
+    async def _fetch_part(self, source: Any, offset: int) -> bytes:
+        for attempt in range(1, self.part_retries + 1):
+            try:
+                return await source.get_part(offset, self.part_size)
+            except Exception as e:
+                if attempt == self.part_retries:
+                    raise
+                self.logger.warning(f"Ошибка получения части (offset={offset}, попытка {attempt}): {e}")
+                await asyncio.sleep(attempt)
+
+    async def _run_workers(self, coroutines):
+        """Запускает воркеры; при ошибке одного остальные отменяются и ошибка пробрасывается"""
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        if not tasks:
+            return
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _report_progress(self, progress_callback, downloaded: int, total: int):
+        if not progress_callback:
+            return
+        try:
+            result = progress_callback(downloaded, total)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            self.logger.warning(f"Ошибка progress_callback: {e}")
@@ -1,6 +1,6 @@
 import os
 import time
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from pathlib import Path
 
 # Импорт новых модулей
@@ -8,30 +8,6 @@ from .core.file_downloader import FileDownloader
 from .core.file_analyzer import FileAnalyzer
 from .core.file_cache import FileCache
 
-# Импорт для работы с аудио
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
-    AudioSegment = None
-
-# Импорт для работы с видео
-try:
-    import ffmpeg
-    FFMPEG_AVAILABLE = True
-except ImportError:
-    FFMPEG_AVAILABLE = False
-    ffmpeg = None
-
-# Импорт для определения MIME-типов
-try:
-    import magic
-    MAGIC_AVAILABLE = True
-except ImportError:
-    MAGIC_AVAILABLE = False
-    magic = None
-
 
 class FileManager:
     """
@@ -49,10 +25,7 @@ class FileManager:
         # Настройка папки по умолчанию для скачивания
         self.default_download_folder = settings.get('default_download_folder', 'download')
         
-        # Проверяем доступность библиотек
-        self._check_dependencies()
-        
-        # Инициализируем модули
+        # Инициализируем модули (доступность ffprobe и python-magic проверяет анализатор)
         self.file_downloader = FileDownloader(**kwargs)
         self.file_analyzer = FileAnalyzer(**kwargs)
         self.file_cache = FileCache(**kwargs)
@@ -60,17 +33,6 @@ class FileManager:
         # Создаем необходимые директории при инициализации
         self._ensure_directories()
 
-    def _check_dependencies(self):
-        """Проверяет доступность необходимых библиотек"""
-        if not PYDUB_AVAILABLE:
-            self.logger.warning("pydub недоступен - ограниченная поддержка аудио")
-        
-        if not FFMPEG_AVAILABLE:
-            self.logger.warning("ffmpeg-python недоступен - ограниченная поддержка видео")
-        
-        if not MAGIC_AVAILABLE:
-            self.logger.warning("python-magic недоступен - определение MIME-типов отключено")
-
     def validate_file(self, file_path: str, max_size_mb: float = None,
                      max_duration_seconds: int = None, check_exists: bool = True) -> Dict[str, Any]:
         """
@@ -104,14 +66,34 @@ class FileManager:
         """
         return self.file_analyzer.get_audio_encoding(file_path)
 
+    async def validate_file_async(self, file_path: str, max_size_mb: float = None,
+                                  max_duration_seconds: int = None, check_exists: bool = True) -> Dict[str, Any]:
+        """
+        Валидация файла в пуле анализа с таймаутом (не блокирует event loop)
+        """
+        return await self.file_analyzer.validate_file_async(
+            file_path, max_size_mb, max_duration_seconds, check_exists
+        )
+
+    async def get_file_duration_async(self, file_path: str, extension_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Получение длительности файла в пуле анализа с таймаутом
+        """
+        return await self.file_analyzer.get_file_duration_async(file_path, extension_info)
+
     async def download_file(self, file_id: str, target_folder: str = None, media_type: str = None, 
-                           access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None) -> Dict[str, Any]:
+                           access_hash: int = None, file_reference: bytes = None, thumb_size: str = None, download_type: str = None,
+                           file_unique_id: str = None, file_size: int = None,
+                           progress_callback: Optional[Callable[[int, int], Any]] = None,
+                           workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Универсальный метод скачивания файла.
         Автоматически определяет нужный API, создает папку и скачивает файл.
-        Возвращает абсолютный путь к готовому файлу.
+        Возвращает абсолютный путь к готовому файлу (уже скачанный файл - из хранилища, без сетевых запросов).
+        workers - параллельных частей для этого файла (по умолчанию mtproto_part_workers).
         """
-        return await self.file_downloader.download_file(file_id, target_folder, media_type, access_hash, file_reference, thumb_size, download_type)
+        return await self.file_downloader.download_file(file_id, target_folder, media_type, access_hash, file_reference, thumb_size, download_type, file_unique_id,
+                                                         file_size, progress_callback, workers)
     
     def get_file_info(self, file_path: str) -> Dict[str, Any]:
         """
@@ -119,6 +101,12 @@ class FileManager:
         Использует анализатор файлов для определения по содержимому.
         """
         return self.file_analyzer.get_file_info(file_path)
+
+    async def get_file_info_async(self, file_path: str) -> Dict[str, Any]:
+        """
+        Получает информацию о файле в пуле анализа с таймаутом (не блокирует event loop)
+        """
+        return await self.file_analyzer.get_file_info_async(file_path)
         
     async def save_to_cache(self, file_path: str, cache_key: str, **metadata) -> bool:
         """
@@ -1,7 +1,23 @@
 import json
-from typing import Any, Dict, List
+import re
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
 from collections import OrderedDict
 
+# Корень плейсхолдера: {field}, {field|modifier}, {object.field}, вложенные {a|+{b}}
+PLACEHOLDER_ROOT_PATTERN = re.compile(r'\{\s*([A-Za-z_][A-Za-z0-9_]*)')
+
+# Имя индекса полей событий в снимке сценариев
+EVENT_FIELDS_INDEX = 'trigger_manager.event_fields'
+
+# Поля события, которые сохраняются в event_data всегда
+DEFAULT_EVENT_DATA_FIELDS = [
+    'source_type', 'user_id', 'chat_id', 'chat_type', 'chat_title', 'message_id',
+    'callback_id', 'callback_data', 'event_text', 'event_date', 'username', 'first_name',
+    'last_name', 'is_bot', 'entity_id', 'entity_type', 'is_reply', 'is_forward',
+    'media_group_id', 'trace_id',
+]
+
 
 class TriggerManager:
     """
@@ -14,6 +30,9 @@ class TriggerManager:
         self.database_service = kwargs['database_service']
         self.trigger_processing = kwargs['trigger_processing']
         self.permission_manager = kwargs.get('permission_manager')  # Опциональная зависимость
+        self.plugins_manager = kwargs.get('plugins_manager')  # Опциональная зависимость
+        self.metrics_collector = kwargs.get('metrics_collector')  # Опциональная зависимость
+        self.event_tracer = kwargs.get('event_tracer')  # Опциональная зависимость
         self.datetime_formatter = kwargs['datetime_formatter']
         self.bot = kwargs['tg_bot_initializer'].get_bot()
         
@@ -30,8 +49,17 @@ class TriggerManager:
         self.cache_ttl_seconds = plugin_settings.get('cache_ttl_seconds', 15)
         self.cleanup_frequency = plugin_settings.get('cleanup_frequency', 50)
         
+        # Сокращение event_data: сохраняются только поля, на которые ссылаются действия
+        self.prune_event_data = plugin_settings.get('prune_event_data', True)
+        self.event_data_fields = frozenset(plugin_settings.get('event_data_fields', DEFAULT_EVENT_DATA_FIELDS))
+        self._required_data = self._load_required_data()
+        
         # Счетчики для очистки
         self._event_counter = 0
+        
+        # Индекс полей хранится в снимке сценариев и строится до его публикации
+        if self.prune_event_data:
+            self.scenarios_manager.subscribe(EVENT_FIELDS_INDEX, self._build_event_fields_index)
 
     async def handle_event(self, event: Dict[str, Any]):
         """
@@ -39,31 +67,133 @@ class TriggerManager:
         Поддерживает множественные триггеры.
         """
         
+        start = time.perf_counter()
+        # Один снимок сценариев на всю обработку: перезагрузка во время await не смешивает версии
+        model = self.scenarios_manager.get_model()
+        
+        # 0-1. Дедупликация и поиск всех сценариев по событию
+        scenario_names = self._match_event(event, model)
+        if not scenario_names:
+            return
+        
+        trace_id = event.get('trace_id')
+        tracer = self.event_tracer if trace_id else None
+            
+        # 2. Обработка всех найденных сценариев
+        stage_start = time.time()
+        for scenario_name in scenario_names:
+            await self._process_single_scenario(event, scenario_name, model)
+        if tracer:
+            tracer.record_span(trace_id, 'actions_insert', stage_start)
+        
+        if self.metrics_collector:
+            self.metrics_collector.inc('scenarios_matched_total', len(scenario_names))
+            self.metrics_collector.observe('handle_event_seconds', time.perf_counter() - start)
+
+    async def handle_events(self, events: List[Dict[str, Any]]):
+        """
+        Пакетная обработка (пачка updates одного polling запроса): дедупликация и поиск сценариев в памяти,
+        пользователи и действия всех событий записываются одной транзакцией в порядке поступления.
+        Вся пачка обрабатывается на одном снимке сценариев.
+        """
+        start = time.perf_counter()
+        model = self.scenarios_manager.get_model()
+        matched = []
+        for event in events:
+            try:
+                scenario_names = self._match_event(event, model)
+            except Exception as e:
+                self.logger.error(f"Ошибка поиска сценариев для события chat_id={event.get('chat_id')}, user_id={event.get('user_id')}: {e}")
+                continue
+            if scenario_names:
+                matched.append((event, scenario_names))
+        
+        if not matched:
+            return
+        
+        stage_start = time.time()
+        if not await self._persist_batch(matched, model):
+            # Пакет отменен целиком - записываем по одному событию (дедупликация уже пройдена)
+            self.logger.warning(f"Пакет из {len(matched)} событий отменен, запись по одному событию")
+            for event, scenario_names in matched:
+                for scenario_name in scenario_names:
+                    try:
+                        await self._process_single_scenario(event, scenario_name, model)
+                    except Exception as e:
+                        self.logger.error(f"Ошибка обработки сценария '{scenario_name}': {e}")
+        
+        if self.event_tracer:
+            for event, _ in matched:
+                trace_id = event.get('trace_id')
+                if trace_id:
+                    self.event_tracer.record_span(trace_id, 'actions_insert', stage_start)
+        
+        if self.metrics_collector:
+            self.metrics_collector.inc('scenarios_matched_total', sum(len(names) for _, names in matched))
+            self.metrics_collector.observe('handle_batch_seconds', time.perf_counter() - start)
+            # Средний размер пакета: batch_events_total / event_batches_total
+            self.metrics_collector.inc('event_batches_total')
+            self.metrics_collector.inc('batch_events_total', len(events))
+
+    async def _persist_batch(self, matched: list, model) -> bool:
+        """
+        Записывает пользователей и действия пакета одной транзакцией. False - пакет отменен
+        (ошибка любого события отменяет пакет - события записываются заново по одному)
+        """
+        with self.database_service.session_scope('actions', 'users', batch=True) as (session, repos):
+            for event, scenario_names in matched:
+                try:
+                    for scenario_name in scenario_names:
+                        await self._process_single_scenario(event, scenario_name, model, repos)
+                except Exception as e:
+                    self.logger.error(f"Ошибка пакетной записи события chat_id={event.get('chat_id')}, user_id={event.get('user_id')}: {e}")
+                    session.rollback()
+                    break
+        return not session.failed
+
+    def _match_event(self, event: Dict[str, Any], model) -> List[str]:
+        """Дедупликация и поиск сценариев по событию. Пустой список - событие не обрабатывается"""
+        start = time.perf_counter()
+        trace_id = event.get('trace_id')
+        tracer = self.event_tracer if trace_id else None
+        
         # Увеличиваем счетчик событий
         self._event_counter += 1
         
         # 0. Проверка дедупликации
-        if self._is_duplicate_event(event):
-            return
+        stage_start = time.time()
+        is_duplicate = self._is_duplicate_event(event)
+        if tracer:
+            tracer.record_span(trace_id, 'dedup', stage_start)
+        if is_duplicate:
+            if self.metrics_collector:
+                self.metrics_collector.inc('events_duplicate_total')
+            return []
         
         # 1. Поиск всех сценариев по событию
-        scenario_names = self.trigger_processing.find_all_scenarios_by_event(event)
+        stage_start = time.time()
+        scenario_names = self.trigger_processing.find_all_scenarios_by_event(event, model)
+        if tracer:
+            tracer.record_span(trace_id, 'trigger_match', stage_start)
+        if self.metrics_collector:
+            self.metrics_collector.observe('trigger_match_seconds', time.perf_counter() - start, source_type=event.get('source_type', 'unknown'))
+        
         if not scenario_names:
+            if self.metrics_collector:
+                self.metrics_collector.inc('events_unmatched_total', source_type=event.get('source_type', 'unknown'))
             # Сокращенная информация об ивенте для логов
             event_info = f"user_id={event.get('user_id')}, chat_id={event.get('chat_id')}, text='{event.get('event_text', '')[:20]}...'"
             self.logger.warning(f"Триггер не найден для ивента: {event_info}")
-            return
-            
-        # 2. Обработка всех найденных сценариев
-        for scenario_name in scenario_names:
-            await self._process_single_scenario(event, scenario_name)
+            return []
+        
+        return scenario_names
 
-    async def _process_single_scenario(self, event: Dict[str, Any], scenario_name: str):
+    async def _process_single_scenario(self, event: Dict[str, Any], scenario_name: str, model, repos: Optional[dict] = None):
         """
-        Обрабатывает один сценарий.
+        Обрабатывает один сценарий снимка model (repos - репозитории пакетной транзакции).
         """
         # Получение развернутого сценария
-        scenario = self.scenarios_manager.get_scenario(scenario_name)
+        scenario = model.get_scenario(scenario_name)
         if not scenario:
             self.logger.warning(f"Сценарий '{scenario_name}' не найден или не может быть развёрнут")
             return
@@ -74,40 +204,44 @@ class TriggerManager:
             return
             
         # Обработка действий
-        await self._process_actions(event, actions, scenario_name)
+        await self._process_actions(event, actions, scenario_name, model, repos)
 
-    async def _process_actions(self, event: Dict[str, Any], actions: list, scenario_name: str):
-        """Обрабатывает список действий из сценария."""
-        with self.database_service.session_scope('actions', 'users') as (_, repos):
-            actions_repo = repos['actions']
-            users_repo = repos['users']
+    async def _process_actions(self, event: Dict[str, Any], actions: list, scenario_name: str, model, repos: Optional[dict] = None):
+        """Обрабатывает список действий из сценария (без repos - в собственной сессии)."""
+        if repos is None:
+            with self.database_service.session_scope('actions', 'users') as (_, repos):
+                await self._process_actions(event, actions, scenario_name, model, repos)
+            return
+        
+        actions_repo = repos['actions']
+        users_repo = repos['users']
 
-            # Обновляем пользователя
-            await self._update_user(event, users_repo)
-            
-            # Обрабатываем действия
-            await self._process_actions_recursive(actions, event, actions_repo)
+        # Обновляем пользователя
+        await self._update_user(event, users_repo)
+        
+        # Обрабатываем действия
+        await self._process_actions_recursive(actions, event, actions_repo, model)
 
     async def _process_actions_recursive(self, actions: list, event: Dict[str, Any], 
-                                       actions_repo, previous_action_id: int = None) -> int:
+                                       actions_repo, model, previous_action_id: int = None) -> int:
         """Рекурсивно обрабатывает список действий с поддержкой массивов сценариев."""
         for action in actions:
             if action.get('type') == 'scenario':
                 # Обрабатываем сценарий (может быть строкой или массивом)
                 # Возвращаем ID последнего действия из сценария
-                last_action_id = await self._process_scenario_action(action, event, actions_repo, previous_action_id)
+                last_action_id = await self._process_scenario_action(action, event, actions_repo, model, previous_action_id)
                 if last_action_id:
                     previous_action_id = last_action_id
             else:
                 # Обычное действие
                 previous_action_id = await self._process_single_action(
-                    action, event, actions_repo, previous_action_id
+                    action, event, actions_repo, model, previous_action_id
                 )
         
         return previous_action_id
 
     async def _process_scenario_action(self, action: dict, event: Dict[str, Any], 
-                                     actions_repo, previous_action_id: int = None):
+                                     actions_repo, model, previous_action_id: int = None):
         """Обрабатывает действие типа 'scenario' с поддержкой массивов."""
         scenario_names = self._normalize_to_list(action.get('value'))
         
@@ -118,7 +252,7 @@ class TriggerManager:
         # Если несколько сценариев - связываем только с предыдущим действием до сценариев
         if len(scenario_names) > 1:
             for scenario_name in scenario_names:
-                scenario = self.scenarios_manager.get_scenario(scenario_name)
+                scenario = model.get_scenario(scenario_name)
                 if not scenario:
                     self.logger.error(f"Сценарий '{scenario_name}' не найден")
                     continue
@@ -129,13 +263,13 @@ class TriggerManager:
                     continue
                 
                 # Рекурсивно обрабатываем действия сценария с тем же previous_action_id
-                await self._process_actions_recursive(scenario_actions, event, actions_repo, previous_action_id)
+                await self._process_actions_recursive(scenario_actions, event, actions_repo, model, previous_action_id)
         
         # Если один сценарий - связываем с последним действием внутри сценария
         else:
             scenario_name = scenario_names[0]
             
-            scenario = self.scenarios_manager.get_scenario(scenario_name)
+            scenario = model.get_scenario(scenario_name)
             if not scenario:
                 self.logger.error(f"Сценарий '{scenario_name}' не найден")
                 return
@@ -146,7 +280,7 @@ class TriggerManager:
                 return
             
             # Рекурсивно обрабатываем действия сценария и получаем ID последнего действия
-            last_action_id = await self._process_actions_recursive(scenario_actions, event, actions_repo, previous_action_id)
+            last_action_id = await self._process_actions_recursive(scenario_actions, event, actions_repo, model, previous_action_id)
             
             # Обновляем previous_action_id для следующих действий
             if last_action_id:
@@ -187,13 +321,13 @@ class TriggerManager:
         )
 
     async def _process_single_action(self, action: dict, event: Dict[str, Any], 
-                                   actions_repo, previous_action_id: int = None) -> int:
+                                   actions_repo, model, previous_action_id: int = None) -> int:
         """Обрабатывает одно действие из сценария."""
         # Проверяем доступ к действию
         fail_reason = await self._check_action_access(action, event)
         
         # Подготавливаем данные действия
-        event_data, action_data = self._prepare_action_data(action, event, fail_reason)
+        event_data, action_data = self._prepare_action_data(action, event, fail_reason, model)
         
         # Определяем статус и параметры цепочки
         status, chain_params = self._determine_action_status(action_data, previous_action_id)
@@ -239,12 +373,12 @@ class TriggerManager:
             
         return None
 
-    def _prepare_action_data(self, action: dict, event: Dict[str, Any], fail_reason: str) -> tuple:
+    def _prepare_action_data(self, action: dict, event: Dict[str, Any], fail_reason: str, model) -> tuple:
         """Подготавливает данные действия с разделением на event_data и action_data."""
         # Разделяем данные: event_data содержит данные события, action_data - конфигурацию действия
         
         # event_data: данные события (user_id, chat_id, event_text и т.д.)
-        event_data = event.copy()
+        event_data = self._build_event_data(action, event, model)
         
         # action_data: конфигурация действия из сценария
         action_data = action.copy()
@@ -259,6 +393,72 @@ class TriggerManager:
         
         return event_data, action_data
 
+    def _build_event_data(self, action: dict, event: Dict[str, Any], model) -> dict:
+        """
+        Данные события для сохранения в действии (action - действие снимка model).
+        Ленивые поля события вычисляются, только если попадают в event_data.
+        """
+        if not self.prune_event_data:
+            return dict(event)
+        
+        index = model.get_index(EVENT_FIELDS_INDEX) or {}
+        fields = index[id(action)] if id(action) in index else self._get_action_event_fields(action)
+        if fields is None:
+            return dict(event)
+        return {key: event[key] for key in fields if key in event}
+
+    def _load_required_data(self) -> Dict[str, FrozenSet[str]]:
+        """required_data действий из config.yaml плагинов: тип действия -> поля события"""
+        required_data = {}
+        if not self.plugins_manager:
+            return required_data
+        
+        for plugin_info in self.plugins_manager.get_all_plugins_info().values():
+            for action_type, action_info in (plugin_info.get('actions') or {}).items():
+                if isinstance(action_info, dict) and 'required_data' in action_info:
+                    required_data[action_type] = frozenset(action_info.get('required_data') or [])
+        return required_data
+
+    def _build_event_fields_index(self, model) -> Dict[int, Optional[FrozenSet[str]]]:
+        """Статический анализ плейсхолдеров снимка: поля события для каждого действия сценариев"""
+        index = {}
+        for scenario in model.scenarios.values():
+            if not isinstance(scenario, dict):
+                continue
+            for action in scenario.get('actions') or []:
+                if isinstance(action, dict) and action.get('type') != 'scenario':
+                    index[id(action)] = self._get_action_event_fields(action)
+        
+        # Индекс хранится в самом снимке: id действий уникальны, пока снимок жив
+        pruned = sum(1 for fields in index.values() if fields is not None)
+        self.logger.info(f"Индекс полей событий построен (версия сценариев {model.version}): сокращается event_data {pruned} из {len(index)} действий")
+        return index
+
+    def _get_action_event_fields(self, action: dict) -> Optional[FrozenSet[str]]:
+        """
+        Поля события, нужные действию: базовые, required_data его типа и корни плейсхолдеров.
+        None - тип действия не объявляет required_data, событие сохраняется целиком.
+        """
+        required = self._required_data.get(action.get('type'))
+        if required is None:
+            return None
+        return self.event_data_fields | required | self._collect_placeholder_fields(action)
+
+    def _collect_placeholder_fields(self, value: Any) -> set:
+        """Рекурсивно собирает корневые поля плейсхолдеров из значений действия (и ключей - тексты кнопок)"""
+        if isinstance(value, str):
+            return set(PLACEHOLDER_ROOT_PATTERN.findall(value))
+        
+        fields = set()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                fields |= self._collect_placeholder_fields(key)
+                fields |= self._collect_placeholder_fields(item)
+        elif isinstance(value, list):
+            for item in value:
+                fields |= self._collect_placeholder_fields(item)
+        return fields
+
     def _determine_action_status(self, action_data: dict, previous_action_id: int) -> tuple:
         """Определяет статус действия и параметры цепочки."""
         # Используем action_data для всех параметров
@@ -332,7 +532,17 @@ class TriggerManager:
             action_params['prev_action_id'] = previous_action_id
             action_params['unlock_status'] = json.dumps(chain_params['unlock_statuses'], ensure_ascii=False)
         
-        return actions_repo.add_action(**action_params)
+        # Correlation id события для сквозной трассировки
+        trace_id = event_data.get('trace_id')
+        if trace_id:
+            action_params['trace_id'] = trace_id
+        
+        action_id = actions_repo.add_action(**action_params)
+        
+        if trace_id and self.event_tracer:
+            self.event_tracer.mark_enqueued(trace_id, action_id)
+        
+        return action_id
 
     def _is_duplicate_event(self, event: Dict[str, Any]) -> bool:
         """
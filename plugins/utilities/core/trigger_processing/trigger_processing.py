@@ -18,11 +18,13 @@ class TriggerProcessing:
         self.datetime_formatter = kwargs['datetime_formatter']
         self.tg_api_utils = kwargs['tg_api_utils']
 
-    def _get_triggers_for_event(self, event: dict) -> dict:
+    def _get_triggers_for_event(self, event: dict, model=None) -> dict:
         """
-        Возвращает набор триггеров из единого файла triggers.yaml.
+        Возвращает набор триггеров из единого файла triggers.yaml (из переданного снимка сценариев или текущего).
         Фильтрация по типам чатов теперь происходит через атрибут from_chat.
         """
+        if model is not None:
+            return model.triggers
         return self.scenarios_manager.get_triggers()
 
     def _parse_trigger_value(self, value, context: str = "text") -> list:
@@ -89,18 +91,19 @@ class TriggerProcessing:
         else:
             return "private"
 
-    def find_all_scenarios_by_event(self, event: dict) -> List[str]:
+    def find_all_scenarios_by_event(self, event: dict, model=None) -> List[str]:
         """
         Поиск всех сценариев по событию (text/callback/new_member) с поддержкой состояний пользователей.
+        model - снимок сценариев, по которому ищутся триггеры (по умолчанию текущий).
         Возвращает список всех найденных сценариев.
         """
-        triggers = self._get_triggers_for_event(event)
+        triggers = self._get_triggers_for_event(event, model)
         event_type = event.get('source_type')
 
         if event_type == 'text':
             return self._find_text_scenarios(event, triggers)
         elif event_type == 'callback':
-            return self._find_callback_scenarios(event, triggers)
+            return self._find_callback_scenarios(event, triggers, model)
         elif event_type == 'new_member':
             return self._find_new_member_scenarios(event, triggers)
 
@@ -214,7 +217,7 @@ class TriggerProcessing:
 
         return matching_scenarios
 
-    def _find_callback_scenarios(self, event: dict, triggers: dict) -> List[str]:
+    def _find_callback_scenarios(self, event: dict, triggers: dict, model=None) -> List[str]:
         """
         Поиск всех сценариев для callback событий с поддержкой множественных триггеров.
         Поддерживает старый формат (строка) и новый множественный формат (массив).
@@ -231,21 +234,20 @@ class TriggerProcessing:
         if isinstance(callback_data, str) and callback_data.startswith(":"):
             return [callback_data[1:]]
 
-        orig_text = self.tg_button_mapper.get_button_text(callback_data)
+        orig_text = self.tg_button_mapper.get_button_text(callback_data, model)
         if not orig_text:
             return []
         norm_orig = self.tg_button_mapper.normalize(orig_text)
 
-        # exact (нормализованный)
-        for key, val in triggers.get('callback', {}).get('exact', {}).items():
-            if self.tg_button_mapper.normalize(key) == norm_orig:
+        # exact (ключи нормализованы заранее в tg_button_mapper)
+        for norm_key, val in self.tg_button_mapper.get_callback_triggers('exact', model):
+            if norm_key == norm_orig:
                 should_continue = self._process_triggers(val, chat_id, chat_type, matching_scenarios, event)
                 if not should_continue:
                     return matching_scenarios
 
-        # contains (нормализованный)
-        for key, val in triggers.get('callback', {}).get('contains', {}).items():
-            norm_key = self.tg_button_mapper.normalize(key)
+        # contains (ключи нормализованы заранее в tg_button_mapper)
+        for norm_key, val in self.tg_button_mapper.get_callback_triggers('contains', model):
             if norm_key in norm_orig:
                 should_continue = self._process_triggers(val, chat_id, chat_type, matching_scenarios, event)
                 if not should_continue:
@@ -0,0 +1,142 @@
+import os
+import pickle
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+# libyaml (C) загрузчик в разы быстрее чистого Python, если PyYAML собран с ним
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Версия формата манифеста - при изменении старый файл игнорируется
+MANIFEST_VERSION = 2
+
+
+def load_yaml(file_path: str, plugins_manager=None) -> Any:
+    """Читает YAML через манифест plugins_manager, без него - напрямую тем же загрузчиком"""
+    if plugins_manager:
+        return plugins_manager.load_yaml(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YAML_LOADER)
+
+
+class ManifestCache:
+    """
+    Кэш распарсенных YAML (конфиги плагинов и репозиториев, сценарии, триггеры) в одном файле.
+    Запись валидируется по mtime и размеру файла - неизмененные файлы повторно не парсятся.
+    Кроме того хранит вычисленные по этим файлам данные (индекс плагинов), валидируемые по набору источников.
+    """
+
+    def __init__(self, cache_path: str, logger=None):
+        self.cache_path = cache_path
+        self.logger = logger
+        # путь -> (mtime_ns, размер, pickle распарсенных данных)
+        self._entries: Dict[str, Tuple[int, int, bytes]] = {}
+        # имя -> {'sources': {путь: (mtime_ns, размер)}, 'data': pickle вычисленных данных}
+        self._computed: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load_manifest()
+
+    def _load_manifest(self):
+        """Читает манифест с диска (отсутствующий или устаревший манифест - пустой кэш)"""
+        try:
+            with open(self.cache_path, 'rb') as f:
+                manifest = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Не удалось прочитать манифест {self.cache_path}: {e}")
+            return
+
+        # Манифест другой версии или другого загрузчика YAML не используем
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('loader') == YAML_LOADER.__name__:
+            self._entries = manifest.get('files', {})
+            self._computed = manifest.get('computed', {})
+
+    @staticmethod
+    def stat_source(path: str) -> Tuple[int, int]:
+        """Ключ источника для вычисленных данных: (mtime_ns, размер)"""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get_computed(self, name: str) -> Optional[Any]:
+        """
+        Возвращает копию вычисленных данных, если ни один источник не изменился (иначе None).
+        Проверка - только stat записанных путей, без обхода директорий и парсинга
+        """
+        entry = self._computed.get(name)
+        if not entry:
+            return None
+        try:
+            for path, key in entry['sources'].items():
+                if self.stat_source(path) != tuple(key):
+                    return None
+        except OSError:
+            # Источник удален - данные устарели
+            return None
+        self.hits += 1
+        return pickle.loads(entry['data'])
+
+    def put_computed(self, name: str, sources: Dict[str, Tuple[int, int]], data: Any):
+        """Запоминает вычисленные данные вместе с набором источников (путь -> (mtime_ns, размер))"""
+        try:
+            self._computed[name] = {'sources': dict(sources), 'data': pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)}
+            self._dirty = True
+        except Exception:
+            self._computed.pop(name, None)
+
+    def load_yaml(self, file_path: str) -> Any:
+        """
+        Возвращает распарсенный YAML файла: из манифеста, если файл не менялся, иначе парсит заново.
+        Каждый вызов возвращает независимую копию данных (их можно изменять)
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+
+        entry = self._entries.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            self.hits += 1
+            return pickle.loads(entry[2])
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.load(f, Loader=YAML_LOADER)
+        self.misses += 1
+
+        try:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+            self._dirty = True
+        except Exception:
+            # Непиклуемые данные просто не кэшируем
+            self._entries.pop(path, None)
+        return data
+
+    def save(self):
+        """Записывает манифест, если были изменения (атомарно через временный файл)"""
+        if not self._dirty:
+            return
+
+        # Удаленные файлы выбрасываем из манифеста
+        files = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(
+                    {'version': MANIFEST_VERSION, 'loader': YAML_LOADER.__name__, 'files': files, 'computed': self._computed},
+                    f, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp_path, self.cache_path)
+            self._entries = files
+            self._dirty = False
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Не удалось сохранить манифест {self.cache_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'computed': len(self._computed), 'hits': self.hits, 'misses': self.misses}
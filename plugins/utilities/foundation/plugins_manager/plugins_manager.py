@@ -1,8 +1,9 @@
 import os
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import yaml
+from .manifest_cache import ManifestCache
 
 
 class PluginsManager:
@@ -33,15 +34,24 @@ class PluginsManager:
         self.plugins_dir = plugins_dir
         self.utilities_dir = utilities_dir
         self.services_dir = services_dir
+        # Профилировщик запуска (--profile-startup), None - без замеров
+        self.profiler = kwargs.get('profiler')
         
         # Кеш для информации о утилитах и зависимостях
         self._utilities_info: Dict[str, Dict] = {}
         self._services_info: Dict[str, Dict] = {}
         self._dependency_graph: Dict[str, Set[str]] = {}
+        # Источники индекса при сканировании: путь директории/config.yaml -> (mtime_ns, размер)
+        self._scan_sources: Dict[str, Tuple[int, int]] = {}
 
         # Устанавливаем корень проекта надежным способом
         self.project_root = self._find_project_root(Path(__file__))
 
+        # Манифест распарсенных YAML (конфиги плагинов, репозиториев, сценарии) - проверка по mtime и размеру
+        self.manifest_cache = ManifestCache(
+            os.path.join(self.project_root, 'data', 'cache', 'manifest.pickle'), self.logger
+        )
+
         # Загружаем информацию о всех утилитах и сервисах
         self._load_utilities_and_services_info()
 
@@ -51,6 +61,19 @@ class PluginsManager:
         self._utilities_info.clear()
         self._services_info.clear()
         self._dependency_graph.clear()
+        self._scan_sources.clear()
+
+        # Ни одна директория и ни один config.yaml не менялись - берем готовый индекс из манифеста
+        cached = self.manifest_cache.get_computed('plugins_index')
+        if cached:
+            self._utilities_info.update(cached['utilities'])
+            self._services_info.update(cached['services'])
+            self._dependency_graph.update(cached['dependency_graph'])
+            self.logger.info(
+                f"Информация о плагинах загружена из манифеста: utilities {len(self._utilities_info)}, "
+                f"services {len(self._services_info)}"
+            )
+            return
 
         # Загружаем информацию о утилитах (рекурсивно)
         utilities_dir = os.path.join(self.project_root, self.plugins_dir, self.utilities_dir)
@@ -62,7 +85,14 @@ class PluginsManager:
         
         # Строим граф зависимостей
         self._build_dependency_graph()
-        
+
+        self.manifest_cache.put_computed('plugins_index', self._scan_sources, {
+            'utilities': self._utilities_info,
+            'services': self._services_info,
+            'dependency_graph': self._dependency_graph,
+        })
+        self.manifest_cache.save()
+
     def _scan_plugins_recursively(self, root_dir: str, plugin_type: str, target_cache: Dict[str, Dict]):
         """
         Рекурсивно сканирует директорию и загружает информацию о плагинах
@@ -78,6 +108,8 @@ class PluginsManager:
         """
         Рекурсивно сканирует директорию на предмет плагинов
         """
+        # mtime директории меняется при добавлении/удалении вложенных папок - это инвалидирует индекс
+        self._scan_sources[directory] = self.manifest_cache.stat_source(directory)
         for item_name in os.listdir(directory):
             item_path = os.path.join(directory, item_name)
             
@@ -89,7 +121,8 @@ class PluginsManager:
                     # Нашли плагин!
                     # Формируем относительный путь от корня проекта
                     relative_plugin_path = os.path.relpath(item_path, self.project_root)
-                    self._load_plugin_info(relative_plugin_path, item_name, plugin_type, target_cache, relative_path)
+                    with self.profiler.step('discovery', item_name) if self.profiler else nullcontext():
+                        self._load_plugin_info(relative_plugin_path, item_name, plugin_type, target_cache, relative_path)
                 else:
                     # Это подпапка, продолжаем рекурсию
                     new_relative_path = os.path.join(relative_path, item_name) if relative_path else item_name
@@ -104,8 +137,8 @@ class PluginsManager:
         config_path = os.path.join(full_plugin_path, 'config.yaml')
         
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f) or {}
+            self._scan_sources[config_path] = self.manifest_cache.stat_source(config_path)
+            config = self.manifest_cache.load_yaml(config_path) or {}
             
             # Проверяем, включен ли плагин (по умолчанию включен)
             enabled = config.get('enabled', True)
@@ -271,6 +304,15 @@ class PluginsManager:
         
         return plugin_info.get('optional_dependencies', [])
 
+    def load_yaml(self, file_path: str) -> Any:
+        """
+        Загружает YAML через общий манифест: неизмененный файл (mtime и размер) не парсится повторно
+        """
+        return self.manifest_cache.load_yaml(file_path)
+
+    def save_manifest(self):
+        """Сохраняет манифест распарсенных YAML, если были изменения"""
+        self.manifest_cache.save()
 
     def reload(self):
         """Перезагрузить информацию о плагинах"""
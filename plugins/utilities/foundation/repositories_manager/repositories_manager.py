@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from typing import Dict, Optional
 
-import yaml
+from ..plugins_manager.manifest_cache import load_yaml
 
 
 class RepositoriesManager:
@@ -32,6 +32,7 @@ class RepositoriesManager:
     def __init__(self, repositories_dir: str = "repositories", **kwargs):
         self.logger = kwargs['logger']
         self.repositories_dir = repositories_dir
+        self.plugins_manager = kwargs.get('plugins_manager')
         
         # Кеш для информации о репозиториях
         self._repositories_info: Dict[str, Dict] = {}
@@ -56,6 +57,8 @@ class RepositoriesManager:
 
         # Сканируем директорию репозиториев
         self._scan_repositories_directory(self._repositories_path)
+        if self.plugins_manager:
+            self.plugins_manager.save_manifest()
         
         self.logger.info(f"Загружено репозиториев: {len(self._repositories_info)}")
 
@@ -139,8 +142,7 @@ class RepositoriesManager:
         try:
             yaml_path = os.path.join(repository_path, yaml_file)
             
-            with open(yaml_path, 'r', encoding='utf-8') as file:
-                config = yaml.safe_load(file) or {}
+            config = load_yaml(yaml_path, self.plugins_manager) or {}
             
             # Создаем структуру информации о репозитории
             repository_info = {
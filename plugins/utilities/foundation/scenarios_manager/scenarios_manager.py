@@ -1,8 +1,44 @@
 import os
+import threading
 from pathlib import Path
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
-import yaml
+from ..plugins_manager.manifest_cache import load_yaml
+
+
+class ScenariosModel:
+    """
+    Неизменяемый снимок распарсенных сценариев и триггеров пресета вместе с производными индексами подписчиков.
+    При перезагрузке создается новый снимок - индексы строятся до его публикации, данные не изменяются.
+    """
+
+    __slots__ = ('version', 'preset', 'scenarios', 'triggers', 'name_map', 'indexes')
+
+    def __init__(self, version: int, preset: str, scenarios: Dict[str, Any], triggers: Dict[str, Any], name_map: Dict[str, str]):
+        self.version = version
+        self.preset = preset
+        self.scenarios: Mapping[str, Any] = MappingProxyType(scenarios)  # full_key -> сценарий
+        self.triggers: Mapping[str, Any] = MappingProxyType(triggers)
+        self.name_map: Mapping[str, str] = MappingProxyType(name_map)  # короткое имя -> full_key
+        # Индексы подписчиков, построенные из этого снимка: имя подписки -> индекс
+        self.indexes: Dict[str, Any] = {}
+
+    def get_index(self, name: str) -> Any:
+        """Индекс подписчика для этого снимка (None - подписки нет)"""
+        return self.indexes.get(name)
+
+    def get_scenario(self, key: str) -> Optional[dict]:
+        """Сценарий этого снимка по полному или короткому ключу"""
+        # Сначала ищем по полному ключу
+        scenario = self.scenarios.get(key)
+        if scenario is not None:
+            return scenario
+        # Если не найдено — ищем по короткому имени
+        full_key = self.name_map.get(key)
+        if full_key:
+            return self.scenarios.get(full_key)
+        return None
 
 
 class ScenariosManager:
@@ -35,15 +71,20 @@ class ScenariosManager:
         self._max_actions_limit = max_actions_limit
         self._max_nesting_depth = max_nesting_depth
         
-        # Кеш для сценариев и триггеров
-        self._cache: Dict[str, Any] = {}
-        self._scenario_name_map: Dict[str, str] = {}  # name -> full_key для поиска по короткому имени
+        # Текущий снимок сценариев и триггеров и построители индексов подписчиков (имя -> builder(model))
+        self._model: Optional[ScenariosModel] = None
+        self._subscribers: Dict[str, Callable[[ScenariosModel], Any]] = {}
+        # Перезагрузки (в т.ч. из потока наблюдателя за файлами) выполняются по одной
+        self._reload_lock = threading.Lock()
+        self._last_reload_errors: List[str] = []
 
         # Устанавливаем корень проекта надежным способом
         self.project_root = self._find_project_root(Path(__file__))
 
         # Получаем settings_manager для определения текущего пресета
         self.settings_manager = kwargs.get('settings_manager')
+        # plugins_manager (опционально) - сценарии читаются через его манифест без повторного парсинга
+        self.plugins_manager = kwargs.get('plugins_manager')
 
         # Загружаем сценарии и триггеры
         self._load_scenarios_and_triggers()
@@ -51,31 +92,93 @@ class ScenariosManager:
     def _load_scenarios_and_triggers(self):
         """Загрузка всех сценариев и триггеров из пресета"""
         self.logger.info("Загрузка сценариев и триггеров...")
-        self._cache.clear()
-        self._scenario_name_map.clear()
+        model, errors = self._build_model()
+        # При запуске предыдущей версии нет - ошибки только логируются
+        for error in errors:
+            self.logger.error(f"Ошибка конфигурации сценариев: {error}")
+        self._activate_model(model)
+        self.logger.info(f"Загружено сценариев: {len(model.scenarios)} (версия {model.version})")
 
+    def _build_model(self) -> Tuple[ScenariosModel, List[str]]:
+        """Читает пресет и строит новый снимок без его активации. Возвращает снимок и ошибки валидации"""
         # Определяем текущий пресет
         preset = self.settings_manager.get_current_preset()
 
         # Загружаем триггеры из пресета
         triggers = self._load_yaml_file(f'presets/{preset}/triggers.yaml')
-        self._cache['triggers'] = triggers
+        if not isinstance(triggers, dict):
+            raise ValueError(f"triggers.yaml пресета {preset} должен содержать словарь")
 
         # Загружаем сценарии из пресета
-        scenarios = self._load_scenarios_from_dir(f'presets/{preset}/scenarios')
-        self._cache['scenarios'] = scenarios
-        self.logger.info(f"Загружено сценариев: {len(scenarios)}")
+        name_map: Dict[str, str] = {}
+        scenarios = self._load_scenarios_from_dir(f'presets/{preset}/scenarios', name_map)
+        if self.plugins_manager:
+            self.plugins_manager.save_manifest()
+
+        version = self._model.version + 1 if self._model else 1
+        model = ScenariosModel(version, preset, scenarios, triggers, name_map)
+        return model, self._validate_model(model)
+
+    def _validate_model(self, model: ScenariosModel) -> List[str]:
+        """Проверяет структуру сценариев и ссылки триггеров на существующие сценарии"""
+        errors = []
+        for key, scenario in model.scenarios.items():
+            if not isinstance(scenario, dict):
+                errors.append(f"сценарий {key}: ожидается словарь")
+            elif not isinstance(scenario.get('actions', []), list):
+                errors.append(f"сценарий {key}: actions должен быть списком")
+
+        for path, scenario_name in self._iter_trigger_targets(dict(model.triggers), ()):
+            if scenario_name not in model.scenarios and scenario_name not in model.name_map:
+                errors.append(f"триггер {'.'.join(path)}: сценарий '{scenario_name}' не найден")
+        return errors
+
+    def _iter_trigger_targets(self, node: Any, path: Tuple[str, ...]):
+        """Обходит триггеры и возвращает (путь, имя сценария) для всех ссылок на сценарии"""
+        if isinstance(node, str):
+            yield path, node
+        elif isinstance(node, list):
+            for item in node:
+                yield from self._iter_trigger_targets(item, path)
+        elif isinstance(node, dict):
+            if 'scenario' in node:
+                if isinstance(node['scenario'], str):
+                    yield path, node['scenario']
+                return
+            for key, value in node.items():
+                yield from self._iter_trigger_targets(value, path + (str(key),))
+
+    def _build_indexes(self, model: ScenariosModel) -> List[str]:
+        """
+        Строит индексы всех подписчиков для еще не опубликованного снимка.
+        Возвращает ошибки построителей (при ошибках снимок не публикуется)
+        """
+        errors = []
+        indexes = {}
+        for name, builder in list(self._subscribers.items()):
+            try:
+                indexes[name] = builder(model)
+            except Exception as e:
+                errors.append(f"индекс {name}: {e}")
+        model.indexes = indexes
+        return errors
+
+    def _activate_model(self, model: ScenariosModel):
+        """
+        Публикует снимок со всеми индексами одним присваиванием ссылки:
+        читатели видят либо старую версию целиком, либо новую целиком
+        """
+        self._model = model
 
     def _load_yaml_file(self, relative_path: str) -> dict:
         """Загружает YAML файл по относительному пути от config_dir"""
         file_path = os.path.join(self.config_dir, relative_path)
         if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
+            return load_yaml(file_path, self.plugins_manager) or {}
         return {}
 
-    def _load_scenarios_from_dir(self, relative_dir: str) -> dict:
-        """Рекурсивно загружает сценарии из указанной директории и всех подпапок"""
+    def _load_scenarios_from_dir(self, relative_dir: str, name_map: Dict[str, str]) -> dict:
+        """Рекурсивно загружает сценарии из указанной директории и всех подпапок (заполняет name_map)"""
         scenarios = {}
         scenarios_dir = os.path.join(self.config_dir, relative_dir)
 
@@ -84,65 +187,111 @@ class ScenariosManager:
                 for filename in files:
                     if filename.endswith(('.yaml', '.yml')):
                         file_path = os.path.join(root, filename)
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            file_scenarios = yaml.safe_load(f) or {}
-                            # Получаем относительный путь от scenarios_dir до файла
-                            rel_path = os.path.relpath(file_path, scenarios_dir)
-                            # Удаляем расширение и заменяем разделители на точки
-                            file_prefix = rel_path.replace('\\', '/').replace('/', '.')
-                            if file_prefix.endswith('.yaml'):
-                                file_prefix = file_prefix[:-5]
-                            elif file_prefix.endswith('.yml'):
-                                file_prefix = file_prefix[:-4]
-                            for scenario_name, scenario_data in file_scenarios.items():
-                                full_key = f"{file_prefix}.{scenario_name}"
-                                scenarios[full_key] = scenario_data
-                                if scenario_name in self._scenario_name_map:
-                                    self.logger.warning(f"Дублирование названия сценария '{scenario_name}'. Используется первый найденный.")
-                                else:
-                                    self._scenario_name_map[scenario_name] = full_key
+                        file_scenarios = load_yaml(file_path, self.plugins_manager) or {}
+                        if not isinstance(file_scenarios, dict):
+                            raise ValueError(f"{file_path}: ожидается словарь сценариев")
+                        # Получаем относительный путь от scenarios_dir до файла
+                        rel_path = os.path.relpath(file_path, scenarios_dir)
+                        # Удаляем расширение и заменяем разделители на точки
+                        file_prefix = rel_path.replace('\\', '/').replace('/', '.')
+                        if file_prefix.endswith('.yaml'):
+                            file_prefix = file_prefix[:-5]
+                        elif file_prefix.endswith('.yml'):
+                            file_prefix = file_prefix[:-4]
+                        for scenario_name, scenario_data in file_scenarios.items():
+                            full_key = f"{file_prefix}.{scenario_name}"
+                            scenarios[full_key] = scenario_data
+                            if scenario_name in name_map:
+                                self.logger.warning(f"Дублирование названия сценария '{scenario_name}'. Используется первый найденный.")
+                            else:
+                                name_map[scenario_name] = full_key
         return scenarios
 
     # === Публичные методы ===
 
+    def get_model(self) -> ScenariosModel:
+        """Получить текущий неизменяемый снимок сценариев и триггеров"""
+        return self._model
+
+    def subscribe(self, name: str, builder: Callable[[ScenariosModel], Any]):
+        """
+        Подписка на производный индекс снимка: builder(model) возвращает индекс (не изменяя состояние подписчика),
+        индекс доступен через model.get_index(name). Строится сразу для текущего снимка и для каждой новой версии до ее публикации
+        """
+        with self._reload_lock:
+            self._subscribers[name] = builder
+            if self._model is not None:
+                # Новый ключ в опубликованном снимке: до этого момента индекс никто не читал
+                self._model.indexes[name] = builder(self._model)
+
+    def unsubscribe(self, name: str):
+        """Отписка от построения индекса"""
+        with self._reload_lock:
+            self._subscribers.pop(name, None)
+
     def get_scenario(self, key: str) -> Optional[dict]:
         """Получить оригинальный сценарий по полному или короткому ключу."""
-        # Сначала ищем по полному ключу
-        scenario = self._cache.get('scenarios', {}).get(key)
-        if scenario is not None:
-            return scenario
-        # Если не найдено — ищем по короткому имени
-        full_key = self._scenario_name_map.get(key)
-        if full_key:
-            return self._cache.get('scenarios', {}).get(full_key)
-        return None
+        return self._model.get_scenario(key)
 
     def get_all_scenarios(self) -> dict:
         """Получить все оригинальные сценарии"""
-        return self._cache.get('scenarios', {}).copy()
+        return dict(self._model.scenarios)
 
-    def get_triggers(self) -> dict:
-        """Получить триггеры"""
-        return self._cache.get('triggers', {})
+    def get_triggers(self) -> Mapping[str, Any]:
+        """Получить триггеры (только для чтения)"""
+        return self._model.triggers
 
     def get_scenario_key(self, name_or_key: str) -> Optional[str]:
         """Вернуть полное имя сценария (file.scenario) по короткому или полному имени. Если не найдено — None."""
-        if name_or_key in self._cache.get('scenarios', {}):
+        model = self._model
+        if name_or_key in model.scenarios:
             return name_or_key
-        full_key = self._scenario_name_map.get(name_or_key)
+        full_key = model.name_map.get(name_or_key)
         if full_key:
             return full_key
         return None
 
     def get_scenario_name(self, name_or_key: str) -> Optional[str]:
         """Вернуть короткое имя сценария по короткому или полному имени. Если не найдено — None."""
-        if name_or_key in self._scenario_name_map:
+        model = self._model
+        if name_or_key in model.name_map:
             return name_or_key
-        if name_or_key in self._cache.get('scenarios', {}):
+        if name_or_key in model.scenarios:
             return name_or_key.split('.')[-1]
         return None
 
-    def reload(self):
-        """Перезагрузить все сценарии и триггеры"""
-        self.logger.info("Перезагрузка сценариев и триггеров...")
-        self._load_scenarios_and_triggers() 
\ No newline at end of file
+    def get_watch_paths(self) -> List[str]:
+        """Файлы и папки текущего пресета, изменение которых требует перезагрузки"""
+        preset_dir = os.path.join(self.config_dir, 'presets', self._model.preset)
+        return [os.path.join(preset_dir, 'triggers.yaml'), os.path.join(preset_dir, 'scenarios')]
+
+    def get_last_reload_errors(self) -> List[str]:
+        """Ошибки последней неудачной перезагрузки (пустой список - последняя перезагрузка успешна)"""
+        return list(self._last_reload_errors)
+
+    def reload(self) -> bool:
+        """
+        Перезагрузить все сценарии и триггеры: новый снимок и индексы всех подписчиков строятся до публикации.
+        При ошибках чтения, валидации или построения любого индекса остается активной текущая версия. Потокобезопасен
+        """
+        with self._reload_lock:
+            self.logger.info("Перезагрузка сценариев и триггеров...")
+            try:
+                model, errors = self._build_model()
+            except Exception as e:
+                model, errors = None, [str(e)]
+
+            if not errors:
+                errors = self._build_indexes(model)
+
+            if errors:
+                self._last_reload_errors = errors
+                self.logger.error(
+                    f"Перезагрузка сценариев отклонена, остается версия {self._model.version}: " + "; ".join(errors)
+                )
+                return False
+
+            self._last_reload_errors = []
+            self._activate_model(model)
+            self.logger.info(f"Загружено сценариев: {len(model.scenarios)} (версия {model.version}), индексов: {len(model.indexes)}")
+            return True 
\ No newline at end of file
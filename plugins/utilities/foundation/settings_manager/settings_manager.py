@@ -1,11 +1,14 @@
 import datetime
 import os
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 from dotenv import load_dotenv
 
+# libyaml (C) загрузчик, если PyYAML собран с ним
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class SettingsManager:
     """Менеджер настроек бота и глобальных параметров"""
@@ -44,6 +47,13 @@ class SettingsManager:
         
         # Время запуска приложения (будем получать по требованию)
         self._startup_time = None
+        
+        # Программные переопределения настроек (инструменты, бенчмарки) - переживают reload()
+        self._overrides: Dict[str, Any] = {}
+        
+        # Роли процесса (None - все сервисы) и шард (индекс, количество) в многопроцессном режиме
+        self._roles: Optional[List[str]] = None
+        self._shard: Optional[Tuple[int, int]] = None
 
         # Устанавливаем корень проекта надежным способом
         self.project_root = self._find_project_root(Path(__file__))
@@ -97,6 +107,10 @@ class SettingsManager:
         # Мерджим: глобальные + пресет (пресет перекрывает глобальные)
         merged_settings = self._deep_merge(global_settings, preset_settings)
         
+        # Программные переопределения перекрывают всё
+        if self._overrides:
+            merged_settings = self._deep_merge(merged_settings, self._overrides)
+        
         # Обрабатываем переменные окружения в итоговых настройках
         self._cache['settings'] = self._resolve_env_variables(merged_settings)
 
@@ -118,7 +132,7 @@ class SettingsManager:
                 content = f.read()
                 # Обрабатываем переменные окружения
                 processed_content = self.resolve_env_variables(content)
-                return yaml.safe_load(processed_content) or {}
+                return yaml.load(processed_content, Loader=YAML_LOADER) or {}
         except Exception as e:
             self.logger.error(f"Ошибка загрузки файла {file_path}: {e}")
             return {}
@@ -330,6 +344,14 @@ class SettingsManager:
         # Обрабатываем переменные окружения в итоговых настройках
         return self._resolve_env_variables(merged)
 
+    def apply_overrides(self, overrides: Dict[str, Any]):
+        """Программно переопределяет секции настроек (приоритет выше settings.yaml и пресета)"""
+        self._overrides = self._deep_merge(self._overrides, overrides)
+        settings = self._cache.get('settings', {})
+        self._cache['settings'] = self._deep_merge(settings, self._resolve_env_variables(overrides))
+        # Переопределения могут менять включенность плагинов
+        self.invalidate_startup_cache()
+
     def reload(self):
         """Перезагрузить настройки бота и глобальные параметры"""
         self.logger.info("Перезагрузка настроек...")
@@ -358,12 +380,78 @@ class SettingsManager:
         tz = ZoneInfo(timezone_name)
         return datetime.datetime.now(tz).replace(tzinfo=None)
     
+    # === Роли процесса ===
+    
+    def set_role(self, role: Optional[str] = None, shard_index: Optional[int] = None, shard_count: Optional[int] = None):
+        """Задает роль процесса (несколько через запятую, None/'all' - все сервисы) и шард"""
+        self._roles = self._parse_roles(role)
+        self._shard = (shard_index, shard_count) if shard_index is not None and shard_count else None
+        self.logger.info(f"Роль процесса: {self.get_role()}" + (f", шард {shard_index + 1}/{shard_count}" if self._shard else ""))
+        self.invalidate_startup_cache()
+    
+    def get_role(self) -> str:
+        """Получить роль процесса ('all' если роль не задана)"""
+        return ','.join(self._roles) if self._roles else 'all'
+    
+    def get_shard(self) -> Optional[Tuple[int, int]]:
+        """Получить шард процесса (индекс, количество) или None"""
+        return self._shard
+    
+    def get_available_roles(self) -> List[str]:
+        """Получить список описанных ролей"""
+        return ['all'] + list(self._get_roles_config().keys())
+    
+    @staticmethod
+    def _parse_roles(role: Optional[str]) -> Optional[List[str]]:
+        """Разбирает строку ролей ('ingest,maintenance'), None - без ограничений"""
+        roles = [item.strip() for item in (role or '').split(',') if item.strip()]
+        return None if not roles or 'all' in roles else roles
+    
+    def _get_roles_config(self) -> Dict[str, List[str]]:
+        """Описание ролей из настроек settings_manager"""
+        return self.get_plugin_settings('settings_manager').get('roles') or {}
+    
+    def _get_role_services(self, roles: Optional[List[str]] = None) -> Optional[set]:
+        """Сервисы ролей (None - без ограничений). Элементы роли могут ссылаться на другие роли"""
+        roles = self._roles if roles is None else roles
+        if roles is None:
+            return None
+        
+        roles_config = self._get_roles_config()
+        services = set()
+        visited = set()
+        pending = list(roles)
+        while pending:
+            role = pending.pop()
+            if role in visited:
+                continue
+            visited.add(role)
+            if role not in roles_config:
+                self.logger.warning(f"Роль {role} не описана в settings_manager.roles")
+                continue
+            for item in roles_config.get(role) or []:
+                if item in roles_config:
+                    pending.append(item)
+                else:
+                    services.add(item)
+        return services
+    
     # === Методы планирования запуска ===
     
-    def get_startup_plan(self) -> Dict[str, Any]:
-        """Получает полный план запуска приложения с кэшированием"""
+    def get_startup_plan(self, role: Optional[str] = None) -> Dict[str, Any]:
+        """Получает полный план запуска приложения с кэшированием (role - план для другой роли, без кэша)"""
         self.logger.info("Запрос плана запуска...")
         
+        roles = self._parse_roles(role) if role is not None else self._roles
+        if roles != self._roles:
+            # План для роли, отличной от роли процесса (например, для инструментов и проверки конфигурации)
+            current_roles = self._roles
+            self._roles = roles
+            try:
+                return self._build_startup_plan()
+            finally:
+                self._roles = current_roles
+        
         try:
             # Проверяем инициализацию кэша
             if not hasattr(self, '_cache') or self._cache is None:
@@ -449,6 +537,7 @@ class SettingsManager:
         dependency_order = self._calculate_dependency_order(required_utilities)
         
         plan = {
+            'role': self.get_role(),
             'enabled_services': enabled_services,
             'required_utilities': required_utilities,
             'dependency_order': dependency_order,
@@ -456,7 +545,7 @@ class SettingsManager:
             'total_utilities': len(required_utilities)
         }
         
-        self.logger.info(f"План запуска: {plan['total_services']} сервисов, {plan['total_utilities']} утилит")
+        self.logger.info(f"План запуска (роль {plan['role']}): {plan['total_services']} сервисов, {plan['total_utilities']} утилит")
         
         return plan
     
@@ -468,17 +557,20 @@ class SettingsManager:
             self.logger.warning("Не найдено сервисов в PluginsManager")
             return []
         
-        # Первый проход: проверяем базовые условия (существование и включенность)
+        # Первый проход: проверяем базовые условия (существование, включенность и роль процесса)
+        role_services = self._get_role_services()
         candidate_services = []
         for service_name in services_info.keys():
             # Получаем объединенные настройки (глобальные + локальные)
             plugin_settings = self.get_plugin_settings(service_name)
             enabled_status = plugin_settings.get('enabled', True)
             
-            if enabled_status:
-                candidate_services.append(service_name)
-            else:
+            if not enabled_status:
                 self.logger.info(f"Сервис {service_name} отключен (глобальные или локальные настройки)")
+            elif role_services is not None and service_name not in role_services:
+                self.logger.info(f"Сервис {service_name} не входит в роль {self.get_role()}")
+            else:
+                candidate_services.append(service_name)
         
         # Второй проход: проверяем возможность запуска (все зависимости доступны)
         can_start_services = []
@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+# Пустой контекст для событий без трассировки
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    """Контекстный менеджер замера одной стадии трассы"""
+
+    __slots__ = ('tracer', 'trace_id', 'stage', 'start')
+
+    def __init__(self, tracer, trace_id: str, stage: str):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record_span(self.trace_id, self.stage, self.start)
+        return False
+
+
+class EventTracer:
+    """
+    Трассировка событий по correlation id: время каждой стадии от получения апдейта до ответа Bot API.
+    Считает перцентили по стадиям и экспортирует сэмплированные трассы в Chrome trace-event JSON.
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+        self.metrics_collector = kwargs.get('metrics_collector')
+
+        # Получаем настройки через settings_manager
+        settings = self.settings_manager.get_plugin_settings('event_tracer')
+        self.enabled = settings.get('tracing_enabled', False)
+        self.sample_rate = settings.get('sample_rate', 0.01)
+        self.max_sampled_traces = settings.get('max_sampled_traces', 500)
+        self.max_active_traces = settings.get('max_active_traces', 10000)
+        self.percentile_window = settings.get('percentile_window', 10000)
+        self.export_path = settings.get('export_path', 'data/traces')
+
+        # trace_id -> время начала трассы (для сквозной латентности)
+        self._trace_starts: OrderedDict = OrderedDict()
+        # action_id -> время постановки действия в очередь
+        self._enqueued: OrderedDict = OrderedDict()
+        # trace_id -> список стадий (только сэмплированные трассы)
+        self._sampled: OrderedDict = OrderedDict()
+        # стадия -> последние длительности (секунды)
+        self._durations: Dict[str, deque] = {}
+
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            self.logger.info(f"трассировка событий включена (sample_rate={self.sample_rate})")
+
+    # === Запись трасс ===
+
+    def start_trace(self, started_at: Optional[float] = None) -> Optional[str]:
+        """Создает correlation id для нового события (None если трассировка отключена)"""
+        if not self.enabled:
+            return None
+
+        trace_id = uuid.uuid4().hex[:16]
+        started_at = started_at or time.time()
+
+        with self._lock:
+            self._trace_starts[trace_id] = started_at
+            if len(self._trace_starts) > self.max_active_traces:
+                self._trace_starts.popitem(last=False)
+
+            if random.random() < self.sample_rate:
+                self._sampled[trace_id] = []
+                if len(self._sampled) > self.max_sampled_traces:
+                    self._sampled.popitem(last=False)
+
+        return trace_id
+
+    def span(self, trace_id: Optional[str], stage: str):
+        """Контекстный менеджер замера стадии"""
+        if not trace_id:
+            return _NULL_SPAN
+        return _Span(self, trace_id, stage)
+
+    def record_span(self, trace_id: Optional[str], stage: str, start: float, end: Optional[float] = None):
+        """Записывает стадию трассы по временам начала и конца (time.time())"""
+        if not trace_id or not self.enabled:
+            return
+
+        end = end or time.time()
+        duration = max(end - start, 0.0)
+
+        with self._lock:
+            durations = self._durations.get(stage)
+            if durations is None:
+                durations = deque(maxlen=self.percentile_window)
+                self._durations[stage] = durations
+            durations.append(duration)
+
+            spans = self._sampled.get(trace_id)
+            if spans is not None:
+                spans.append((stage, start, duration))
+
+        if self.metrics_collector:
+            self.metrics_collector.observe('stage_seconds', duration, stage=stage)
+
+    def mark_enqueued(self, trace_id: Optional[str], action_id: int):
+        """Запоминает время постановки действия в очередь"""
+        if not trace_id or not action_id:
+            return
+        with self._lock:
+            self._enqueued[action_id] = time.time()
+            if len(self._enqueued) > self.max_active_traces:
+                self._enqueued.popitem(last=False)
+
+    def record_dequeued(self, trace_id: Optional[str], action_id: int):
+        """Записывает ожидание действия в очереди (от вставки до взятия в обработку)"""
+        if not trace_id:
+            return
+        with self._lock:
+            enqueued_at = self._enqueued.pop(action_id, None)
+        if enqueued_at is not None:
+            self.record_span(trace_id, 'queue_wait', enqueued_at)
+
+    def finish(self, trace_id: Optional[str], stage: str = 'end_to_end'):
+        """
+        Записывает сквозную длительность от начала трассы до текущего момента.
+        Идемпотентен: у события с несколькими действиями учитывается только первое завершение
+        """
+        if not trace_id:
+            return
+        with self._lock:
+            started_at = self._trace_starts.pop(trace_id, None)
+        if started_at is not None:
+            self.record_span(trace_id, stage, started_at)
+
+    # === Отчеты ===
+
+    def get_stage_percentiles(self, percentiles: Optional[List[float]] = None) -> Dict[str, Dict[str, float]]:
+        """Возвращает перцентили длительности (мс) по каждой стадии"""
+        percentiles = percentiles or [50, 90, 99]
+        with self._lock:
+            snapshot = {stage: sorted(values) for stage, values in self._durations.items()}
+
+        result = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            stats = {'count': len(values)}
+            for p in percentiles:
+                index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+                stats[f"p{p:g}"] = round(values[index] * 1000, 3)
+            stats['max'] = round(values[-1] * 1000, 3)
+            result[stage] = stats
+        return result
+
+    def get_chrome_trace(self) -> Dict[str, Any]:
+        """Формирует сэмплированные трассы в формате Chrome trace-event (chrome://tracing, Perfetto)"""
+        with self._lock:
+            sampled = [(trace_id, list(spans)) for trace_id, spans in self._sampled.items() if spans]
+
+        events = []
+        for tid, (trace_id, spans) in enumerate(sampled, start=1):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': trace_id}})
+            for stage, start, duration in spans:
+                events.append({
+                    'name': stage,
+                    'cat': 'event',
+                    'ph': 'X',
+                    'ts': int(start * 1_000_000),
+                    'dur': max(int(duration * 1_000_000), 1),
+                    'pid': 1,
+                    'tid': tid,
+                    'args': {'trace_id': trace_id},
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, file_path: Optional[str] = None) -> Optional[str]:
+        """Сохраняет сэмплированные трассы в JSON файл и возвращает путь к нему"""
+        try:
+            if not file_path:
+                os.makedirs(self.export_path, exist_ok=True)
+                file_path = os.path.join(self.export_path, f"trace_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(self.get_chrome_trace(), f, ensure_ascii=False)
+
+            self.logger.info(f"трассы экспортированы: {file_path}")
+            return file_path
+        except Exception as e:
+            self.logger.error(f"Ошибка экспорта трасс: {e}")
+            return None
@@ -1,8 +1,23 @@
 import hashlib
+import itertools
 import os
 import time
 from typing import Dict, Any
 
+# Быстрый некриптографический хэш содержимого (если установлен)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+    xxhash = None
+
+# Размер блока потокового хэширования файлов
+FILE_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Счетчик имен файлов процесса: next() у itertools.count атомарен, безопасен из потоков
+_filename_counter = itertools.count()
+
 class HashManager:
     """
     Утилита для генерации хэшей из атрибутов и файлов.
@@ -61,6 +76,34 @@ class HashManager:
             self.logger.error(f"Ошибка универсальной генерации хэша: {e}")
             raise
 
+    def generate_content_hash(self, file_path: str, chunk_size: int = FILE_HASH_CHUNK_SIZE) -> str:
+        """
+        Потоковый хэш содержимого файла: xxh3_128 (если установлен xxhash) или blake2b.
+        Файл читается блоками, общего состояния нет - можно вызывать из пула потоков.
+        Возвращает строку "<алгоритм>:<hex>", чтобы хэши разных алгоритмов не совпадали
+        """
+        try:
+            if XXHASH_AVAILABLE:
+                algorithm, digest = 'xxh3_128', xxhash.xxh3_128()
+            else:
+                algorithm, digest = 'blake2b', hashlib.blake2b(digest_size=20)
+            
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+            return f"{algorithm}:{digest.hexdigest()}"
+            
+        except Exception as e:
+            self.logger.error(f"Ошибка хэширования содержимого файла {file_path}: {e}")
+            raise
+
+    def _generate_unique_id(self) -> str:
+        """
+        Внутренний метод: id, уникальный среди потоков и одновременно работающих процессов -
+        pid фиксированной ширины + монотонный счетчик процесса
+        """
+        return f"{os.getpid():06x}{next(_filename_counter):x}"
+
     def _generate_timestamp_code(self, length: int = 8) -> str:
         """
         Внутренний метод: генерирует timestamp-код заданной длины на основе миллисекунд
@@ -73,17 +116,19 @@ class HashManager:
             self.logger.error(f"Ошибка генерации timestamp-кода: {e}")
             raise
 
-    def generate_filename(self, prefix: str, extension: str = None, code_length: int = 8) -> str:
+    def generate_filename(self, prefix: str, extension: str = None, code_length: int = 8, content_hash: str = None) -> str:
         """
-        Генерирует уникальное имя файла в формате <prefix>-<code1>-<code2>.<extension>
+        Генерирует уникальное имя файла в формате <prefix>-<code1>-<code2>-<id>[-<hash>].<extension>
         
         Args:
             prefix: Префикс имени файла (например, голос)
             extension: Расширение файла (mp3, opus, wav и т.д.)
             code_length: Длина кода (по умолчанию 8 для формата 4-4)
+            content_hash: Хэш содержимого (generate_content_hash), добавляется в имя (опционально)
         
         Returns:
-            Имя файла в формате prefix-code1-code2.extension или prefix-code1-code2
+            Имя файла в формате prefix-code1-code2-id[-hash].extension или без расширения.
+            code - метка времени, id - pid и счетчик процесса: имена не совпадают даже в одну миллисекунду
         """
         try:
             # Генерируем timestamp-код
@@ -101,6 +146,11 @@ class HashManager:
                 code2 = code[mid:]
                 formatted_code = f"{code1}-{code2}"
             
+            # Уникальная часть (и короткий хэш содержимого, если передан)
+            formatted_code = f"{formatted_code}-{self._generate_unique_id()}"
+            if content_hash:
+                formatted_code = f"{formatted_code}-{content_hash.split(':')[-1][:16]}"
+            
             # Формируем имя файла
             if extension:
                 filename = f"{prefix}-{formatted_code}.{extension}"
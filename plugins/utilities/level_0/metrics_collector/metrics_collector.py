@@ -0,0 +1,190 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+# Пустой контекст для таймера при отключенных метриках (без аллокаций на каждый вызов)
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    """Контекстный менеджер замера длительности блока в гистограмму"""
+
+    __slots__ = ('collector', 'name', 'labels', 'start')
+
+    def __init__(self, collector, name: str, labels: Dict[str, Any]):
+        self.collector = collector
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.collector.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsCollector:
+    """
+    Сборщик runtime метрик: счетчики, gauge и гистограммы с метками.
+    При отключенном сборе все методы возвращаются сразу, без блокировок и аллокаций.
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+
+        # Получаем настройки через settings_manager
+        settings = self.settings_manager.get_plugin_settings('metrics_collector')
+        self.enabled = settings.get('metrics_enabled', False)
+        self.prefix = settings.get('prefix', 'coreness')
+        self.buckets = tuple(sorted(settings.get('histogram_buckets') or [
+            0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+        ]))
+
+        # Хранилища: имя метрики -> {метки: значение}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Dict[Tuple, float]] = {}
+        # Гистограмма: [счетчики по бакетам (не кумулятивные) + +Inf, сумма, количество]
+        self._histograms: Dict[str, Dict[Tuple, List]] = {}
+
+        # Метрики могут обновляться из пула потоков (файлы, БД)
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            self.logger.info(f"сбор метрик включен (prefix={self.prefix}, buckets={len(self.buckets)})")
+
+    # === Запись метрик ===
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличивает счетчик"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Устанавливает значение gauge"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def add_gauge(self, name: str, value: float = 1, **labels):
+        """Изменяет значение gauge на величину (может быть отрицательной)"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items())) if labels else ()
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавляет наблюдение в гистограмму"""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items())) if labels else ()
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                series[key] = hist
+            hist[0][index] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def timer(self, name: str, **labels):
+        """Контекстный менеджер замера длительности блока (в секундах)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    # === Чтение метрик ===
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Возвращает копию всех метрик в виде словаря"""
+        with self._lock:
+            return {
+                'counters': {name: {self._format_labels(k): v for k, v in series.items()} for name, series in self._counters.items()},
+                'gauges': {name: {self._format_labels(k): v for k, v in series.items()} for name, series in self._gauges.items()},
+                'histograms': {
+                    name: {
+                        self._format_labels(k): {'buckets': list(h[0]), 'sum': h[1], 'count': h[2]}
+                        for k, h in series.items()
+                    }
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Формирует текст метрик в формате Prometheus text exposition 0.0.4"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full_name = self._full_name(name)
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in self._counters[name].items():
+                    lines.append(f"{full_name}{self._format_labels(key)} {self._format_value(value)}")
+
+            for name in sorted(self._gauges):
+                full_name = self._full_name(name)
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in self._gauges[name].items():
+                    lines.append(f"{full_name}{self._format_labels(key)} {self._format_value(value)}")
+
+            for name in sorted(self._histograms):
+                full_name = self._full_name(name)
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, (counts, total, count) in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', self._format_value(bound)))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{full_name}_sum{self._format_labels(key)} {self._format_value(total)}")
+                    lines.append(f"{full_name}_count{self._format_labels(key)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Сбрасывает все накопленные метрики"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    # === Форматирование ===
+
+    def _full_name(self, name: str) -> str:
+        """Добавляет префикс к имени метрики"""
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    @staticmethod
+    def _format_labels(key: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        """Форматирует метки в вид {a="1",b="2"}"""
+        items = list(key)
+        if extra:
+            items.append(extra)
+        if not items:
+            return ""
+        parts = []
+        for label, value in items:
+            escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+            parts.append(f'{label}="{escaped}"')
+        return "{" + ",".join(parts) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        """Форматирует числовое значение без лишних нулей"""
+        if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+            return str(int(value))
+        return repr(float(value))
@@ -0,0 +1,34 @@
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class QueueConfig:
+    """Параметры очереди задач"""
+
+    def __init__(self, name: str, max_concurrent: int = 10, priority: int = 2,
+                 max_size: int = 1000, timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.priority = priority
+        self.max_size = max_size
+        self.timeout = timeout
+
+
+class QueueManager:
+    """Очереди задач: конфигурация, семафоры конкурентности, ожидающие задачи и счетчики"""
+
+    def __init__(self, queue_configs: Dict[str, QueueConfig]):
+        self.queue_configs = queue_configs
+        self.semaphores = {name: asyncio.Semaphore(config.max_concurrent) for name, config in queue_configs.items()}
+        self.pending: Dict[str, deque] = {name: deque() for name in queue_configs}
+        self.active: Dict[str, int] = {name: 0 for name in queue_configs}
+        self.stats: Dict[str, Dict[str, float]] = {
+            name: {'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0,
+                   'cancelled': 0, 'rejected': 0, 'wait_time_total': 0.0, 'started': 0}
+            for name in queue_configs
+        }
+
+    def by_priority(self) -> List[str]:
+        """Имена очередей от высокого приоритета к низкому"""
+        return sorted(self.queue_configs, key=lambda name: self.queue_configs[name].priority)
@@ -0,0 +1,290 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from .queue_manager import QueueConfig, QueueManager
+
+# Очереди по умолчанию: меньшее значение priority - выше приоритет
+DEFAULT_QUEUES = {
+    'critical': {'max_concurrent': 50, 'priority': 0, 'max_size': 1000},
+    'high': {'max_concurrent': 100, 'priority': 1, 'max_size': 5000},
+    'medium': {'max_concurrent': 50, 'priority': 2, 'max_size': 5000},
+    'low': {'max_concurrent': 20, 'priority': 3, 'max_size': 10000},
+    'heavy': {'max_concurrent': 4, 'priority': 4, 'max_size': 1000, 'timeout': 3600},
+}
+
+# Снижение общего лимита при нагрузке CPU: порог (%) -> доля default_total_limit
+DEFAULT_LOAD_LEVELS = [
+    {'threshold': 70.0, 'limit_factor': 0.75},
+    {'threshold': 85.0, 'limit_factor': 0.5},
+    {'threshold': 95.0, 'limit_factor': 0.25},
+]
+
+
+class TaskManager:
+    """
+    Выполнение фоновой работы сервисов в именованных очередях с лимитом конкурентности,
+    приоритетом, ограниченной очередью ожидания и общим лимитом задач процесса.
+    """
+
+    def __init__(self, **kwargs):
+        self.logger = kwargs['logger']
+        self.settings_manager = kwargs['settings_manager']
+        self.metrics_collector = kwargs.get('metrics_collector')
+
+        # Получаем настройки через settings_manager
+        settings = self.settings_manager.get_plugin_settings('task_manager')
+        self.default_total_limit = settings.get('total_limit', 500)
+        self.current_total_limit = self.default_total_limit
+        self.default_queue = settings.get('default_queue', 'medium')
+        self.monitoring_enabled = settings.get('monitoring_enabled', False)
+        self.monitoring_interval = settings.get('monitoring_interval', 5.0)
+        self.load_levels = sorted(settings.get('load_levels') or DEFAULT_LOAD_LEVELS, key=lambda level: level['threshold'])
+
+        queues = settings.get('queues') or DEFAULT_QUEUES
+        self.queue_manager = QueueManager({name: QueueConfig(name, **params) for name, params in queues.items()})
+        if self.default_queue not in self.queue_manager.queue_configs:
+            self.default_queue = self.queue_manager.by_priority()[-1]
+
+        if self.monitoring_enabled and not PSUTIL_AVAILABLE:
+            self.logger.warning("psutil не установлен, мониторинг нагрузки отключен")
+            self.monitoring_enabled = False
+
+        self._active_total = 0
+        self._tasks = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._closed = False
+
+    # === Постановка задач ===
+
+    async def submit_task(self, task_id: str, coro: Any, queue_name: Optional[str] = None) -> bool:
+        """
+        Ставит задачу в очередь без ожидания результата.
+        coro - корутина или callable, возвращающий awaitable (вызывается при старте задачи).
+        Возвращает False, если очередь неизвестна или переполнена.
+        """
+        return self._enqueue(task_id, coro, queue_name, with_result=False) is not None
+
+    async def execute(self, coro: Any, queue_name: Optional[str] = None, task_id: Optional[str] = None) -> Any:
+        """Выполняет задачу в очереди и возвращает ее результат (ожидает свободный слот, без лимита очереди ожидания)"""
+        future = self._enqueue(task_id or f"{queue_name or self.default_queue}-task", coro, queue_name, with_result=True)
+        if future is None:
+            raise ValueError(f"Очередь задач недоступна: {queue_name}")
+        return await future
+
+    def _enqueue(self, task_id: str, coro: Any, queue_name: Optional[str], with_result: bool) -> Optional[Any]:
+        name = queue_name or self.default_queue
+        config = self.queue_manager.queue_configs.get(name)
+        if self._closed or not config:
+            if not self._closed:
+                self.logger.error(f"неизвестная очередь задач: {name}")
+            self._close_coro(coro)
+            return None
+
+        pending = self.queue_manager.pending[name]
+        stats = self.queue_manager.stats[name]
+        # Ограничение очереди ожидания - только для задач без ожидания результата
+        if not with_result and config.max_size and len(pending) >= config.max_size:
+            stats['rejected'] += 1
+            if self.metrics_collector:
+                self.metrics_collector.inc('tasks_total', queue=name, status='rejected')
+            self.logger.warning(f"очередь задач {name} переполнена ({config.max_size}), задача {task_id} отклонена")
+            self._close_coro(coro)
+            return None
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future() if with_result else None
+        pending.append((task_id, coro, future, time.monotonic()))
+        stats['submitted'] += 1
+        self._wakeup.set()
+        return future if with_result else True
+
+    # === Диспетчер ===
+
+    def _ensure_started(self):
+        """Запускает диспетчер (и мониторинг нагрузки) в текущем event loop при первой задаче"""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop(), name='task_manager_dispatcher')
+        if self.monitoring_enabled and (self._monitor is None or self._monitor.done()):
+            self._monitor = asyncio.create_task(self._monitor_loop(), name='task_manager_monitor')
+
+    async def _dispatch_loop(self):
+        """Запускает ожидающие задачи: строго по приоритету очередей в пределах лимитов"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            started = True
+            while started and self._active_total < self.current_total_limit:
+                started = False
+                for name in self.queue_manager.by_priority():
+                    pending = self.queue_manager.pending[name]
+                    # Семафор берем из словаря каждый раз - лимит очереди можно поменять на лету
+                    semaphore = self.queue_manager.semaphores[name]
+                    if not pending or semaphore.locked():
+                        continue
+
+                    item = pending.popleft()
+                    future = item[2]
+                    if future is not None and future.done():
+                        # Вызывающий код уже отменил ожидание
+                        self._close_coro(item[1])
+                    else:
+                        await semaphore.acquire()
+                        self._start(name, item, semaphore)
+                    started = True
+                    break
+
+            self._update_gauges()
+
+    def _start(self, name: str, item: tuple, semaphore: asyncio.Semaphore):
+        task_id, coro, future, enqueued_at = item
+        stats = self.queue_manager.stats[name]
+        wait_time = time.monotonic() - enqueued_at
+        stats['wait_time_total'] += wait_time
+        stats['started'] += 1
+        if self.metrics_collector:
+            self.metrics_collector.observe('task_queue_wait_seconds', wait_time, queue=name)
+
+        self.queue_manager.active[name] += 1
+        self._active_total += 1
+
+        task = asyncio.create_task(self._run_task(name, coro), name=str(task_id))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._on_task_done(name, done, future, semaphore))
+        if future is not None:
+            future.add_done_callback(lambda result: task.cancel() if result.cancelled() else None)
+
+    async def _run_task(self, name: str, coro: Any) -> Any:
+        awaitable = coro() if callable(coro) else coro
+        if not inspect.isawaitable(awaitable):
+            return awaitable
+        timeout = self.queue_manager.queue_configs[name].timeout
+        if timeout:
+            return await asyncio.wait_for(awaitable, timeout)
+        return await awaitable
+
+    def _on_task_done(self, name: str, task: asyncio.Task, future: Optional[asyncio.Future], semaphore: asyncio.Semaphore):
+        self._tasks.discard(task)
+        semaphore.release()
+        self.queue_manager.active[name] -= 1
+        self._active_total -= 1
+        stats = self.queue_manager.stats[name]
+
+        if task.cancelled():
+            status = 'cancelled'
+            if future is not None and not future.done():
+                future.cancel()
+        else:
+            error = task.exception()
+            if error is None:
+                status = 'completed'
+                if future is not None and not future.done():
+                    future.set_result(task.result())
+            else:
+                status = 'timeouts' if isinstance(error, asyncio.TimeoutError) else 'failed'
+                if future is not None:
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    self.logger.error(f"задача {task.get_name()} (очередь {name}) завершилась с ошибкой: {error!r}")
+
+        stats[status] += 1
+        if self.metrics_collector:
+            self.metrics_collector.inc('tasks_total', queue=name, status=status)
+
+        if self._wakeup and not self._closed:
+            self._wakeup.set()
+
+    def _update_gauges(self):
+        if not self.metrics_collector:
+            return
+        for name, pending in self.queue_manager.pending.items():
+            self.metrics_collector.set_gauge('task_queue_size', len(pending), queue=name)
+            self.metrics_collector.set_gauge('task_queue_active', self.queue_manager.active[name], queue=name)
+
+    async def _monitor_loop(self):
+        """Снижает общий лимит задач при высокой нагрузке CPU и возвращает его после спада"""
+        psutil.cpu_percent(None)
+        while True:
+            await asyncio.sleep(self.monitoring_interval)
+            if not self.monitoring_enabled:
+                continue
+
+            cpu = psutil.cpu_percent(None)
+            factor = 1.0
+            for level in self.load_levels:
+                if cpu >= level['threshold']:
+                    factor = level['limit_factor']
+
+            new_limit = max(1, int(self.default_total_limit * factor))
+            if new_limit != self.current_total_limit:
+                self.logger.info(f"CPU {cpu:.0f}%: общий лимит задач {self.current_total_limit} -> {new_limit}")
+                self.current_total_limit = new_limit
+                self._wakeup.set()
+
+    # === Состояние и завершение ===
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика: активные задачи и размеры очередей ожидания по очередям, лимиты и счетчики"""
+        queues = {}
+        for name, config in self.queue_manager.queue_configs.items():
+            stats = self.queue_manager.stats[name]
+            started = stats['started']
+            queues[name] = {
+                'priority': config.priority,
+                'max_concurrent': config.max_concurrent,
+                'max_size': config.max_size,
+                'submitted': stats['submitted'],
+                'completed': stats['completed'],
+                'failed': stats['failed'],
+                'timeouts': stats['timeouts'],
+                'cancelled': stats['cancelled'],
+                'rejected': stats['rejected'],
+                'avg_wait_ms': round(stats['wait_time_total'] / started * 1000, 2) if started else 0.0,
+            }
+        return {
+            'active_tasks': dict(self.queue_manager.active),
+            'queue_sizes': {name: len(pending) for name, pending in self.queue_manager.pending.items()},
+            'system_limit': self.current_total_limit,
+            'default_limit': self.default_total_limit,
+            'active_total': self._active_total,
+            'queues': queues,
+        }
+
+    def shutdown(self) -> List[asyncio.Task]:
+        """Отменяет ожидающие и выполняющиеся задачи. Возвращает отмененные asyncio задачи (для ожидания)"""
+        self._closed = True
+        for pending in self.queue_manager.pending.values():
+            while pending:
+                _, coro, future, _ = pending.popleft()
+                self._close_coro(coro)
+                if future is not None and not future.done():
+                    future.cancel()
+
+        tasks = list(self._tasks) + [task for task in (self._dispatcher, self._monitor) if task]
+        for task in tasks:
+            try:
+                task.cancel()
+            except RuntimeError:
+                # Event loop уже закрыт
+                pass
+        if self._tasks:
+            self.logger.info(f"отменено выполняющихся задач: {len(self._tasks)}")
+        return tasks
+
+    @staticmethod
+    def _close_coro(coro: Any):
+        """Закрывает не запущенную корутину (без предупреждения 'was never awaited')"""
+        if inspect.iscoroutine(coro):
+            coro.close()
@@ -1,6 +1,8 @@
 from typing import Optional
 
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 
 class TgBotInitializer:
@@ -14,6 +16,7 @@ class TgBotInitializer:
         self.settings_manager = kwargs['settings_manager']
         self._bot: Optional[Bot] = None
         self._token: Optional[str] = None
+        self._api_base_url: Optional[str] = None
         
         # Получаем токен через settings_manager
         self._load_token()
@@ -33,6 +36,12 @@ class TgBotInitializer:
                 self.logger.info("✅ Токен бота загружен из настроек")
             else:
                 self.logger.warning("⚠️ Токен бота не установлен в настройках")
+            
+            # Кастомный адрес Bot API (локальный Bot API сервер или фейковый сервер для нагрузочных тестов)
+            api_base_url = (settings.get('api_base_url') or '').strip().rstrip('/')
+            if api_base_url:
+                self._api_base_url = api_base_url
+                self.logger.info(f"ℹ️ Используется кастомный адрес Bot API: {api_base_url}")
                 
         except Exception as e:
             self.logger.error(f"❌ Ошибка загрузки токена: {e}")
@@ -54,7 +63,11 @@ class TgBotInitializer:
         # Создаем бота только один раз (singleton поведение)
         if self._bot is None:
             self.logger.info("TgBotInitializer: инициализация Telegram бота...")
-            self._bot = Bot(token=self._token)
+            if self._api_base_url:
+                session = AiohttpSession(api=TelegramAPIServer.from_base(self._api_base_url))
+                self._bot = Bot(token=self._token, session=session)
+            else:
+                self._bot = Bot(token=self._token)
             self.logger.info("TgBotInitializer: бот успешно инициализирован")
         
         return self._bot
@@ -1,7 +1,25 @@
+import base64
 import datetime
 import json
+import zlib
 from typing import Any, Dict, List, Optional, Union
 
+# Опциональный импорт zstd (быстрее и плотнее zlib)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+# Заголовок сжатого значения колонки: байт-маркер + код алгоритма
+COMPRESSED_MARKER = "\x1f"
+COMPRESSION_CODES = {'zlib': 'Z', 'zstd': 'S'}
+
+# Префиксы для bytes: base64 (текущий) и hex (старые записи)
+BYTES_B64_PREFIX = "base64:"
+BYTES_HEX_PREFIX = "bytes:"
+
 
 class DataConverter:
     """
@@ -26,9 +44,83 @@ class DataConverter:
         self.max_recursion_depth = settings.get('max_recursion_depth', 100)
         self.safe_mode = settings.get('safe_mode', True)
         
+        # Настройки сжатия крупных колонок
+        self.compression_enabled = settings.get('compression_enabled', True)
+        self.compression_threshold = settings.get('compression_threshold', 1024)
+        self.compression_level = settings.get('compression_level', 3)
+        self.compressed_fields = set(settings.get('compressed_fields', []) or [])
+        self.compression_algorithm = self._resolve_compression_algorithm(
+            settings.get('compression_algorithm', 'auto')
+        )
+        
         # Для предотвращения циклических ссылок
         self._processed_objects = set()
     
+    # === Сжатие колонок ===
+    
+    def _resolve_compression_algorithm(self, algorithm: str) -> str:
+        """Определяет алгоритм сжатия с учетом установленных библиотек"""
+        if algorithm in ('auto', 'zstd'):
+            if ZSTD_AVAILABLE:
+                return 'zstd'
+            if algorithm == 'zstd':
+                self.logger.warning("zstandard не установлен, для сжатия колонок используется zlib")
+        return 'zlib'
+    
+    def is_compressed(self, value) -> bool:
+        """Проверяет, является ли значение сжатой колонкой"""
+        return isinstance(value, str) and value.startswith(COMPRESSED_MARKER)
+    
+    def compress_field(self, field_name: str, value: Any) -> Any:
+        """Сжимает строковое значение колонки, если поле выбрано для сжатия и превышает порог"""
+        if not self.compression_enabled or field_name not in self.compressed_fields:
+            return value
+        if not isinstance(value, str) or self.is_compressed(value):
+            return value
+        
+        raw = value.encode('utf-8')
+        if len(raw) < self.compression_threshold:
+            return value
+        
+        try:
+            if self.compression_algorithm == 'zstd':
+                packed = zstandard.ZstdCompressor(level=self.compression_level).compress(raw)
+            else:
+                packed = zlib.compress(raw, min(self.compression_level, 9))
+            
+            encoded = COMPRESSED_MARKER + COMPRESSION_CODES[self.compression_algorithm] + base64.b64encode(packed).decode('ascii')
+            
+            # Сжатие невыгодно - оставляем исходное значение
+            if len(encoded) >= len(value):
+                return value
+            return encoded
+        except Exception as e:
+            self.logger.warning(f"Ошибка сжатия поля {field_name}: {e}")
+            return value
+    
+    def decompress_field(self, value: Any) -> Any:
+        """Распаковывает сжатое значение колонки (несжатые значения возвращаются как есть)"""
+        if not self.is_compressed(value):
+            return value
+        
+        code = value[1:2]
+        try:
+            packed = base64.b64decode(value[2:])
+            if code == COMPRESSION_CODES['zstd']:
+                if not ZSTD_AVAILABLE:
+                    self.logger.error("Колонка сжата zstd, но zstandard не установлен")
+                    return value
+                raw = zstandard.ZstdDecompressor().decompress(packed)
+            elif code == COMPRESSION_CODES['zlib']:
+                raw = zlib.decompress(packed)
+            else:
+                self.logger.warning(f"Неизвестный алгоритм сжатия колонки: {code!r}")
+                return value
+            return raw.decode('utf-8')
+        except Exception as e:
+            self.logger.warning(f"Ошибка распаковки колонки: {e}")
+            return value
+    
     # === ORM Конвертация ===
     
     def is_json_field(self, value) -> bool:
@@ -58,6 +150,11 @@ class DataConverter:
         
         # Декодируем JSON поля и восстанавливаем bytes
         for field_name, field_value in item.items():
+            # Распаковываем сжатые колонки до декодирования JSON
+            if self.is_compressed(field_value):
+                field_value = self.decompress_field(field_value)
+                item[field_name] = field_value
+            
             should_decode = False
             
             # Если указан список полей - проверяем его
@@ -80,21 +177,31 @@ class DataConverter:
                     else:
                         self.logger.warning(error_msg)
             
-            # Восстанавливаем bytes из hex строки (для не-JSON полей)
-            if isinstance(field_value, str) and field_value.startswith("bytes:"):
+            # Восстанавливаем bytes из base64/hex строки (для не-JSON полей)
+            if self._is_bytes_string(field_value):
                 try:
-                    hex_data = field_value[6:]  # убираем "bytes:"
-                    restored_bytes = bytes.fromhex(hex_data)
-                    item[field_name] = restored_bytes
+                    item[field_name] = self._restore_bytes(field_value)
                 except Exception as e:
                     self.logger.warning(f"Ошибка восстановления bytes для поля {field_name}: {e}")
                     # Оставляем как есть, если не удалось восстановить
         
         return item
     
+    @staticmethod
+    def _is_bytes_string(value: Any) -> bool:
+        """Проверяет, является ли значение закодированными bytes"""
+        return isinstance(value, str) and (value.startswith(BYTES_B64_PREFIX) or value.startswith(BYTES_HEX_PREFIX))
+    
+    @staticmethod
+    def _restore_bytes(value: str) -> bytes:
+        """Восстанавливает bytes из base64 строки (или hex строки старого формата)"""
+        if value.startswith(BYTES_B64_PREFIX):
+            return base64.b64decode(value[len(BYTES_B64_PREFIX):])
+        return bytes.fromhex(value[len(BYTES_HEX_PREFIX):])
+    
     def _restore_bytes_recursive(self, data: Any) -> Any:
         """
-        Оптимизированная рекурсивная функция для восстановления bytes из hex строк.
+        Оптимизированная рекурсивная функция для восстановления bytes из base64/hex строк.
         Проверяет наличие bytes строк перед рекурсией для максимальной производительности.
         """
         if isinstance(data, dict):
@@ -115,12 +222,10 @@ class DataConverter:
             # Есть bytes строки - обрабатываем рекурсивно
             return [self._restore_bytes_recursive(item) for item in data]
             
-        elif isinstance(data, str) and data.startswith('bytes:'):
-            # Восстанавливаем bytes из hex строки
+        elif self._is_bytes_string(data):
+            # Восстанавливаем bytes из base64/hex строки
             try:
-                hex_data = data[6:]  # убираем "bytes:"
-                restored_bytes = bytes.fromhex(hex_data)
-                return restored_bytes
+                return self._restore_bytes(data)
             except Exception as e:
                 self.logger.warning(f"Ошибка рекурсивного восстановления bytes: {e}")
                 return data
@@ -137,7 +242,7 @@ class DataConverter:
             return any(self._has_bytes_strings(v) for v in data.values())
         elif isinstance(data, list):
             return any(self._has_bytes_strings(item) for item in data)
-        elif isinstance(data, str) and data.startswith('bytes:'):
+        elif self._is_bytes_string(data):
             return True
         else:
             return False
@@ -176,10 +281,9 @@ class DataConverter:
         if isinstance(value, (str, int, float, bool)):
             return value
         
-        # Обрабатываем bytes - конвертируем в hex строку
+        # Обрабатываем bytes - конвертируем в base64 строку (компактнее hex)
         if isinstance(value, bytes):
-            hex_result = f"bytes:{value.hex()}"
-            return hex_result
+            return f"{BYTES_B64_PREFIX}{base64.b64encode(value).decode('ascii')}"
         
         # Обрабатываем datetime
         if isinstance(value, datetime.datetime):
@@ -1,7 +1,8 @@
 import json
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, Text
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import DeclarativeMeta
 
 
@@ -15,6 +16,7 @@ class DataPreparer:
         self.logger = kwargs['logger']
         self.settings_manager = kwargs['settings_manager']
         self.datetime_formatter = kwargs['datetime_formatter']
+        self.data_converter = kwargs['data_converter']
         
         # Получаем настройки через settings_manager
         settings = self.settings_manager.get_plugin_settings("data_preparer")
@@ -86,14 +88,17 @@ class DataPreparer:
         # JSON поля
         if json_fields and field_name in json_fields:
             if not isinstance(value, str):
-                # Если значение не строка, сериализуем в JSON
+                # Если значение не строка, сериализуем в JSON и сжимаем при необходимости
                 result = json.dumps(value, ensure_ascii=False)
-                return result
+                return self.data_converter.compress_field(field_name, result)
+            elif self.data_converter.is_compressed(value):
+                # Уже сжатое значение (например, скопированное из другой записи)
+                return value
             else:
                 # Если значение уже строка, проверяем что это валидный JSON
                 try:
                     json.loads(value)  # Проверяем валидность
-                    return value  # Возвращаем как есть
+                    return self.data_converter.compress_field(field_name, value)
                 except json.JSONDecodeError:
                     # Если не валидный JSON, логируем предупреждение
                     self.logger.warning(f"Поле {field_name} содержит невалидный JSON: {value[:100]}...")
@@ -102,6 +107,10 @@ class DataPreparer:
                         return None
                     return value  # Возвращаем как есть
         
+        # JSON колонки без json_fields (JSONText: JSONB в PostgreSQL, TEXT в остальных БД) - сериализуем в JSON
+        if isinstance(column.type, TypeDecorator) and isinstance(column.type.impl, Text):
+            return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        
         # Определяем тип колонки
         column_type = type(column.type)
         
@@ -109,8 +118,8 @@ class DataPreparer:
         if column_type in (String, Text):
             return str(value) if value is not None else None
         
-        # Целочисленные типы
-        elif column_type == Integer:
+        # Целочисленные типы (BigInteger - Telegram id в PostgreSQL)
+        elif column_type in (Integer, BigInteger):
             return int(value) if value is not None else None
         
         # Булевы типы
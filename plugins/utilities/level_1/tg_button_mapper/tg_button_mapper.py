@@ -1,27 +1,29 @@
-import os
 import re
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import emoji
-import yaml
 from unidecode import unidecode
 
 # Максимальная длина callback_data для Telegram (лимит 64 байта, используем 60 символов для запаса)
 CALLBACK_DATA_LIMIT = 60
 
+# Имя индекса кнопок в снимке сценариев
+INDEX_NAME = 'tg_button_mapper.buttons'
+
 class TgButtonMapper:
     """
     Утилита для маппинга текста кнопок в callback_data и поиска по ним.
-    Загружает кнопки из текущего пресета через settings_manager.
+    Индексы строятся из снимка сценариев scenarios_manager до его публикации и хранятся в самом снимке.
     """
     def __init__(self, **kwargs):
         self.logger = kwargs['logger']
         self.settings_manager = kwargs.get('settings_manager')
+        self.scenarios_manager = kwargs['scenarios_manager']
 
-        button_texts = self._collect_button_texts()
-        self.button_map: Dict[str, str] = {}
-        self.normalized_map: Dict[str, str] = {}
-        self._build_map(button_texts)
+        # Индекс одной версии сценариев хранится в снимке (model.get_index(INDEX_NAME)):
+        # button_map (текст -> callback_data), normalized_map (callback_data -> текст),
+        # callback_triggers (kind -> [(нормализованный ключ, значение триггера)])
+        self.scenarios_manager.subscribe(INDEX_NAME, self._build_indexes)
 
     @staticmethod
     def normalize(text: str) -> str:
@@ -34,49 +36,67 @@ class TgButtonMapper:
         # Ограничиваем длину до CALLBACK_DATA_LIMIT символов
         return text[:CALLBACK_DATA_LIMIT]
 
-    def _collect_button_texts(self) -> List[str]:
+    def _get_index(self, model=None) -> Dict[str, Any]:
+        """Индекс переданного снимка (по умолчанию - текущего)"""
+        model = model or self.scenarios_manager.get_model()
+        return model.get_index(INDEX_NAME)
+
+    @property
+    def button_map(self) -> Dict[str, str]:
+        return self._get_index()['button_map']
+
+    @property
+    def normalized_map(self) -> Dict[str, str]:
+        return self._get_index()['normalized_map']
+
+    def _build_indexes(self, model) -> Dict[str, Any]:
+        """Строит все индексы из снимка сценариев за один проход, состояние не изменяет (вызывается из потока перезагрузки)"""
+        button_map: Dict[str, str] = {}
+        normalized_map: Dict[str, str] = {}
+        for text in self._collect_button_texts(model):
+            callback = self.normalize(text)
+            button_map[text] = callback
+            normalized_map[callback] = text
+
+        callback = model.triggers.get('callback', {})
+        callback_triggers = {
+            kind: [(self.normalize(key), value) for key, value in callback.get(kind, {}).items()]
+            for kind in ('exact', 'contains')
+        }
+
+        self.logger.info(f"Индексы кнопок построены (версия сценариев {model.version}): {len(button_map)} кнопок")
+        return {
+            'button_map': button_map,
+            'normalized_map': normalized_map,
+            'callback_triggers': callback_triggers,
+        }
+
+    def _collect_button_texts(self, model) -> List[str]:
         button_texts = set()
-        
-        # Определяем текущий пресет
-        preset = self.settings_manager.get_current_preset() if self.settings_manager else 'default'
-        
+
         # 1. Сценарии (inline/reply)
-        scenarios_dir = os.path.join('config', 'presets', preset, 'scenarios')
-        if os.path.isdir(scenarios_dir):
-            for root, _, files in os.walk(scenarios_dir):
-                for fname in files:
-                    if fname.endswith('.yaml') or fname.endswith('.yml'):
-                        with open(os.path.join(root, fname), encoding='utf-8') as f:
-                            data = yaml.safe_load(f) or {}
-                            for scenario in data.values():
-                                for action in scenario.get('actions', []):
-                                    for key in ['inline', 'reply']:
-                                        for row in action.get(key, []):
-                                            for btn in row:
-                                                if isinstance(btn, str):
-                                                    button_texts.add(btn)
-                                                elif isinstance(btn, dict):
-                                                    button_texts.update(btn.keys())
-        
+        for scenario in model.scenarios.values():
+            for action in scenario.get('actions', []):
+                for key in ['inline', 'reply']:
+                    for row in action.get(key, []):
+                        for btn in row:
+                            if isinstance(btn, str):
+                                button_texts.add(btn)
+                            elif isinstance(btn, dict):
+                                button_texts.update(btn.keys())
+
         # 2. Триггеры (callback exact/contains)
-        triggers_path = os.path.join('config', 'presets', preset, 'triggers.yaml')
-        if os.path.exists(triggers_path):
-            with open(triggers_path, encoding='utf-8') as f:
-                triggers_data = yaml.safe_load(f) or {}
-                callback_exact = triggers_data.get('callback', {}).get('exact', {})
-                callback_contains = triggers_data.get('callback', {}).get('contains', {})
-                button_texts.update(callback_exact.keys())
-                button_texts.update(callback_contains.keys())
-        
-        return list(button_texts)
+        callback = model.triggers.get('callback', {})
+        button_texts.update(callback.get('exact', {}).keys())
+        button_texts.update(callback.get('contains', {}).keys())
 
-    def _build_map(self, button_texts: List[str]):
-        for text in button_texts:
-            callback = self.normalize(text)
-            self.button_map[text] = callback
-            self.normalized_map[callback] = text
+        return list(button_texts)
 
-    def get_button_text(self, callback_data: str) -> Optional[str]:
+    def get_button_text(self, callback_data: str, model=None) -> Optional[str]:
         # Обрезаем callback_data до лимита для поиска
         trimmed = callback_data[:CALLBACK_DATA_LIMIT]
-        return self.normalized_map.get(trimmed)
+        return self._get_index(model)['normalized_map'].get(trimmed)
+
+    def get_callback_triggers(self, kind: str, model=None) -> List[Tuple[str, Any]]:
+        """Callback триггеры с заранее нормализованными ключами (kind: exact или contains), model - снимок сценариев"""
+        return self._get_index(model)['callback_triggers'].get(kind, [])
@@ -17,7 +17,7 @@ except ImportError:
 
 import argparse
 
-from sqlalchemy import inspect, text
+from sqlalchemy import MetaData, Table, create_engine, func, inspect, select, text
 from sqlalchemy.exc import OperationalError
 
 # Импорты для работы с DI-контейнером
@@ -26,6 +26,7 @@ from plugins.utilities.foundation.logger.logger import Logger
 from plugins.utilities.foundation.plugins_manager.plugins_manager import \
     PluginsManager
 from plugins.utilities.foundation.settings_manager.settings_manager import SettingsManager
+from plugins.utilities.level_1.data_converter.data_converter import COMPRESSED_MARKER
 
 
 def get_table_class_map(db_service):
@@ -59,10 +60,12 @@ def recreate_indexes(db_service, table_class):
     # Индексы, определённые в модели
     model_indexes = [idx for idx in table.indexes]
     # Удаляем существующие индексы
-    with engine.connect() as conn:
+    # Индексы, обслуживающие UNIQUE-ограничения (PostgreSQL), удаляются только вместе с ограничением
+    constraint_indexes = {idx['name'] for idx in inspector.get_indexes(table.name) if idx.get('duplicates_constraint')}
+    with engine.begin() as conn:
         for idx in existing_indexes:
-            if idx == 'sqlite_autoindex_' + table.name + '_1':
-                continue  # Не трогаем PK
+            if idx == 'sqlite_autoindex_' + table.name + '_1' or idx in constraint_indexes:
+                continue  # Не трогаем PK и ограничения
             try:
                 print(f"Удаляю индекс {idx}...")
                 conn.execute(text(f'DROP INDEX IF EXISTS "{idx}"'))
@@ -110,18 +113,41 @@ def restore_database(backup_path, db_path):
 def get_db_columns(engine, table_name):
     inspector = inspect(engine)
     columns = inspector.get_columns(table_name)
-    return {col['name']: col['type'] for col in columns}
+    return {col['name']: col['type'].compile(dialect=engine.dialect) for col in columns}
 
-def get_model_columns(table_class):
-    return {col.name: col.type for col in table_class.__table__.columns}
+def get_model_columns(table_class, engine):
+    # Типы компилируются диалектом БД: JSONText -> TEXT/JSONB, TelegramId -> INTEGER/BIGINT
+    return {col.name: col.type.compile(dialect=engine.dialect) for col in table_class.__table__.columns}
 
 def can_drop_column(engine):
-    # SQLite >= 3.35 поддерживает DROP COLUMN
+    # SQLite >= 3.35 поддерживает DROP COLUMN, остальные БД - всегда
+    if engine.dialect.name != 'sqlite':
+        return True
     with engine.connect() as conn:
         version = conn.execute(text('select sqlite_version()')).scalar()
     major, minor, *_ = map(int, version.split('.'))
     return (major, minor) >= (3, 35)
 
+def decompress_column(conn, data_converter, table_class, col, logger):
+    """Распаковывает сжатые data_converter значения колонки на месте - иначе приведение к JSONB упадет"""
+    table = table_class.__table__
+    pk_columns = [c.name for c in table.primary_key.columns]
+    select_cols = ', '.join(pk_columns + [col])
+    rows = conn.execute(
+        text(f'SELECT {select_cols} FROM {table.name} WHERE {col} LIKE :marker'),
+        {'marker': COMPRESSED_MARKER + '%'}
+    ).fetchall()
+    where = ' AND '.join(f'{name} = :pk_{name}' for name in pk_columns)
+    for row in rows:
+        value = data_converter.decompress_field(row[-1])
+        if data_converter.is_compressed(value):
+            raise RuntimeError(f"Не удалось распаковать значение {table.name}.{col} - миграция типа невозможна")
+        params = {f'pk_{name}': row[i] for i, name in enumerate(pk_columns)}
+        params['value'] = value
+        conn.execute(text(f'UPDATE {table.name} SET {col} = :value WHERE {where}'), params)
+    if rows:
+        logger.info(f"Распаковано {len(rows)} сжатых значений колонки {col}")
+
 def recreate_table_with_data(db_service, table_class, logger):
     engine = db_service.engine
     table = table_class.__table__
@@ -157,9 +183,11 @@ def recreate_table_with_data(db_service, table_class, logger):
 
 def migrate_database(db_service, logger, db_path):
     engine = db_service.engine
+    is_sqlite = engine.dialect.name == 'sqlite'
     inspector = inspect(engine)
     existing_tables = set(inspector.get_table_names())
-    backup_path = backup_database(db_path)
+    # Бэкап файла - только для SQLite; в PostgreSQL каждое изменение выполняется в транзакции
+    backup_path = backup_database(db_path) if is_sqlite else None
     table_class_map = get_table_class_map(db_service)
     try:
         for table_name, table_class in table_class_map.items():
@@ -169,7 +197,7 @@ def migrate_database(db_service, logger, db_path):
                 table_class.__table__.create(engine, checkfirst=True)
                 continue
             db_cols = get_db_columns(engine, table_name)
-            model_cols = get_model_columns(table_class)
+            model_cols = get_model_columns(table_class, engine)
             need_recreate = False
             # Проверка совпадения колонок и типов
             if db_cols == model_cols:
@@ -178,7 +206,7 @@ def migrate_database(db_service, logger, db_path):
                 recreate_indexes(db_service, table_class)
                 continue
             # Добавление недостающих колонок
-            with engine.connect() as conn:
+            with engine.begin() as conn:
                 for col, col_type in model_cols.items():
                     if col not in db_cols:
                         logger.info(f"Добавляю колонку {col} в {table_name}")
@@ -192,28 +220,97 @@ def migrate_database(db_service, logger, db_path):
                         else:
                             logger.info(f"SQLite не поддерживает DROP COLUMN, требуется перезаливка таблицы {table_name}")
                             need_recreate = True
-            # Несовпадение типов
-            for col in model_cols:
-                if col in db_cols and str(db_cols[col]) != str(model_cols[col]):
-                    logger.info(f"Несовпадение типа колонки {col} ({db_cols[col]} -> {model_cols[col]}), требуется перезаливка")
-                    need_recreate = True
+                # Несовпадение типов
+                for col in model_cols:
+                    if col in db_cols and db_cols[col] != model_cols[col]:
+                        if is_sqlite:
+                            logger.info(f"Несовпадение типа колонки {col} ({db_cols[col]} -> {model_cols[col]}), требуется перезаливка")
+                            need_recreate = True
+                        else:
+                            # PostgreSQL меняет тип на месте (например, TEXT -> JSONB)
+                            logger.info(f"Меняю тип колонки {col} ({db_cols[col]} -> {model_cols[col]})")
+                            if model_cols[col] == 'JSONB':
+                                # Сжатые значения (\x1f...) не являются JSON - распаковываем до приведения
+                                decompress_column(conn, db_service.data_converter, table_class, col, logger)
+                            conn.execute(text(
+                                f'ALTER TABLE {table_name} ALTER COLUMN {col} TYPE {model_cols[col]} USING {col}::{model_cols[col]}'
+                            ))
             if need_recreate:
                 recreate_table_with_data(db_service, table_class, logger)
             # Пересоздаём индексы
             recreate_indexes(db_service, table_class)
     except Exception as e:
+        if not backup_path:
+            logger.error(f"Ошибка миграции: {e}. Изменения таблицы откачены транзакцией.")
+            raise
         logger.error(f"Ошибка миграции: {e}. Восстанавливаю базу из бэкапа...")
         restore_database(backup_path, db_path)
         raise
     logger.info("\nМиграция завершена успешно!")
     # --- Удаляем .bak после успешной миграции ---
-    if os.path.exists(backup_path):
+    if backup_path and os.path.exists(backup_path):
         try:
             os.remove(backup_path)
             logger.info(f"Удалён бэкап базы: {backup_path}")
         except Exception as e:
             logger.warning(f"Не удалось удалить бэкап базы {backup_path}: {e}")
 
+def migrate_from_sqlite(db_service, logger, sqlite_path, table_classes, batch_size=1000):
+    """Переносит данные из SQLite-файла в текущую БД (например, PostgreSQL) батчами."""
+    if not os.path.exists(sqlite_path):
+        raise FileNotFoundError(f"SQLite база не найдена: {sqlite_path}")
+    
+    source_engine = create_engine(f"sqlite:///{sqlite_path}", future=True)
+    target_engine = db_service.engine
+    data_converter = db_service.data_converter
+    decompress = target_engine.dialect.name == 'postgresql'
+    source_tables = set(inspect(source_engine).get_table_names())
+    
+    try:
+        for table_class in table_classes:
+            table = table_class.__table__
+            if table.name not in source_tables:
+                logger.info(f"Таблица {table.name} отсутствует в {sqlite_path}, пропускаю")
+                continue
+            
+            # Структура источника может быть старой - переносим только общие колонки
+            source_table = Table(table.name, MetaData(), autoload_with=source_engine)
+            columns = [col.name for col in table.columns if col.name in source_table.columns]
+            
+            with target_engine.begin() as target_conn:
+                # Перенос только в пустую таблицу - повторный запуск не создаст дублей
+                existing = target_conn.execute(select(func.count()).select_from(table)).scalar()
+                if existing:
+                    raise RuntimeError(f"Таблица {table.name} в целевой БД не пустая ({existing} записей)")
+                
+                copied = 0
+                with source_engine.connect() as source_conn:
+                    result = source_conn.execution_options(stream_results=True).execute(
+                        select(*[source_table.c[name] for name in columns])
+                    )
+                    for rows in result.partitions(batch_size):
+                        records = [dict(row._mapping) for row in rows]
+                        if decompress:
+                            # В JSONB сжатие data_converter отключено - переносим значения распакованными
+                            records = [{key: data_converter.decompress_field(value) for key, value in record.items()}
+                                       for record in records]
+                        target_conn.execute(table.insert(), records)
+                        copied += len(rows)
+                
+                # PostgreSQL: счётчики автоинкремента продолжают с максимального id
+                if target_engine.dialect.name == 'postgresql' and copied:
+                    for col in table.primary_key.columns:
+                        target_conn.execute(text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{col.name}'), "
+                            f"COALESCE(MAX({col.name}), 1), MAX({col.name}) IS NOT NULL) FROM {table.name}"
+                        ))
+            
+            logger.info(f"Таблица {table.name}: перенесено {copied} записей")
+    finally:
+        source_engine.dispose()
+    
+    logger.info("\nПеренос данных из SQLite завершён успешно!")
+
 def main():
     parser = argparse.ArgumentParser(description="Менеджер базы данных: пересоздание таблиц, индексов, миграции")
     group_target = parser.add_mutually_exclusive_group(required=True)
@@ -224,6 +321,8 @@ def main():
     group_mode.add_argument('--recreate-indexes', action='store_true', help="Пересоздать только индексы")
     group_mode.add_argument('--migrate', action='store_true', help="Миграция схемы и данных (умная)")
     group_mode.add_argument('--drop-table', action='store_true', help="Удалить таблицу по имени")
+    group_mode.add_argument('--migrate-from-sqlite', metavar='PATH', help="Перенести данные из SQLite-файла в текущую БД (database_url)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Размер батча для --migrate-from-sqlite")
     args = parser.parse_args()
 
     # Инициализация DI-контейнера
@@ -239,9 +338,10 @@ def main():
             print("❌ Ошибка: не удалось получить database_service из DI-контейнера")
             sys.exit(1)
         
-        # Получение пути к базе данных
+        # Получение пути к базе данных (файл есть только у SQLite)
+        is_sqlite = db_service.dialect == 'sqlite'
         db_path = db_service.engine.url.database
-        db_dir = os.path.dirname(db_path)
+        db_dir = os.path.dirname(db_path) if is_sqlite else None
         
         # Создаем директорию для базы данных, если её нет
         if db_dir and not os.path.exists(db_dir):
@@ -249,8 +349,9 @@ def main():
             print(f"📁 Создана директория для базы данных: {db_dir}")
         
         # Проверяем существование базы данных
-        db_exists = os.path.exists(db_path)
-        if not db_exists:
+        if not is_sqlite:
+            print(f"🗄 База данных: {db_service.engine.url.render_as_string(hide_password=True)}")
+        elif not os.path.exists(db_path):
             print(f"🗄 База данных не найдена: {db_path}")
             print("🔄 Создаю новую базу данных...")
             
@@ -286,6 +387,10 @@ def main():
         else:
             table_classes = [get_table_class(args.table, db_service)]
 
+        if args.migrate_from_sqlite:
+            migrate_from_sqlite(db_service, logger, args.migrate_from_sqlite, table_classes, batch_size=args.batch_size)
+            return
+
         for table_class in table_classes:
             if args.recreate_tables:
                 recreate_table(db_service, table_class)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Офлайн бенчмарки горячего пути Coreness
+Поднимает DI-контейнер поверх временной SQLite БД и фейкового бота, замеряет ключевые этапы
+обработки событий, сохраняет результаты в JSON и сравнивает их с сохраненными baseline
+"""
+
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+# Переходим в корневую директорию проекта для корректной работы DI-контейнера
+os.chdir(project_root)
+
+# Загружаем переменные окружения из .env файла
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    print("⚠️  python-dotenv не установлен. Переменные окружения могут быть не загружены.")
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Импорты для работы с DI-контейнером
+from app.di_container import DIContainer
+from plugins.utilities.foundation.logger.logger import Logger
+from plugins.utilities.foundation.plugins_manager.plugins_manager import \
+    PluginsManager
+from plugins.utilities.foundation.settings_manager.settings_manager import SettingsManager
+
+RESULTS_DIR = os.path.join('data', 'benchmarks')
+BASELINES_DIR = os.path.join(RESULTS_DIR, 'baselines')
+
+BENCH_USER_ID = 700000001
+BENCH_CHAT_ID = 700000001
+
+
+class FakeBot:
+    """Фейковый Bot API: мгновенно отвечает на вызовы и считает их"""
+
+    def __init__(self):
+        self._message_ids = itertools.count(1000)
+        self.calls: Dict[str, int] = {}
+
+    def _reply(self, method: str):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        return SimpleNamespace(message_id=next(self._message_ids))
+
+    async def send_message(self, *args, **kwargs):
+        return self._reply('send_message')
+
+    async def edit_message_text(self, *args, **kwargs):
+        return self._reply('edit_message_text')
+
+    async def delete_message(self, *args, **kwargs):
+        self._reply('delete_message')
+        return True
+
+    async def send_photo(self, *args, **kwargs):
+        return self._reply('send_photo')
+
+    async def send_document(self, *args, **kwargs):
+        return self._reply('send_document')
+
+    async def send_media_group(self, *args, **kwargs):
+        return [self._reply('send_media_group')]
+
+    async def answer_callback_query(self, *args, **kwargs):
+        self._reply('answer_callback_query')
+        return True
+
+
+class BenchmarkFixture:
+    """Окружение бенчмарка: DI-контейнер над временной SQLite БД"""
+
+    def __init__(self, keep_db: bool = False):
+        self.keep_db = keep_db
+        self.temp_dir = tempfile.mkdtemp(prefix='coreness_bench_')
+        self.database_url = f"sqlite:///{os.path.join(self.temp_dir, 'bench.db')}"
+        self.fake_bot = FakeBot()
+
+        self.logger = Logger()
+        self.plugins_manager = PluginsManager(logger=self.logger.get_logger('plugins_manager'))
+        self.settings_manager = SettingsManager(
+            logger=self.logger.get_logger('settings_manager'),
+            plugins_manager=self.plugins_manager
+        )
+        # Временная БД и фиктивный токен - бенчмарк не должен трогать рабочие данные и Telegram.
+        # raw_send идет через bot.session, которой у FakeBot нет - отправка через методы бота
+        self.settings_manager.apply_overrides({
+            'database_service': {'database_url': self.database_url, 'echo': False},
+            'tg_bot_initializer': {'token': '123456:BENCHMARK'},
+            'tg_messenger': {'raw_send': False},
+        })
+        self.di_container = DIContainer(
+            logger=self.logger,
+            plugins_manager=self.plugins_manager,
+            settings_manager=self.settings_manager
+        )
+
+    def utility(self, name: str):
+        """Получает утилиту из DI-контейнера (с ошибкой если недоступна)"""
+        instance = self.di_container.get_utility_on_demand(name)
+        if instance is None:
+            raise RuntimeError(f"утилита {name} недоступна")
+        return instance
+
+    def service(self, name: str):
+        """Получает сервис из DI-контейнера (с ошибкой если недоступен)"""
+        instance = self.di_container.get_service_on_demand(name)
+        if instance is None:
+            raise RuntimeError(f"сервис {name} недоступен")
+        return instance
+
+    def close(self):
+        """Завершает контейнер и удаляет временную БД"""
+        try:
+            self.di_container.shutdown()
+        finally:
+            if self.keep_db:
+                print(f"ℹ️ временная БД сохранена: {self.temp_dir}")
+            else:
+                shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class BenchmarkRunner:
+    """Набор бенчмарков горячего пути"""
+
+    def __init__(self, fixture: BenchmarkFixture, iterations: int, warmup: int):
+        self.fixture = fixture
+        self.iterations = iterations
+        self.warmup = warmup
+        self._message_ids = itertools.count(1)
+
+        self.cases: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]] = {
+            'trigger_processing.text_exact': self.bench_trigger_text_exact,
+            'trigger_processing.text_miss': self.bench_trigger_text_miss,
+            'trigger_processing.callback': self.bench_trigger_callback,
+            'event_parser.message': self.bench_event_parser_message,
+            'data_converter.to_dict': self.bench_data_converter_to_dict,
+            'action_parser.parse_action': self.bench_action_parser,
+            'trigger_manager.handle_event': self.bench_trigger_manager_handle_event,
+            'tg_messenger.queue_drain': self.bench_messenger_drain,
+        }
+
+    # === Измерение ===
+
+    @staticmethod
+    def _summarize(samples: List[float], items_per_call: int = 1) -> Dict[str, Any]:
+        """Сводная статистика по замерам (секунды на вызов)"""
+        ordered = sorted(samples)
+        total = sum(ordered)
+        count = len(ordered)
+
+        def percentile(p: float) -> float:
+            return ordered[min(count - 1, int(round(p / 100 * (count - 1))))]
+
+        return {
+            'iterations': count,
+            'items_per_call': items_per_call,
+            'total_s': round(total, 6),
+            'ops_per_sec': round(count * items_per_call / total, 1) if total else None,
+            'mean_us': round(total / count * 1e6, 2),
+            'p50_us': round(percentile(50) * 1e6, 2),
+            'p95_us': round(percentile(95) * 1e6, 2),
+            'p99_us': round(percentile(99) * 1e6, 2),
+            'max_us': round(ordered[-1] * 1e6, 2),
+        }
+
+    def _measure_sync(self, func: Callable[[], Any], iterations: Optional[int] = None) -> Dict[str, Any]:
+        """Замер синхронной функции"""
+        iterations = iterations or self.iterations
+        for _ in range(self.warmup):
+            func()
+        samples = []
+        perf_counter = time.perf_counter
+        for _ in range(iterations):
+            start = perf_counter()
+            func()
+            samples.append(perf_counter() - start)
+        return self._summarize(samples)
+
+    async def _measure_async(self, func: Callable[[], Awaitable[Any]], iterations: Optional[int] = None,
+                             setup: Optional[Callable[[], Any]] = None, items_per_call: int = 1) -> Dict[str, Any]:
+        """Замер корутины (setup выполняется вне замера)"""
+        iterations = iterations or self.iterations
+        for _ in range(self.warmup):
+            if setup:
+                setup()
+            await func()
+        samples = []
+        perf_counter = time.perf_counter
+        for _ in range(iterations):
+            if setup:
+                setup()
+            start = perf_counter()
+            await func()
+            samples.append(perf_counter() - start)
+        return self._summarize(samples, items_per_call)
+
+    # === Данные ===
+
+    def _make_text_event(self, text: str) -> Dict[str, Any]:
+        """Синтетический event в формате event_parser"""
+        now = self.fixture.utility('datetime_formatter').now_local()
+        return {
+            'source_type': 'text',
+            'message_type': 'text',
+            'user_id': BENCH_USER_ID,
+            'chat_id': BENCH_CHAT_ID,
+            'chat_type': 'private',
+            'message_id': next(self._message_ids),
+            'username': 'bench_user',
+            'first_name': 'Bench',
+            'last_name': 'User',
+            'is_bot': False,
+            'event_text': text,
+            'text': text,
+            'event_date': self.fixture.utility('datetime_formatter').to_iso_string(now),
+        }
+
+    def _make_callback_event(self, callback_data: str) -> Dict[str, Any]:
+        """Синтетический callback event"""
+        event = self._make_text_event('')
+        event.update({
+            'source_type': 'callback',
+            'callback_id': str(next(self._message_ids)),
+            'callback_data': callback_data,
+        })
+        return event
+
+    def _first_exact_text_trigger(self) -> str:
+        """Первый exact триггер активного пресета (или /start)"""
+        triggers = self.fixture.utility('scenarios_manager').get_triggers() or {}
+        exact = (triggers.get('text') or {}).get('exact') or {}
+        return next(iter(exact), '/start')
+
+    # === Кейсы ===
+
+    async def bench_trigger_text_exact(self) -> Dict[str, Any]:
+        trigger_processing = self.fixture.utility('trigger_processing')
+        event = self._make_text_event(self._first_exact_text_trigger())
+        return self._measure_sync(lambda: trigger_processing.find_all_scenarios_by_event(event))
+
+    async def bench_trigger_text_miss(self) -> Dict[str, Any]:
+        trigger_processing = self.fixture.utility('trigger_processing')
+        event = self._make_text_event('benchmark text that matches no trigger')
+        return self._measure_sync(lambda: trigger_processing.find_all_scenarios_by_event(event))
+
+    async def bench_trigger_callback(self) -> Dict[str, Any]:
+        trigger_processing = self.fixture.utility('trigger_processing')
+        mapper = self.fixture.utility('tg_button_mapper')
+        callback_data = next(iter(mapper.normalized_map), 'benchmark')
+        event = self._make_callback_event(callback_data)
+        return self._measure_sync(lambda: trigger_processing.find_all_scenarios_by_event(event))
+
+    async def bench_event_parser_message(self) -> Dict[str, Any]:
+        from aiogram import types
+
+        event_parser = self.fixture.utility('event_parser')
+        message = types.Message(
+            message_id=1,
+            date=datetime.datetime.now(datetime.timezone.utc),
+            chat=types.Chat(id=BENCH_CHAT_ID, type='private', first_name='Bench'),
+            from_user=types.User(id=BENCH_USER_ID, is_bot=False, first_name='Bench', username='bench_user'),
+            text='Benchmark *message* with some text and a link https://example.com',
+        )
+        return self._measure_sync(lambda: event_parser.parse_bot_api_message(message))
+
+    async def bench_data_converter_to_dict(self) -> Dict[str, Any]:
+        from plugins.utilities.core.database_service.models import Action
+        from plugins.utilities.core.database_service.repositories.actions import ActionsRepository
+
+        data_preparer = self.fixture.utility('data_preparer')
+        data_converter = self.fixture.utility('data_converter')
+
+        event = self._make_text_event('/start')
+        fields = data_preparer.prepare_for_insert(
+            model=Action,
+            fields={
+                'action_type': 'send',
+                'event_data': event,
+                'action_data': {'type': 'send', 'text': 'Benchmark reply ' * 20, 'inline': [['Меню']]},
+                'status': 'pending',
+            },
+            json_fields=ActionsRepository.JSON_FIELDS
+        )
+        action = Action(**fields)
+        return self._measure_sync(lambda: data_converter.to_dict(action, json_fields=ActionsRepository.JSON_FIELDS))
+
+    async def bench_action_parser(self) -> Dict[str, Any]:
+        action_parser = self.fixture.utility('action_parser')
+        action = {
+            'id': 1,
+            'action_type': 'send',
+            'status': 'pending',
+            'event_data': self._make_text_event('/start'),
+            'action_data': {'type': 'send', 'text': 'Benchmark reply', 'expire': '1d 2h'},
+            'prev_data': {'last_message_id': 10},
+            'placeholder_data': None,
+            'response_data': None,
+        }
+        return self._measure_sync(lambda: action_parser.parse_action(action))
+
+    async def bench_trigger_manager_handle_event(self) -> Dict[str, Any]:
+        trigger_manager = self.fixture.utility('trigger_manager')
+        trigger_text = self._first_exact_text_trigger()
+        events: List[Dict[str, Any]] = []
+
+        def setup():
+            # Уникальный message_id - иначе событие отсечет дедупликация
+            events.append(self._make_text_event(trigger_text))
+
+        async def call():
+            await trigger_manager.handle_event(events.pop())
+
+        # Тот же объем итераций, но не больше 500 - каждая итерация пишет в БД
+        return await self._measure_async(call, iterations=min(self.iterations, 500), setup=setup)
+
+    async def bench_messenger_drain(self) -> Dict[str, Any]:
+        messenger = self.fixture.service('tg_messenger')
+        messenger.bot = self.fixture.fake_bot
+        database_service = self.fixture.utility('database_service')
+        batch_size = messenger.batch_size
+
+        # Очищаем очередь от действий предыдущих кейсов
+        while await messenger.process_batch():
+            pass
+
+        def setup():
+            with database_service.session_scope('actions') as (_, repos):
+                for _ in range(batch_size):
+                    event = self._make_text_event('/start')
+                    repos['actions'].add_action(
+                        action_type='send',
+                        event_data=event,
+                        action_data={'type': 'send', 'text': 'Benchmark reply', 'placeholder': False},
+                        status='pending'
+                    )
+
+        return await self._measure_async(
+            messenger.process_batch,
+            iterations=max(self.iterations // batch_size, 5),
+            setup=setup,
+            items_per_call=batch_size
+        )
+
+    async def run(self, only: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Выполняет выбранные кейсы и возвращает результаты"""
+        results = {}
+        for name, case in self.cases.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            print(f"⏱  {name} ...", end=' ', flush=True)
+            try:
+                # Логи бизнес-логики (например "триггер не найден") искажают замеры
+                logging.disable(logging.WARNING)
+                results[name] = await case()
+            except Exception as e:
+                results[name] = {'error': str(e)}
+            finally:
+                logging.disable(logging.NOTSET)
+            result = results[name]
+            if 'error' in result:
+                print(f"❌ {result['error']}")
+            else:
+                print(f"{result['ops_per_sec']} ops/s, p50={result['p50_us']}µs, p99={result['p99_us']}µs")
+        return results
+
+
+def get_environment_info() -> Dict[str, Any]:
+    """Метаданные окружения для сопоставления результатов"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Сравнивает mean_us с baseline, возвращает список регрессий"""
+    regressions = []
+    print(f"\n{'кейс':<36} {'baseline µs':>12} {'сейчас µs':>12} {'изменение':>10}")
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'error' in base or 'error' in current:
+            continue
+        change = (current['mean_us'] - base['mean_us']) / base['mean_us'] if base['mean_us'] else 0.0
+        marker = ''
+        if change > max_regression:
+            marker = ' ❌'
+            regressions.append(f"{name}: {base['mean_us']}µs → {current['mean_us']}µs ({change:+.0%})")
+        print(f"{name:<36} {base['mean_us']:>12} {current['mean_us']:>12} {change:>+10.0%}{marker}")
+    return regressions
+
+
+async def main_async(args) -> int:
+    fixture = BenchmarkFixture(keep_db=args.keep_db)
+    try:
+        runner = BenchmarkRunner(fixture, iterations=args.iterations, warmup=args.warmup)
+        if args.list:
+            for name in runner.cases:
+                print(name)
+            return 0
+
+        results = await runner.run(args.only)
+    finally:
+        fixture.close()
+
+    report = {'environment': get_environment_info(), 'iterations': args.iterations, 'results': results}
+
+    # Сохраняем результаты
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 результаты: {output_path}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        baseline_path = os.path.join(BASELINES_DIR, f"{args.save_baseline}.json")
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 baseline '{args.save_baseline}': {baseline_path}")
+
+    if args.compare:
+        baseline_path = os.path.join(BASELINES_DIR, f"{args.compare}.json")
+        if not os.path.exists(baseline_path):
+            print(f"❌ baseline не найден: {baseline_path}")
+            return 2
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n❌ регрессии (порог {args.max_regression:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\n✅ регрессий нет")
+
+    return 1 if any('error' in r for r in results.values()) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарки горячего пути (временная SQLite БД, фейковый бот)")
+    parser.add_argument('--iterations', type=int, default=1000, help="Количество замеров на кейс")
+    parser.add_argument('--warmup', type=int, default=20, help="Количество прогревочных вызовов на кейс")
+    parser.add_argument('--only', nargs='*', help="Запустить только кейсы с указанными префиксами")
+    parser.add_argument('--list', action='store_true', help="Показать список кейсов")
+    parser.add_argument('--output', help="Путь для JSON с результатами (по умолчанию data/benchmarks/bench_<время>.json)")
+    parser.add_argument('--save-baseline', metavar='NAME', help="Сохранить результаты как baseline с именем NAME")
+    parser.add_argument('--compare', metavar='NAME', help="Сравнить с baseline NAME (код выхода 1 при регрессии)")
+    parser.add_argument('--max-regression', type=float, default=0.2, help="Допустимый рост mean_us относительно baseline (0.2 = 20%%)")
+    parser.add_argument('--keep-db', action='store_true', help="Не удалять временную БД после прогона")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == '__main__':
+    main()
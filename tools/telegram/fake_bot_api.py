@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API - локальный сервер Bot API для нагрузочного тестирования
+
+Реализует getUpdates, sendMessage, sendPhoto, sendDocument, sendMediaGroup, editMessageText,
+deleteMessage и answerCallbackQuery. Поддерживает искусственную задержку, инъекцию ошибок и 429,
+а также генератор синтетических пользователей (сообщения и нажатия кнопок с заданной частотой).
+
+Использование: запустить сервер и указать в settings.yaml
+    tg_bot_initializer:
+      api_base_url: "http://127.0.0.1:8081"
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+# Методы отправки: к ним применяются задержка и инъекция ошибок
+SEND_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendMediaGroup', 'sendVideo', 'sendAudio',
+    'sendAnimation', 'sendVoice', 'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+    'deleteMessage', 'answerCallbackQuery', 'copyMessage', 'forwardMessage',
+}
+
+# Методы, в ответ на которые пользователь "получает ответ" (для оценки времени реакции)
+REPLY_METHODS = {'sendMessage', 'sendPhoto', 'sendDocument', 'sendMediaGroup', 'editMessageText'}
+
+
+class FakeBotApiServer:
+    """Фейковый Bot API: очередь обновлений для getUpdates и заглушки методов отправки"""
+
+    def __init__(self, token: Optional[str] = None, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, flood_rate: float = 0.0, retry_after: int = 1,
+                 max_pending: int = 100000, bot_id: int = 100000001, bot_username: str = 'fake_coreness_bot'):
+        self.token = token
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.max_pending = max_pending
+        self.bot_user = {
+            'id': bot_id,
+            'is_bot': True,
+            'first_name': 'Fake Coreness Bot',
+            'username': bot_username,
+            'can_join_groups': True,
+            'can_read_all_group_messages': False,
+            'supports_inline_queries': False,
+        }
+
+        # Очередь обновлений
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._update_ids = itertools.count(1)
+        self._max_delivered_id = 0
+        self._new_updates = asyncio.Event()
+
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+        # Статистика
+        self.started_at = time.monotonic()
+        self.calls: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.updates_generated = 0
+        self.updates_delivered = 0
+        self.updates_dropped = 0
+        # Время генерации необработанных обновлений по чатам - оценка времени реакции бота
+        self._pending_by_chat: Dict[int, Deque[float]] = {}
+        self._reply_latencies: Deque[float] = deque(maxlen=100000)
+
+    # === Обновления ===
+
+    def push_update(self, update: Dict[str, Any], chat_id: Optional[int] = None) -> Optional[int]:
+        """Добавляет обновление в очередь getUpdates (update_id назначается автоматически)"""
+        if len(self._updates) >= self.max_pending:
+            self.updates_dropped += 1
+            return None
+
+        update_id = next(self._update_ids)
+        update = {'update_id': update_id, **{k: v for k, v in update.items() if k != 'update_id'}}
+        self._updates.append(update)
+        self.updates_generated += 1
+
+        if chat_id is not None:
+            self._pending_by_chat.setdefault(chat_id, deque(maxlen=1000)).append(time.monotonic())
+
+        self._new_updates.set()
+        return update_id
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Long polling: подтверждает offset и ждет новые обновления до timeout"""
+        offset = int(params.get('offset') or 0)
+        limit = min(int(params.get('limit') or 100), 100)
+        timeout = float(params.get('timeout') or 0)
+
+        # Обновления с update_id < offset считаются подтвержденными
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = list(itertools.islice(self._updates, limit))
+        for update in batch:
+            if update['update_id'] > self._max_delivered_id:
+                self._max_delivered_id = update['update_id']
+                self.updates_delivered += 1
+        return batch
+
+    # === Построение объектов ===
+
+    def _make_chat(self, chat_id: int) -> Dict[str, Any]:
+        """Объект Chat (положительный id - личный чат, отрицательный - супергруппа)"""
+        if chat_id > 0:
+            return {'id': chat_id, 'type': 'private', 'first_name': f'User{chat_id}'}
+        return {'id': chat_id, 'type': 'supergroup', 'title': f'Group{chat_id}'}
+
+    def _make_message(self, chat_id: int, **fields) -> Dict[str, Any]:
+        """Объект Message от имени бота"""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self._make_chat(chat_id),
+            'from': self.bot_user,
+        }
+        message.update({k: v for k, v in fields.items() if v is not None})
+        return message
+
+    def _make_file(self, kind: str) -> Dict[str, Any]:
+        """Объект файла (PhotoSize/Document/Video...) с уникальными идентификаторами"""
+        number = next(self._file_ids)
+        file = {'file_id': f'fake_{kind}_{number}', 'file_unique_id': f'fu_{kind}_{number}', 'file_size': 1024}
+        if kind == 'photo':
+            return [{**file, 'width': 1280, 'height': 720}]
+        if kind in ('video', 'animation'):
+            file.update({'width': 1280, 'height': 720, 'duration': 1})
+        if kind == 'audio':
+            file['duration'] = 1
+        if kind == 'document':
+            file['file_name'] = f'file_{number}.bin'
+        return file
+
+    @staticmethod
+    def _chat_id(params: Dict[str, Any]) -> int:
+        """chat_id из параметров (username чата заменяется фиктивным id)"""
+        chat_id = params.get('chat_id')
+        return chat_id if isinstance(chat_id, int) else -1000000000001
+
+    # === Методы Bot API ===
+
+    def _send_message(self, params: Dict[str, Any]):
+        return self._make_message(self._chat_id(params), text=params.get('text', ''))
+
+    def _send_media(self, kind: str, params: Dict[str, Any]):
+        return self._make_message(self._chat_id(params), caption=params.get('caption'), **{kind: self._make_file(kind)})
+
+    def _send_media_group(self, params: Dict[str, Any]):
+        chat_id = self._chat_id(params)
+        media_group_id = str(next(self._file_ids))
+        messages = []
+        for item in params.get('media') or []:
+            kind = item.get('type', 'photo') if isinstance(item, dict) else 'photo'
+            if kind not in ('photo', 'video', 'audio', 'document'):
+                kind = 'document'
+            caption = item.get('caption') if isinstance(item, dict) else None
+            messages.append(self._make_message(chat_id, media_group_id=media_group_id, caption=caption, **{kind: self._make_file(kind)}))
+        return messages
+
+    def _edit_message_text(self, params: Dict[str, Any]):
+        if params.get('inline_message_id'):
+            return True
+        message = self._make_message(self._chat_id(params), text=params.get('text', ''), edit_date=int(time.time()))
+        message['message_id'] = int(params.get('message_id') or message['message_id'])
+        return message
+
+    def _dispatch_method(self, method: str, params: Dict[str, Any]):
+        """Результат вызова метода (неизвестные методы возвращают True)"""
+        if method == 'getMe':
+            return self.bot_user
+        if method == 'getWebhookInfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': len(self._updates)}
+        if method == 'sendMessage':
+            return self._send_message(params)
+        if method == 'sendPhoto':
+            return self._send_media('photo', params)
+        if method == 'sendDocument':
+            return self._send_media('document', params)
+        if method == 'sendVideo':
+            return self._send_media('video', params)
+        if method == 'sendAudio':
+            return self._send_media('audio', params)
+        if method == 'sendAnimation':
+            return self._send_media('animation', params)
+        if method == 'sendMediaGroup':
+            return self._send_media_group(params)
+        if method == 'editMessageText':
+            return self._edit_message_text(params)
+        if method == 'copyMessage':
+            return {'message_id': next(self._message_ids)}
+        # deleteMessage, answerCallbackQuery, deleteWebhook, setMyCommands и т.п.
+        return True
+
+    # === HTTP ===
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> Dict[str, Any]:
+        """Параметры запроса (JSON, urlencoded или multipart от aiogram)"""
+        if request.content_type == 'application/json':
+            try:
+                return await request.json()
+            except Exception:
+                return {}
+
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                params[key] = f'attach://{value.filename}'
+                continue
+            # aiogram сериализует сложные поля (reply_markup, media) в JSON, числа - в строки
+            if value[:1] in ('[', '{'):
+                try:
+                    params[key] = json.loads(value)
+                    continue
+                except ValueError:
+                    pass
+            try:
+                params[key] = int(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    @staticmethod
+    def _error(status: int, description: str, **extra) -> web.Response:
+        return web.json_response({'ok': False, 'error_code': status, 'description': description, **extra}, status=status)
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        """Обработчик /bot<token>/<method>"""
+        method = request.match_info['method']
+        if self.token and request.match_info['token'] != self.token:
+            return self._error(401, 'Unauthorized')
+
+        params = await self._read_params(request)
+        self.calls[method] += 1
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+
+        if method in SEND_METHODS:
+            if self.latency or self.jitter:
+                await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+            if self.flood_rate and random.random() < self.flood_rate:
+                self.injected['429'] += 1
+                return self._error(429, f'Too Many Requests: retry after {self.retry_after}',
+                                   parameters={'retry_after': self.retry_after})
+            if self.error_rate and random.random() < self.error_rate:
+                self.injected['400'] += 1
+                return self._error(400, 'Bad Request: injected error')
+
+        result = self._dispatch_method(method, params)
+        if method in REPLY_METHODS:
+            self._record_reply(self._chat_id(params))
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_push_update(self, request: web.Request) -> web.Response:
+        """POST /_fake/updates - добавить произвольное обновление (или список)"""
+        payload = await request.json()
+        updates = payload if isinstance(payload, list) else [payload]
+        ids = [self.push_update(update) for update in updates]
+        return web.json_response({'ok': True, 'result': ids})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """GET /_fake/stats - статистика сервера"""
+        return web.json_response(self.get_stats())
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/_fake/updates', self.handle_push_update)
+        app.router.add_get('/_fake/stats', self.handle_stats)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        return app
+
+    # === Статистика ===
+
+    def _record_reply(self, chat_id: int):
+        """Время от самого старого необработанного обновления чата до ответа бота"""
+        pending = self._pending_by_chat.get(chat_id)
+        if pending:
+            self._reply_latencies.append(time.monotonic() - pending.popleft())
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._reply_latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000, 2)
+
+        return {
+            'uptime_s': round(time.monotonic() - self.started_at, 1),
+            'updates': {
+                'generated': self.updates_generated,
+                'delivered': self.updates_delivered,
+                'pending': len(self._updates),
+                'dropped': self.updates_dropped,
+            },
+            'calls': dict(self.calls),
+            'injected': dict(self.injected),
+            'reply_latency_ms': {'samples': len(latencies), 'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99)},
+        }
+
+
+class SyntheticUsers:
+    """Генератор синтетических пользователей: сообщения и нажатия кнопок с заданной частотой"""
+
+    def __init__(self, server: FakeBotApiServer, rate: float, users: int = 100, texts: Optional[List[str]] = None,
+                 callbacks: Optional[List[str]] = None, callback_ratio: float = 0.0, first_user_id: int = 500000001):
+        self.server = server
+        self.rate = rate
+        self.user_ids = [first_user_id + i for i in range(users)]
+        self.texts = texts or ['/start']
+        self.callbacks = callbacks or []
+        self.callback_ratio = callback_ratio if self.callbacks else 0.0
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+
+    def _make_user(self, user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}', 'language_code': 'ru'}
+
+    def _make_message_update(self, user_id: int) -> Dict[str, Any]:
+        text = random.choice(self.texts)
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'},
+            'from': self._make_user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'message': message}
+
+    def _make_callback_update(self, user_id: int) -> Dict[str, Any]:
+        return {
+            'callback_query': {
+                'id': str(next(self._callback_ids)),
+                'from': self._make_user(user_id),
+                'chat_instance': str(user_id),
+                'data': random.choice(self.callbacks),
+                'message': {
+                    'message_id': next(self._message_ids),
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'},
+                    'from': self.server.bot_user,
+                    'text': 'menu',
+                },
+            }
+        }
+
+    def emit(self):
+        """Генерирует одно событие случайного пользователя"""
+        user_id = random.choice(self.user_ids)
+        if self.callback_ratio and random.random() < self.callback_ratio:
+            update = self._make_callback_update(user_id)
+        else:
+            update = self._make_message_update(user_id)
+        self.server.push_update(update, chat_id=user_id)
+
+    async def run(self, duration: float = 0.0):
+        """Генерирует события с частотой rate в секунду (duration=0 - бесконечно)"""
+        tick = 0.01
+        budget = 0.0
+        started = last = time.monotonic()
+        while not duration or last - started < duration:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            budget += (now - last) * self.rate
+            last = now
+            while budget >= 1:
+                self.emit()
+                budget -= 1
+
+
+async def report_loop(server: FakeBotApiServer, interval: float):
+    """Периодический вывод статистики"""
+    previous_generated = previous_delivered = 0
+    while True:
+        await asyncio.sleep(interval)
+        stats = server.get_stats()
+        updates = stats['updates']
+        latency = stats['reply_latency_ms']
+        sends = sum(count for method, count in stats['calls'].items() if method in SEND_METHODS)
+        print(
+            f"📊 обновления: +{(updates['generated'] - previous_generated) / interval:.0f}/s сгенерировано, "
+            f"+{(updates['delivered'] - previous_delivered) / interval:.0f}/s доставлено, "
+            f"в очереди {updates['pending']}, отброшено {updates['dropped']} | "
+            f"вызовов отправки {sends}, инъекций {sum(stats['injected'].values())} | "
+            f"реакция p50={latency['p50']}ms p99={latency['p99']}ms"
+        )
+        previous_generated = updates['generated']
+        previous_delivered = updates['delivered']
+
+
+async def main_async(args):
+    server = FakeBotApiServer(
+        token=args.token,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+        max_pending=args.max_pending,
+    )
+
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, args.host, args.port)
+    await site.start()
+
+    print(f"▶️ Fake Bot API: http://{args.host}:{args.port}")
+    print(f"ℹ️ укажите tg_bot_initializer.api_base_url: \"http://{args.host}:{args.port}\" в settings.yaml")
+
+    tasks = []
+    if args.report_interval > 0:
+        tasks.append(asyncio.create_task(report_loop(server, args.report_interval)))
+
+    try:
+        if args.rate > 0:
+            users = SyntheticUsers(
+                server,
+                rate=args.rate,
+                users=args.users,
+                texts=args.texts,
+                callbacks=args.callbacks,
+                callback_ratio=args.callback_ratio,
+            )
+            print(f"▶️ генератор: {args.rate}/s, пользователей {args.users}, доля callback {users.callback_ratio}")
+            await users.run(args.duration)
+            # Даем боту дочитать очередь
+            while server.get_stats()['updates']['pending'] and args.drain_timeout > 0:
+                await asyncio.sleep(0.1)
+                args.drain_timeout -= 0.1
+            print(json.dumps(server.get_stats(), ensure_ascii=False, indent=2))
+        else:
+            await asyncio.Event().wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API для нагрузочного тестирования')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес сервера (по умолчанию: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8081, help='Порт сервера (по умолчанию: 8081)')
+    parser.add_argument('--token', help='Принимать только указанный токен (по умолчанию - любой)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Задержка ответа методов отправки (мс)')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Разброс задержки ± (мс)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 400 на методы отправки (0..1)')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='Доля ответов 429 на методы отправки (0..1)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429 (сек)')
+    parser.add_argument('--max-pending', type=int, default=100000, help='Максимум неподтвержденных обновлений в очереди')
+    parser.add_argument('--rate', type=float, default=0.0, help='Частота синтетических событий в секунду (0 - генератор выключен)')
+    parser.add_argument('--users', type=int, default=100, help='Количество синтетических пользователей')
+    parser.add_argument('--texts', nargs='*', default=['/start'], help='Тексты сообщений пользователей')
+    parser.add_argument('--callbacks', nargs='*', default=[], help='callback_data для нажатий кнопок')
+    parser.add_argument('--callback-ratio', type=float, default=0.0, help='Доля нажатий кнопок среди событий (0..1)')
+    parser.add_argument('--duration', type=float, default=0.0, help='Длительность генерации (сек, 0 - бесконечно)')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='Ожидание разбора очереди после генерации (сек)')
+    parser.add_argument('--report-interval', type=float, default=5.0, help='Интервал вывода статистики (сек, 0 - выключено)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        print("\n⏹ остановлено")
+
+
+if __name__ == '__main__':
+    main()
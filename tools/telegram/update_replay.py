@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Update Replay - воспроизведение записанных Telegram updates
+
+Читает JSONL файлы, записанные tg_event_bot (record_updates: true), и прогоняет updates через
+обработчики TgEventBot (aiogram Dispatcher -> _dispatch_event -> trigger_manager) с исходными
+интервалами между событиями (1x), ускорением (Nx) или на максимальной скорости.
+Порядок событий внутри одного чата сохраняется. В конце выводит пропускную способность
+и латентность по стадиям (event_tracer).
+"""
+
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+# Переходим в корневую директорию проекта для корректной работы DI-контейнера
+os.chdir(project_root)
+
+# Загружаем переменные окружения из .env файла
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    print("⚠️  python-dotenv не установлен. Переменные окружения могут быть не загружены.")
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Dispatcher, types
+
+# Импорты для работы с DI-контейнером
+from app.di_container import DIContainer
+from plugins.utilities.foundation.logger.logger import Logger
+from plugins.utilities.foundation.plugins_manager.plugins_manager import \
+    PluginsManager
+from plugins.utilities.foundation.settings_manager.settings_manager import SettingsManager
+
+# Поля дат, которые сдвигаются на момент воспроизведения (иначе события отсечет max_event_age_seconds)
+DATE_FIELDS = ('date', 'edit_date')
+
+
+def load_records(paths: List[str]) -> List[Tuple[float, Dict[str, Any]]]:
+    """Загружает записи из файлов/папок, сортирует по времени получения"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'updates_*.jsonl'))))
+        else:
+            files.extend(sorted(glob.glob(path)))
+
+    records = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    records.append((float(record['received_at']), record['update']))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️ {file_path}:{line_number}: пропущена некорректная запись ({e})")
+
+    records.sort(key=lambda item: item[0])
+    return records
+
+
+def get_chat_key(update: Dict[str, Any]) -> Any:
+    """Ключ упорядочивания: id чата (или пользователя), иначе update_id"""
+    for field in ('message', 'edited_message', 'channel_post', 'my_chat_member', 'chat_member', 'chat_join_request'):
+        chat = (update.get(field) or {}).get('chat')
+        if chat:
+            return chat.get('id')
+    callback = update.get('callback_query')
+    if callback:
+        chat = (callback.get('message') or {}).get('chat')
+        return chat.get('id') if chat else (callback.get('from') or {}).get('id')
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from'].get('id')
+    return update.get('update_id')
+
+
+def shift_dates(value: Any, now: int) -> Any:
+    """Рекурсивно заменяет даты update на текущее время"""
+    if isinstance(value, dict):
+        return {key: (now if key in DATE_FIELDS and isinstance(item, int) else shift_dates(item, now)) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shift_dates(item, now) for item in value]
+    return value
+
+
+def percentiles_ms(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max в миллисекундах"""
+    ordered = sorted(values)
+    if not ordered:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 3)
+
+    return {'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99), 'max': round(ordered[-1] * 1000, 3)}
+
+
+class UpdateReplayer:
+    """Воспроизведение updates через обработчики TgEventBot"""
+
+    def __init__(self, args):
+        self.args = args
+        self.temp_dir = None
+
+        self.logger = Logger()
+        self.plugins_manager = PluginsManager(logger=self.logger.get_logger('plugins_manager'))
+        self.settings_manager = SettingsManager(
+            logger=self.logger.get_logger('settings_manager'),
+            plugins_manager=self.plugins_manager
+        )
+
+        overrides = {
+            # Воспроизведение не должно записывать само себя
+            'tg_event_bot': {'record_updates': False},
+            'event_tracer': {'tracing_enabled': True, 'sample_rate': args.trace_sample_rate},
+            'metrics_collector': {'metrics_enabled': True},
+        }
+        if not args.use_config_db:
+            self.temp_dir = tempfile.mkdtemp(prefix='coreness_replay_')
+            overrides['database_service'] = {'database_url': f"sqlite:///{os.path.join(self.temp_dir, 'replay.db')}"}
+        if args.api_base_url:
+            overrides['tg_bot_initializer'] = {'api_base_url': args.api_base_url}
+        if args.token or not args.api_base_url:
+            # Без api_base_url бот не должен обращаться к настоящему Telegram
+            overrides.setdefault('tg_bot_initializer', {})['token'] = args.token or '123456:REPLAY'
+        self.settings_manager.apply_overrides(overrides)
+
+        self.di_container = DIContainer(
+            logger=self.logger,
+            plugins_manager=self.plugins_manager,
+            settings_manager=self.settings_manager
+        )
+
+        self.latencies: List[float] = []
+        self.schedule_delays: List[float] = []
+        self.errors = 0
+        self.processed = 0
+
+    async def replay(self, records: List[Tuple[float, Dict[str, Any]]]) -> Dict[str, Any]:
+        tg_event_bot = self.di_container.get_service_on_demand('tg_event_bot')
+        if not tg_event_bot:
+            raise RuntimeError("сервис tg_event_bot недоступен")
+        bot = tg_event_bot.tg_bot_initializer.get_bot()
+        if not bot:
+            raise RuntimeError("бот не инициализирован (проверьте токен)")
+
+        dispatcher = Dispatcher()
+        dispatcher.include_router(tg_event_bot._create_router())
+
+        messenger_task = None
+        if self.args.with_messenger:
+            messenger = self.di_container.get_service_on_demand('tg_messenger')
+            if messenger:
+                messenger_task = asyncio.create_task(messenger.run())
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        queues: Dict[Any, asyncio.Queue] = {}
+        workers: List[asyncio.Task] = []
+
+        async def worker(queue: asyncio.Queue):
+            # Один воркер на чат - события чата обрабатываются строго по порядку
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                scheduled_at, raw_update = item
+                async with semaphore:
+                    start = time.perf_counter()
+                    self.schedule_delays.append(max(start - scheduled_at, 0.0))
+                    try:
+                        update = types.Update.model_validate(shift_dates(raw_update, int(time.time())), context={'bot': bot})
+                        await dispatcher.feed_update(bot, update)
+                        self.processed += 1
+                    except Exception as e:
+                        self.errors += 1
+                        if self.args.verbose:
+                            print(f"❌ update {raw_update.get('update_id')}: {e}")
+                    self.latencies.append(time.perf_counter() - start)
+
+        first_received = records[0][0]
+        speed = self.args.speed
+        started = time.perf_counter()
+
+        for received_at, raw_update in records:
+            scheduled_at = started
+            if speed > 0:
+                # Сжатие времени с сохранением интервалов между событиями
+                scheduled_at = started + (received_at - first_received) / speed
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            key = get_chat_key(raw_update)
+            queue = queues.get(key)
+            if queue is None:
+                queue = queues[key] = asyncio.Queue()
+                workers.append(asyncio.create_task(worker(queue)))
+            queue.put_nowait((scheduled_at if speed > 0 else time.perf_counter(), raw_update))
+
+        for queue in queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*workers)
+
+        # Дожидаемся сборки media group
+        if tg_event_bot.media_group_enabled:
+            await asyncio.sleep(tg_event_bot.media_group_timeout + 0.2)
+
+        wall = time.perf_counter() - started
+
+        if messenger_task:
+            await asyncio.sleep(self.args.drain_seconds)
+            messenger_task.cancel()
+
+        event_tracer = self.di_container.get_utility_on_demand('event_tracer')
+        metrics_collector = self.di_container.get_utility_on_demand('metrics_collector')
+        recorded_span = records[-1][0] - first_received
+
+        return {
+            'records': len(records),
+            'processed': self.processed,
+            'errors': self.errors,
+            'chats': len(queues),
+            'speed': speed or 'max',
+            'recorded_span_s': round(recorded_span, 3),
+            'wall_s': round(wall, 3),
+            'throughput_ups': round(self.processed / wall, 1) if wall else None,
+            'update_latency_ms': percentiles_ms(self.latencies),
+            'schedule_delay_ms': percentiles_ms(self.schedule_delays),
+            'stages_ms': event_tracer.get_stage_percentiles() if event_tracer else {},
+            'counters': metrics_collector.get_snapshot()['counters'] if metrics_collector else {},
+        }
+
+    def close(self):
+        try:
+            self.di_container.shutdown()
+        finally:
+            if self.temp_dir:
+                shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def print_report(report: Dict[str, Any]):
+    """Выводит итоговый отчет"""
+    print("\n📊 Результаты воспроизведения")
+    print("=" * 60)
+    print(f"updates: {report['processed']}/{report['records']} (ошибок {report['errors']}), чатов {report['chats']}")
+    print(f"скорость: {report['speed']}, запись {report['recorded_span_s']}s -> воспроизведение {report['wall_s']}s")
+    print(f"пропускная способность: {report['throughput_ups']} updates/s")
+    latency = report['update_latency_ms']
+    print(f"обработка update: p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms max={latency['max']}ms")
+    delay = report['schedule_delay_ms']
+    print(f"отставание от расписания: p50={delay['p50']}ms p99={delay['p99']}ms max={delay['max']}ms")
+    if report['stages_ms']:
+        print("\nстадии (мс):")
+        for stage, stats in report['stages_ms'].items():
+            print(f"  {stage:<16} n={stats['count']:<7} p50={stats.get('p50')} p90={stats.get('p90')} p99={stats.get('p99')} max={stats['max']}")
+
+
+async def main_async(args) -> int:
+    records = load_records(args.paths)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("❌ записи не найдены")
+        return 1
+    print(f"▶️ загружено {len(records)} updates")
+
+    replayer = UpdateReplayer(args)
+    try:
+        if not args.verbose:
+            # Логи бизнес-логики на каждом событии искажают замеры
+            logging.disable(logging.WARNING)
+        report = await replayer.replay(records)
+    finally:
+        logging.disable(logging.NOTSET)
+        replayer.close()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 отчет: {args.output}")
+    return 0 if not report['errors'] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных Telegram updates через TgEventBot')
+    parser.add_argument('paths', nargs='*', default=['data/recordings/updates'], help='Файлы JSONL или папки с записями')
+    parser.add_argument('--speed', type=float, default=1.0, help='Ускорение времени (1 - реальное время, 10 - в 10 раз быстрее, 0 - максимально)')
+    parser.add_argument('--concurrency', type=int, default=100, help='Максимум одновременно обрабатываемых updates')
+    parser.add_argument('--limit', type=int, default=0, help='Воспроизвести только первые N updates')
+    parser.add_argument('--use-config-db', action='store_true', help='Писать в БД из настроек (по умолчанию - временная SQLite)')
+    parser.add_argument('--api-base-url', help='Адрес Bot API (например fake_bot_api.py) - нужен для --with-messenger')
+    parser.add_argument('--token', help='Токен бота (по умолчанию фиктивный)')
+    parser.add_argument('--with-messenger', action='store_true', help='Запустить tg_messenger для отправки действий (только с --api-base-url)')
+    parser.add_argument('--drain-seconds', type=float, default=2.0, help='Время на отправку очереди после воспроизведения (с --with-messenger)')
+    parser.add_argument('--trace-sample-rate', type=float, default=0.01, help='Доля событий с сохранением полной трассы')
+    parser.add_argument('--output', help='Сохранить отчет в JSON')
+    parser.add_argument('--verbose', action='store_true', help='Показывать логи и ошибки отдельных updates')
+    args = parser.parse_args()
+
+    if args.with_messenger and not args.api_base_url:
+        parser.error('--with-messenger требует --api-base-url (отправка в настоящий Telegram недопустима)')
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == '__main__':
+    main()